@@ -8,6 +8,7 @@ Commands:
 """
 
 import click
+import os
 import sys
 import importlib.util
 from pathlib import Path
@@ -45,26 +46,41 @@ def cli(ctx, debug, quiet):
 @click.option('--key', help='SSH private key file')
 @click.option('--port', default=22, help='SSH port (default: 22)')
 @click.option('--sudo', is_flag=True, help='Use sudo for remote commands')
+@click.option('--script', 'script_file', type=click.Path(dir_okay=False),
+              help='Also write the changes as a shell script to this file')
+@click.option('--plan-workers', default=1, type=click.IntRange(min=1),
+              help='Resources checked concurrently while planning (default: 1, sequential)')
 def plan(config_file: str, host: Optional[str], user: Optional[str],
-         key: Optional[str], port: int, sudo: bool):
+         key: Optional[str], port: int, sudo: bool, script_file: Optional[str],
+         plan_workers: int):
     """
     Show what would change without applying.
 
     Example:
         cook plan server.py
         cook plan server.py --host server.example.com --user admin
+        cook plan server.py --script apply.sh
+        cook plan server.py --plan-workers 16
     """
     reset_executor()
 
     if host:
         click.echo(f"Planning {config_file} on {host}...\n")
-        _plan_remote(config_file, host, user, key, port, sudo)
+        _plan_remote(config_file, host, user, key, port, sudo, script_file, plan_workers)
     else:
         click.echo(f"Planning {config_file}...\n")
-        _plan_local(config_file)
+        _plan_local(config_file, script_file, plan_workers)
 
 
-def _plan_local(config_file: str):
+def _write_script(executor, plan_result, script_file: str) -> None:
+    """Write the plan's changes as a shell script (see Executor.export_script)."""
+    with open(script_file, "w") as f:
+        f.write(executor.export_script(plan_result))
+    os.chmod(script_file, 0o755)
+    click.echo(f"Wrote shell script to {script_file}")
+
+
+def _plan_local(config_file: str, script_file: Optional[str] = None, plan_workers: int = 1):
     """Plan execution locally."""
 
     try:
@@ -74,6 +90,7 @@ def _plan_local(config_file: str):
         sys.exit(1)
 
     executor = get_executor()
+    executor.max_workers = plan_workers
     plan_result = executor.plan()
 
     if plan_result.has_errors:
@@ -94,11 +111,14 @@ def _plan_local(config_file: str):
         _display_plan(resource_id, resource_plan)
 
     click.echo(f"\nPlan: {plan_result.change_count} to change")
+    if script_file:
+        _write_script(executor, plan_result, script_file)
     click.echo(f"\nRun 'cook apply {config_file}' to apply these changes.")
 
 
 def _plan_remote(config_file: str, host: str, user: Optional[str],
-                 key: Optional[str], port: int, sudo: bool):
+                 key: Optional[str], port: int, sudo: bool, script_file: Optional[str] = None,
+                 plan_workers: int = 1):
     """Plan execution on remote host via SSH."""
     try:
         from cook.transport.ssh import SSHTransport
@@ -111,13 +131,15 @@ def _plan_remote(config_file: str, host: str, user: Optional[str],
     click.echo(f"Connecting to {user or 'current_user'}@{host}:{port}...")
     try:
         transport = SSHTransport(host=host, port=port, user=user, key_file=key, sudo=sudo)
+        transport.wait_connected()
     except Exception as e:
         click.secho(f"SSH connection failed: {e}", fg="red")
         sys.exit(1)
 
     with transport:
         # Create executor with SSH transport
-        executor = Executor(transport=transport, config_file=config_file)
+        executor = Executor(transport=transport, config_file=config_file,
+                            max_workers=plan_workers)
 
         # Load config (this will register resources with the executor)
         reset_executor()
@@ -151,6 +173,8 @@ def _plan_remote(config_file: str, host: str, user: Optional[str],
             _display_plan(resource_id, resource_plan)
 
         click.echo(f"\nPlan: {plan_result.change_count} to change")
+        if script_file:
+            _write_script(executor, plan_result, script_file)
         click.echo(f"\nRun 'cook apply {config_file} --host {host}' to apply these changes.")
 
 
@@ -162,8 +186,12 @@ def _plan_remote(config_file: str, host: str, user: Optional[str],
 @click.option('--key', help='SSH private key file')
 @click.option('--port', default=22, help='SSH port (default: 22)')
 @click.option('--sudo', is_flag=True, help='Use sudo for remote commands')
+@click.option('--apply-workers', default=1, type=click.IntRange(min=1),
+              help='Changes to unrelated paths applied concurrently (default: 1, sequential)')
+@click.option('--plan-workers', default=1, type=click.IntRange(min=1),
+              help='Resources checked concurrently while planning (default: 1, sequential)')
 def apply(config_file: str, yes: bool, host: Optional[str], user: Optional[str],
-          key: Optional[str], port: int, sudo: bool):
+          key: Optional[str], port: int, sudo: bool, apply_workers: int, plan_workers: int):
     """
     Apply configuration changes.
 
@@ -171,18 +199,19 @@ def apply(config_file: str, yes: bool, host: Optional[str], user: Optional[str],
         cook apply server.py
         cook apply server.py --yes
         cook apply server.py --host server.example.com --user admin
+        cook apply server.py --apply-workers 8 --plan-workers 16
     """
     reset_executor()
 
     if host:
         click.echo(f"Planning {config_file} on {host}...\n")
-        _apply_remote(config_file, yes, host, user, key, port, sudo)
+        _apply_remote(config_file, yes, host, user, key, port, sudo, apply_workers, plan_workers)
     else:
         click.echo(f"Planning {config_file}...\n")
-        _apply_local(config_file, yes)
+        _apply_local(config_file, yes, apply_workers, plan_workers)
 
 
-def _apply_local(config_file: str, yes: bool):
+def _apply_local(config_file: str, yes: bool, apply_workers: int = 1, plan_workers: int = 1):
     """Apply execution locally."""
 
     # Load config
@@ -195,6 +224,8 @@ def _apply_local(config_file: str, yes: bool):
     # Generate plan
     executor = get_executor()
     executor.config_file = config_file
+    executor.apply_workers = apply_workers
+    executor.max_workers = plan_workers
     executor.enable_state_tracking()
     plan_result = executor.plan()
 
@@ -234,7 +265,8 @@ def _apply_local(config_file: str, yes: bool):
 
 
 def _apply_remote(config_file: str, yes: bool, host: str, user: Optional[str],
-                  key: Optional[str], port: int, sudo: bool):
+                  key: Optional[str], port: int, sudo: bool, apply_workers: int = 1,
+                  plan_workers: int = 1):
     """Apply execution on remote host via SSH."""
     try:
         from cook.transport.ssh import SSHTransport
@@ -247,13 +279,15 @@ def _apply_remote(config_file: str, yes: bool, host: str, user: Optional[str],
     click.echo(f"Connecting to {user or 'current_user'}@{host}:{port}...")
     try:
         transport = SSHTransport(host=host, port=port, user=user, key_file=key, sudo=sudo)
+        transport.wait_connected()
     except Exception as e:
         click.secho(f"SSH connection failed: {e}", fg="red")
         sys.exit(1)
 
     with transport:
         # Create executor with SSH transport
-        executor = Executor(transport=transport, config_file=config_file)
+        executor = Executor(transport=transport, config_file=config_file,
+                            max_workers=plan_workers, apply_workers=apply_workers)
         executor.enable_state_tracking()
 
         # Load config (this will register resources with the executor)
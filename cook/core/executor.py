@@ -10,18 +10,29 @@ The executor:
 
 import os
 import socket
+import threading
 import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait
 from dataclasses import dataclass, field
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Set, Tuple
 
-from cook.core import Action, Plan, Platform, Resource
-from cook.transport import LocalTransport, Transport
+from cook.core import Plan, Platform, Resource
+from cook.transport import LocalTransport, ScriptTransport, Transport
 from cook.logging import get_cook_logger
 
 logger = get_cook_logger(__name__)
 
 
+def _paths_overlap(first: Tuple[str, ...], second: Tuple[str, ...]) -> bool:
+    """True if any path in one is equal to, or inside, a path in the other."""
+    for a in first:
+        for b in second:
+            if a == b or b.startswith(a.rstrip("/") + "/") or a.startswith(b.rstrip("/") + "/"):
+                return True
+    return False
+
+
 @dataclass
 class PlanResult:
     """
@@ -90,6 +101,8 @@ class Executor:
         platform: Optional[Platform] = None,
         config_file: Optional[str] = None,
         transport: Optional[Transport] = None,
+        max_workers: int = 1,
+        apply_workers: int = 1,
     ):
         """
         Initialize executor.
@@ -98,13 +111,29 @@ class Executor:
             platform: Platform info (auto-detected if None)
             config_file: Path to config file (for state tracking)
             transport: Transport for command execution (default: LocalTransport)
+            max_workers: Number of resources checked concurrently during plan()
+                (1 = sequential). Checks mostly wait on child processes or SSH
+                round trips, so a few times the CPU count is a reasonable value
+            apply_workers: Number of changes applied concurrently (1 = strictly
+                in declaration order). Only neighbouring changes that declare
+                unrelated paths (see Resource.apply_paths) overlap
         """
         self.transport = transport or LocalTransport()
         self.platform = platform or Platform.detect(self.transport)
-        self.resources: List[Resource] = []
+        # Resources by ID, in the order each ID was first declared
         self._registry: Dict[str, Resource] = {}
         self.config_file = config_file
+        self.max_workers = max_workers
+        self.apply_workers = apply_workers
         self._enable_state = False
+        # Package managers whose cache is stale because a repository was added
+        self._cache_dirty: Set[str] = set()
+        # Installed packages per package manager, listed once per plan()
+        # and dropped whenever a Package changes them (see Package)
+        self._installed_packages: Dict[str, Dict[str, str]] = {}
+        self._installed_lock = threading.Lock()
+        # Unit files changed since the last `systemctl daemon-reload`
+        self._daemon_reload_pending = False
 
     def add(self, resource: Resource) -> Resource:
         """
@@ -126,22 +155,17 @@ class Executor:
         """
         # Set transport on resource
         resource._transport = self.transport
+        resource._executor = self
 
-        # Check if resource already exists
-        if resource.id in self._registry:
-            # Replace existing resource in-place (maintain order)
-            for i, res in enumerate(self.resources):
-                if res.id == resource.id:
-                    self.resources[i] = resource
-                    break
-        else:
-            # New resource - append to list
-            self.resources.append(resource)
-
-        # Update registry (always overwrites)
+        # A redefinition replaces the value but keeps the first position
         self._registry[resource.id] = resource
         return resource
 
+    @property
+    def resources(self) -> List[Resource]:
+        """Resources in declaration order (a redefined resource keeps its place)."""
+        return list(self._registry.values())
+
     def get(self, resource_id: str) -> Optional[Resource]:
         """Get resource by ID."""
         return self._registry.get(resource_id)
@@ -154,12 +178,33 @@ class Executor:
         """
         Generate execution plan for all resources.
 
+        Resource checks are independent and dominated by command/SSH round
+        trips, so they run on a thread pool. Results are collected in
+        resource order.
+
         Returns:
             PlanResult with plans and any errors
         """
         result = PlanResult()
-
-        for resource in self.resources:
+        self._installed_packages.clear()
+        resources = self.resources
+        self._prefetch(resources)
+
+        if self.max_workers > 1 and len(resources) > 1:
+            workers = min(self.max_workers, len(resources))
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                futures = [
+                    (resource, pool.submit(resource.plan, self.platform))
+                    for resource in resources
+                ]
+                for resource, future in futures:
+                    try:
+                        result.plans[resource.id] = future.result()
+                    except Exception as e:
+                        result.errors.append(e)
+            return result
+
+        for resource in resources:
             try:
                 plan = resource.plan(self.platform)
                 result.plans[resource.id] = plan
@@ -168,6 +213,19 @@ class Executor:
 
         return result
 
+    def _prefetch(self, resources: List[Resource]) -> None:
+        """Let each resource type gather state in bulk (see Resource.prefetch)."""
+        groups: Dict[type, List[Resource]] = {}
+        for resource in resources:
+            groups.setdefault(type(resource), []).append(resource)
+
+        for resource_class, members in groups.items():
+            try:
+                resource_class.prefetch(members, self.platform)
+            except Exception as e:
+                # Checks still work without it, one lookup at a time
+                logger.warning(f"Prefetch for {resource_class.__name__} failed: {e}")
+
     def apply(self, plan_result: PlanResult) -> ApplyResult:
         """
         Apply execution plan.
@@ -180,28 +238,34 @@ class Executor:
         """
         result = ApplyResult()
         start_time = time.time()
+        self._cache_dirty.clear()
+        self._daemon_reload_pending = False
 
         # Phase 1: Apply all resource changes
+        pending = []
         for resource in self.resources:
             plan = plan_result.plans.get(resource.id)
-            if not plan or not plan.has_changes():
-                continue
+            if plan and plan.has_changes():
+                pending.append((resource, plan))
 
-            try:
-                resource.apply(plan, self.platform)
-                result.changed_resources.append(resource.id)
+        for group in self._path_groups(self._batches(pending)):
+            if self.apply_workers > 1 and len(group) > 1:
+                self._apply_concurrently(group, result)
+            else:
+                for batch, _ in group:
+                    self._apply_changes(batch, result)
 
-                # Refresh actual state after apply
-                resource._actual_state = resource.check(self.platform)
-            except Exception as e:
-                result.errors.append(e)
-                # Continue with other resources even if one fails
+        # One daemon-reload for all unit files not yet picked up by a Service
+        try:
+            self.flush_daemon_reload()
+        except RuntimeError as e:
+            result.errors.append(e)
 
         result.duration = time.time() - start_time
 
         # Phase 2: Service reload/restart triggers
         if result.changed_resources:
-            self._trigger_service_reloads(result.changed_resources)
+            self._trigger_service_reloads(result.changed_resources, result)
 
         # Phase 3: Save state (if enabled)
         if self._enable_state:
@@ -209,31 +273,242 @@ class Executor:
 
         return result
 
-    def _trigger_service_reloads(self, changed_resource_ids: List[str]) -> None:
+    def export_script(self, plan_result: PlanResult) -> str:
+        """
+        Render the changes of a plan as one POSIX shell script.
+
+        Each changed resource is applied against a ScriptTransport, so the
+        script holds the commands and file writes apply() would perform,
+        in the same order, followed by the daemon-reload and service
+        triggers. Nothing runs on the host and no state is saved. The plan
+        must come from this executor; the script assumes the host is still
+        in the state it was planned against.
+
+        Args:
+            plan_result: Result from plan()
+
+        Returns:
+            Script text, starting with `set -e`
+        """
+        script = ScriptTransport()
+        transport = self.transport
+        self._cache_dirty.clear()
+        self._daemon_reload_pending = False
+        self._set_transport(script)
+        try:
+            changed = []
+            for resource in self.resources:
+                plan = plan_result.plans.get(resource.id)
+                if plan and plan.has_changes():
+                    script.comment(resource.id)
+                    resource.apply(plan, self.platform)
+                    changed.append(resource.id)
+
+            self.flush_daemon_reload()
+            if changed:
+                triggers = ApplyResult()
+                self._trigger_service_reloads(changed, triggers)
+                if triggers.errors:
+                    raise triggers.errors[0]
+        finally:
+            self._set_transport(transport)
+        return script.script()
+
+    def _set_transport(self, transport: Transport) -> None:
+        """Point the executor and all its resources at transport."""
+        self.transport = transport
+        for resource in self.resources:
+            resource._transport = transport
+
+    def request_daemon_reload(self) -> None:
+        """
+        Note that systemd unit files changed.
+
+        The reload itself is deferred: it runs once, before the next
+        systemctl operation that depends on it or at the end of apply().
+        """
+        self._daemon_reload_pending = True
+
+    def flush_daemon_reload(self) -> None:
+        """
+        Run `systemctl daemon-reload` if unit files changed since the last one.
+
+        Raises:
+            RuntimeError: If the reload fails
+        """
+        if not self._daemon_reload_pending:
+            return
+        self._daemon_reload_pending = False
+
+        if self.platform.system != "Linux":
+            return
+
+        logger.info("Reloading systemd units...")
+        output, code = self.transport.run_command(["systemctl", "daemon-reload"])
+        if code != 0:
+            raise RuntimeError(f"systemctl daemon-reload failed: {output}")
+
+    def _batches(self, pending: List[Tuple[Resource, Plan]]) -> List[List[Tuple[Resource, Plan]]]:
+        """
+        Split pending changes into runs of consecutive, mergeable changes.
+
+        Only neighbours are merged, so apply order between different
+        resources is preserved.
+        """
+        batches: List[List[Tuple[Resource, Plan]]] = []
+        last_key = None
+        for resource, plan in pending:
+            key = resource.batch_key(plan, self.platform)
+            if key is not None:
+                key = (type(resource), key)
+            if key is not None and key == last_key:
+                batches[-1].append((resource, plan))
+            else:
+                batches.append([(resource, plan)])
+            last_key = key
+        return batches
+
+    def _path_groups(
+        self, batches: List[List[Tuple[Resource, Plan]]]
+    ) -> List[List[Tuple[List[Tuple[Resource, Plan]], Optional[Tuple[str, ...]]]]]:
+        """
+        Split batches into runs whose paths are all known.
+
+        A batch with an unknown footprint forms a group of its own, so it
+        never overlaps with anything declared around it.
+        """
+        groups: List[List[Tuple[List[Tuple[Resource, Plan]], Optional[Tuple[str, ...]]]]] = []
+        open_group = False
+        for batch in batches:
+            paths: Optional[Tuple[str, ...]] = ()
+            for resource, plan in batch:
+                resource_paths = resource.apply_paths(plan, self.platform)
+                if resource_paths is None:
+                    paths = None
+                    break
+                paths += resource_paths
+
+            if paths is not None and open_group:
+                groups[-1].append((batch, paths))
+            else:
+                groups.append([(batch, paths)])
+            open_group = paths is not None
+        return groups
+
+    def _apply_concurrently(
+        self,
+        group: List[Tuple[List[Tuple[Resource, Plan]], Optional[Tuple[str, ...]]]],
+        result: ApplyResult,
+    ) -> None:
+        """
+        Apply a run of batches on a thread pool.
+
+        A batch starts once every earlier batch touching a related path has
+        finished. Results are merged in declaration order.
+        """
+        parts = [ApplyResult() for _ in group]
+        futures: List[Future] = []
+        with ThreadPoolExecutor(max_workers=min(self.apply_workers, len(group))) as pool:
+            for i, (batch, paths) in enumerate(group):
+                # Tasks are dequeued in submission order, so every dependency
+                # is already running when a task waits on it
+                before = [futures[j] for j in range(i) if _paths_overlap(group[j][1], paths)]
+                futures.append(pool.submit(self._apply_after, before, batch, parts[i]))
+
+        for part in parts:
+            result.changed_resources.extend(part.changed_resources)
+            result.errors.extend(part.errors)
+
+    def _apply_after(
+        self, before: List[Future], batch: List[Tuple[Resource, Plan]], result: ApplyResult
+    ) -> None:
+        """Wait for the batches this one depends on, then apply it."""
+        wait(before)
+        self._apply_changes(batch, result)
+
+    def _apply_changes(self, batch: List[Tuple[Resource, Plan]], result: ApplyResult) -> None:
+        """Apply one batch, falling back to one resource at a time."""
+        if len(batch) > 1 and self._apply_batch(batch, result):
+            return
+
+        for resource, plan in batch:
+            try:
+                resource.apply(plan, self.platform)
+                result.changed_resources.append(resource.id)
+
+                # Refresh actual state after apply
+                resource._actual_state = resource.check(self.platform)
+            except Exception as e:
+                result.errors.append(e)
+                # Continue with other resources even if one fails
+
+    def _apply_batch(self, batch: List[Tuple[Resource, Plan]], result: ApplyResult) -> bool:
+        """
+        Apply a batch in one step.
+
+        Returns:
+            True on success. On failure nothing is recorded and the caller
+            applies the resources one by one, so errors are attributed to
+            the resource that caused them.
+        """
+        resource_class = type(batch[0][0])
+        try:
+            resource_class.apply_batch(batch, self.platform)
+        except Exception as e:
+            logger.warning(f"Batched apply of {len(batch)} resources failed, retrying individually: {e}")
+            return False
+
+        for resource, _ in batch:
+            result.changed_resources.append(resource.id)
+            try:
+                resource._actual_state = resource.check(self.platform)
+            except Exception as e:
+                result.errors.append(e)
+        return True
+
+    def _trigger_service_reloads(self, changed_resource_ids: List[str], result: ApplyResult) -> None:
         """
         Trigger service reloads/restarts based on changed resources.
 
+        A service that fails to restart/reload or to become healthy is
+        recorded in result.errors; the remaining triggers still run.
+
         Args:
             changed_resource_ids: List of resource IDs that changed
+            result: Apply result the errors are added to
         """
         # Import Service here to avoid circular import
         from cook.resources.service import Service
 
+        changed = set(changed_resource_ids)
+        restarts: List[Service] = []
+        reloads: List[Service] = []
+
         for resource in self.resources:
             # Check if resource is a Service
             if not isinstance(resource, Service):
                 continue
 
             # Check if service should restart (takes precedence over reload)
-            if resource.should_restart(changed_resource_ids):
+            if resource.should_restart(changed):
                 logger.info(f"  ↻ {resource.id} restarted")
-                resource.restart(self.platform)
+                restarts.append(resource)
                 continue
 
             # Check if service should reload
-            if resource.should_reload(changed_resource_ids):
+            if resource.should_reload(changed):
                 logger.info(f"  ⟳ {resource.id} reloaded")
-                resource.reload(self.platform)
+                reloads.append(resource)
+
+        # One systemctl call per action for all triggered services
+        for action, services in (("restart", restarts), ("reload", reloads)):
+            if not services:
+                continue
+            try:
+                result.errors.extend(Service.run_many(action, services, self.platform))
+            except Exception as e:
+                # e.g. the daemon-reload before the systemctl call failed
+                result.errors.append(e)
 
     def _save_state(self, plan_result: PlanResult, apply_result: ApplyResult) -> None:
         """
@@ -249,57 +524,61 @@ class Executor:
             # State persistence not available
             return
 
-        with Store() as store:
-            user = os.getenv("USER", "unknown")
-            hostname = socket.gethostname()
-            timestamp = datetime.now()
+        user = os.getenv("USER", "unknown")
+        hostname = socket.gethostname()
+        timestamp = datetime.now()
+        changed = set(apply_result.changed_resources)
 
-            for resource in self.resources:
-                plan = plan_result.plans.get(resource.id)
-                if not plan:
-                    continue
-
-                # Determine status
-                if resource.id in apply_result.changed_resources:
-                    status = "success"
-                else:
-                    status = "unchanged"
-
-                # Save resource state
-                state = ResourceState(
-                    id=resource.id,
-                    type=resource.resource_type(),
-                    desired_state=resource._desired_state,
-                    actual_state=resource._actual_state,
-                    applied_at=timestamp,
-                    applied_by=user,
+        states = []
+        entries = []
+        for resource in self.resources:
+            plan = plan_result.plans.get(resource.id)
+            if not plan:
+                continue
+
+            # Determine status
+            if resource.id in changed:
+                status = "success"
+            else:
+                status = "unchanged"
+
+            # Save resource state
+            states.append(ResourceState(
+                id=resource.id,
+                type=resource.resource_type(),
+                desired_state=resource._desired_state,
+                actual_state=resource._actual_state,
+                applied_at=timestamp,
+                applied_by=user,
+                hostname=hostname,
+                config_file=self.config_file or "unknown",
+                status=status,
+            ))
+
+            # Add history entry if changed
+            if resource.id in changed:
+                changes = {
+                    c.field: {"from": c.from_value, "to": c.to_value}
+                    for c in plan.changes
+                }
+
+                entries.append(HistoryEntry(
+                    timestamp=timestamp,
+                    resource_id=resource.id,
+                    action=plan.action.value,
+                    user=user,
                     hostname=hostname,
-                    config_file=self.config_file or "unknown",
-                    status=status,
-                )
-                store.save_resource(state)
-
-                # Add history entry if changed
-                if resource.id in apply_result.changed_resources:
-                    changes = {
-                        c.field: {"from": c.from_value, "to": c.to_value}
-                        for c in plan.changes
-                    }
-
-                    entry = HistoryEntry(
-                        timestamp=timestamp,
-                        resource_id=resource.id,
-                        action=plan.action.value,
-                        user=user,
-                        hostname=hostname,
-                        success=resource.id in apply_result.changed_resources,
-                        changes=changes,
-                    )
-                    store.add_history(entry)
+                    success=True,
+                    changes=changes,
+                ))
+
+        # One statement per table, one commit for the run
+        with Store() as store, store.transaction():
+            store.save_resources(states)
+            store.add_history_batch(entries)
 
     def clear(self) -> None:
         """Clear all resources."""
-        self.resources.clear()
         self._registry.clear()
 
 
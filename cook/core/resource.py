@@ -9,13 +9,15 @@ import platform as platform_module
 from abc import ABC, abstractmethod
 from dataclasses import dataclass, field
 from enum import Enum
-from typing import TYPE_CHECKING, Any, Dict, List, Optional
+from functools import lru_cache
+from typing import TYPE_CHECKING, Any, Dict, FrozenSet, Hashable, List, Optional, Tuple
 
 if TYPE_CHECKING:
+    from cook.core.executor import Executor
     from cook.transport import Transport
 else:
     # Import NullTransport at runtime for default value
-    from cook.transport import NullTransport, Transport
+    from cook.transport import LocalTransport, NullTransport, Transport
 
 
 class Action(Enum):
@@ -31,6 +33,9 @@ class Action(Enum):
 class Change:
     """Represents a single property change."""
 
+    # One per changed property per resource, so skip the per-instance dict
+    __slots__ = ("field", "from_value", "to_value")
+
     field: str
     from_value: Any
     to_value: Any
@@ -55,6 +60,11 @@ class Plan:
         """Check if plan has any changes."""
         return self.action != Action.NONE and len(self.changes) > 0
 
+    @property
+    def changed_fields(self) -> FrozenSet[str]:
+        """Names of the properties this plan changes."""
+        return frozenset(change.field for change in self.changes)
+
     def __str__(self):
         if self.action == Action.NONE:
             return "No changes"
@@ -67,14 +77,26 @@ class Plan:
         return "\n".join(lines)
 
 
-@dataclass
+@dataclass(frozen=True)
 class Platform:
-    """Platform information (OS, distro, version)."""
+    """Platform information (OS, distro, version). Immutable and hashable."""
 
     system: str  # Linux, Darwin, Windows
     distro: str  # ubuntu, debian, arch, etc.
     version: str
     arch: str
+    codename: str = ""  # jammy, bookworm, etc. (empty if unknown)
+    distro_like: str = ""  # os-release ID_LIKE, e.g. "ubuntu debian" on Mint
+
+    @staticmethod
+    def _parse_os_release(content: str) -> Dict[str, str]:
+        """Parse /etc/os-release KEY=value lines into a dict."""
+        fields = {}
+        for line in content.split("\n"):
+            if "=" in line:
+                key, value = line.split("=", 1)
+                fields[key.strip()] = value.strip().strip('"')
+        return fields
 
     @classmethod
     def detect(cls, transport: Optional["Transport"] = None) -> "Platform":
@@ -87,79 +109,102 @@ class Platform:
         Returns:
             Platform information
         """
-        # Use local detection if no transport provided
-        if transport is None:
-            system = platform_module.system()
-            arch = platform_module.machine()
-
-            # Detect distro on Linux
-            distro = "unknown"
-            version = ""
+        # A LocalTransport inspects this machine too, so it shares the cached
+        # local result instead of running uname and reading os-release again
+        if transport is None or isinstance(transport, LocalTransport):
+            return cls._detect_local()
 
-            if system == "Linux":
-                try:
-                    import distro as distro_lib
-
-                    distro = distro_lib.id()
-                    version = distro_lib.version()
-                except ImportError:
-                    # Fallback: read /etc/os-release
-                    try:
-                        with open("/etc/os-release") as f:
-                            for line in f:
-                                if line.startswith("ID="):
-                                    distro = line.split("=")[1].strip().strip('"')
-                                elif line.startswith("VERSION_ID="):
-                                    version = line.split("=")[1].strip().strip('"')
-                    except FileNotFoundError:
-                        pass
-            elif system == "Darwin":
-                distro = "macos"
-                version = platform_module.mac_ver()[0]
-
-            return cls(
-                system=system,
-                distro=distro,
-                version=version,
-                arch=arch,
-            )
-
-        # Remote platform detection via transport
-        else:
-            # Detect system
-            output, _ = transport.run_shell("uname -s")
-            system = output.strip()
-
-            # Detect architecture
-            output, _ = transport.run_shell("uname -m")
-            arch = output.strip()
+        return cls._detect_remote(transport)
 
-            distro = "unknown"
-            version = ""
+    @classmethod
+    @lru_cache(maxsize=1)
+    def _detect_local(cls) -> "Platform":
+        """
+        Detect the local platform once per process.
 
-            # Detect distro on Linux
-            if system == "Linux":
-                # Try reading /etc/os-release
+        Tests that fake the local platform call
+        Platform._detect_local.cache_clear().
+        """
+        system = platform_module.system()
+        arch = platform_module.machine()
+
+        # Detect distro on Linux
+        distro = "unknown"
+        version = ""
+        codename = ""
+        distro_like = ""
+
+        if system == "Linux":
+            try:
+                import distro as distro_lib
+
+                distro = distro_lib.id()
+                version = distro_lib.version()
+                codename = distro_lib.codename()
+                distro_like = distro_lib.like()
+            except ImportError:
+                # Fallback: read /etc/os-release
                 try:
-                    content = transport.read_file("/etc/os-release").decode()
-                    for line in content.split("\n"):
-                        if line.startswith("ID="):
-                            distro = line.split("=")[1].strip().strip('"')
-                        elif line.startswith("VERSION_ID="):
-                            version = line.split("=")[1].strip().strip('"')
-                except (FileNotFoundError, Exception):
+                    with open("/etc/os-release") as f:
+                        fields = cls._parse_os_release(f.read())
+                    distro = fields.get("ID", distro)
+                    version = fields.get("VERSION_ID", version)
+                    codename = fields.get("VERSION_CODENAME", codename)
+                    distro_like = fields.get("ID_LIKE", distro_like)
+                except FileNotFoundError:
                     pass
-            elif system == "Darwin":
-                distro = "macos"
-                output, _ = transport.run_shell("sw_vers -productVersion")
-                version = output.strip()
+        elif system == "Darwin":
+            distro = "macos"
+            version = platform_module.mac_ver()[0]
+
+        return cls(
+            system=system,
+            distro=distro,
+            version=version,
+            arch=arch,
+            codename=codename,
+            distro_like=distro_like,
+        )
 
-            return cls(
-                system=system,
-                distro=distro,
-                version=version,
-                arch=arch,
-            )
+    @classmethod
+    def _detect_remote(cls, transport: "Transport") -> "Platform":
+        """Detect the platform of the host behind a transport."""
+        # Detect system and architecture in one round trip
+        output, _ = transport.run_command(["uname", "-s", "-m"])
+        parts = output.split()
+        system = parts[0] if parts else ""
+        arch = parts[1] if len(parts) > 1 else ""
+
+        distro = "unknown"
+        version = ""
+        codename = ""
+        distro_like = ""
+
+        # Detect distro on Linux
+        if system == "Linux":
+            # Try reading /etc/os-release
+            try:
+                content = transport.read_file("/etc/os-release").decode()
+                fields = cls._parse_os_release(content)
+                distro = fields.get("ID", distro)
+                version = fields.get("VERSION_ID", version)
+                codename = fields.get("VERSION_CODENAME", codename)
+                distro_like = fields.get("ID_LIKE", distro_like)
+            except (FileNotFoundError, Exception):
+                pass
+        elif system == "Darwin":
+            distro = "macos"
+            output, _ = transport.run_shell("sw_vers -productVersion")
+            version = output.strip()
+
+        return cls(
+            system=system,
+            distro=distro,
+            version=version,
+            arch=arch,
+            codename=codename,
+            distro_like=distro_like,
+        )
 
 
 class Resource(ABC):
@@ -186,6 +231,10 @@ class Resource(ABC):
         self._actual_state: Dict[str, Any] = {}
         # Use NullTransport by default - raises helpful errors if used before executor sets real transport
         self._transport: "Transport" = NullTransport()
+        # Executor this resource was added to (set by Executor.add)
+        self._executor: Optional["Executor"] = None
+        # Built on first use of id (subclasses may set up resource_type later)
+        self._id: Optional[str] = None
 
     @property
     def id(self) -> str:
@@ -194,8 +243,12 @@ class Resource(ABC):
 
         Format: resource_type:name
         Example: file:/etc/nginx.conf, pkg:nginx
+
+        Built once; ids key the registry, plans and state on every lookup.
         """
-        return f"{self.resource_type()}:{self.name}"
+        if self._id is None:
+            self._id = f"{self.resource_type()}:{self.name}"
+        return self._id
 
     @abstractmethod
     def resource_type(self) -> str:
@@ -207,6 +260,10 @@ class Resource(ABC):
         """
         Check current state of the resource.
 
+        Checks run concurrently on the executor's thread pool during plan(),
+        so they must only inspect the system: no writes, and no state shared
+        with other resources.
+
         Args:
             platform: Platform information
 
@@ -321,6 +378,55 @@ class Resource(ABC):
         """
         pass
 
+    @classmethod
+    def prefetch(cls, resources: List["Resource"], platform: Platform) -> None:
+        """
+        Gather state for several resources of this type before their checks.
+
+        Called by Executor.plan() once per resource type, so a type can
+        replace one lookup per resource with a single bulk call. Default:
+        nothing to gather.
+
+        Args:
+            resources: Resources of this type, in declaration order
+            platform: Platform information
+        """
+
+    def batch_key(self, plan: Plan, platform: Platform) -> Optional[Hashable]:
+        """
+        Key under which this change may be merged with neighbouring changes.
+
+        Consecutive changes in apply order with the same non-None key are
+        applied together through apply_batch(). Default: never batched.
+        """
+        return None
+
+    @classmethod
+    def apply_batch(cls, batch: List[Tuple["Resource", Plan]], platform: Platform) -> None:
+        """
+        Apply several changes sharing one batch_key() in a single step.
+
+        Default: apply each change in turn, so a type overriding
+        batch_key() alone still works.
+
+        Args:
+            batch: (resource, plan) pairs, in apply order
+            platform: Platform information
+        """
+        for resource, plan in batch:
+            resource.apply(plan, platform)
+
+    def apply_paths(self, plan: Plan, platform: Platform) -> Optional[Tuple[str, ...]]:
+        """
+        Filesystem paths this change creates, modifies or removes.
+
+        With Executor(apply_workers > 1), changes whose paths are unrelated
+        (neither equal nor one inside the other) may be applied at the same
+        time. Default None: the footprint is unknown, so the change is
+        applied alone, after everything declared before it.
+        """
+        return None
+
     def __repr__(self):
         return f"{self.__class__.__name__}(name={self.name!r})"
 
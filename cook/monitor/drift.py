@@ -8,10 +8,15 @@ from dataclasses import dataclass, field
 from datetime import datetime
 from typing import Any, Dict, List, Optional
 
-from cook.core. import Platform
+from cook.core import Platform
 from cook.state import ResourceState, Store
 
 
+# Stored actual_state key holding the (mtime, size, mode) a file had when its
+# content last checked out clean; never compared as resource state
+SIGNATURE_KEY = "stat_signature"
+
+
 @dataclass
 class DriftResult:
     """Result of drift detection."""
@@ -53,6 +58,12 @@ class DriftDetector:
         if not resource:
             return None
 
+        # Fast path: a file whose stat matches the last clean check is
+        # unchanged, so its content isn't read again
+        signature = self._signature(resource) if state.type == "file" else None
+        if signature is not None and signature == state.actual_state.get(SIGNATURE_KEY):
+            return DriftResult(resource_id=resource_id, drifted=False)
+
         # Check current state
         current_state = resource.check(self.platform)
 
@@ -63,6 +74,9 @@ class DriftDetector:
         if drifted:
             state.status = "drift"
             self.store.save_resource(state)
+        elif signature is not None:
+            state.actual_state[SIGNATURE_KEY] = signature
+            self.store.save_resource(state)
 
         return DriftResult(
             resource_id=resource_id,
@@ -80,10 +94,12 @@ class DriftDetector:
         results = []
         resources = self.store.list_resources()
 
-        for state in resources:
-            result = self.check_resource(state.id)
-            if result:
-                results.append(result)
+        # Drift updates from the whole sweep commit together
+        with self.store.transaction():
+            for state in resources:
+                result = self.check_resource(state.id)
+                if result:
+                    results.append(result)
 
         return results
 
@@ -129,6 +145,30 @@ class DriftDetector:
         except Exception:
             return None
 
+    def _signature(self, resource) -> Optional[List[Optional[float]]]:
+        """
+        Cheap change indicator for a file: one stat, no content read.
+
+        Args:
+            resource: File resource
+
+        Returns:
+            [mtime, size, permission bits, uid, gid, ctime], or None if the
+            file is missing. ctime moves on any inode change, so an edit
+            whose mtime was reset still counts; it is None where the
+            transport cannot see it (SFTP)
+        """
+        try:
+            st = resource._transport.stat(resource.path)
+        except Exception:
+            return None
+        if st is None:
+            return None
+        return [
+            st.st_mtime, st.st_size, st.st_mode & 0o7777,
+            st.st_uid, st.st_gid, getattr(st, "st_ctime", None),
+        ]
+
     def _compare_states(
         self, stored_state: Dict[str, Any], current_state: Dict[str, Any]
     ) -> tuple[bool, Dict[str, Any]]:
@@ -147,7 +187,7 @@ class DriftDetector:
 
         # Check each property
         for key, stored_value in stored_state.items():
-            if key == "exists":
+            if key == "exists" or key == SIGNATURE_KEY:
                 continue
 
             current_value = current_state.get(key)
@@ -15,6 +15,15 @@ class CodeGenerator:
     Converts ParsedResource objects into executable Cook configurations.
     """
 
+    # (resource type, class to import, section comment, generator method),
+    # in output order
+    SECTIONS = (
+        ('package', 'Package', '# Package installations', '_generate_package'),
+        ('file', 'File', '# File operations', '_generate_file'),
+        ('service', 'Service', '# Service management', '_generate_service'),
+        ('exec', 'Exec', '# Command executions', '_generate_command'),
+    )
+
     def __init__(self):
         self.imports = set()
 
@@ -22,6 +31,9 @@ class CodeGenerator:
         """
         Generate Python code from resources.
 
+        A long shell history repeats commands, so identical statements are
+        emitted once per section, at their first position.
+
         Args:
             resources: List of ParsedResource objects
 
@@ -30,21 +42,14 @@ class CodeGenerator:
         """
         self.imports.clear()
 
-        # Group resources by type
-        packages = [r for r in resources if r.type == 'package']
-        files = [r for r in resources if r.type == 'file']
-        services = [r for r in resources if r.type == 'service']
-        commands = [r for r in resources if r.type == 'exec']
-
-        # Determine required imports
-        if packages:
-            self.imports.add('Package')
-        if files:
-            self.imports.add('File')
-        if services:
-            self.imports.add('Service')
-        if commands:
-            self.imports.add('Exec')
+        # Group resources by type, rendering each into its section
+        sections: Dict[str, Dict[str, None]] = {}
+        for resource_type, class_name, _, method in self.SECTIONS:
+            matching = [r for r in resources if r.type == resource_type]
+            if matching:
+                self.imports.add(class_name)
+                render = getattr(self, method)
+                sections[resource_type] = dict.fromkeys(render(r) for r in matching)
 
         # Generate code sections
         parts = []
@@ -62,29 +67,11 @@ class CodeGenerator:
             parts.append('')
 
         # Resources
-        if packages:
-            parts.append('# Package installations')
-            for resource in packages:
-                parts.append(self._generate_package(resource))
-            parts.append('')
-
-        if files:
-            parts.append('# File operations')
-            for resource in files:
-                parts.append(self._generate_file(resource))
-            parts.append('')
-
-        if services:
-            parts.append('# Service management')
-            for resource in services:
-                parts.append(self._generate_service(resource))
-            parts.append('')
-
-        if commands:
-            parts.append('# Command executions')
-            for resource in commands:
-                parts.append(self._generate_command(resource))
-            parts.append('')
+        for resource_type, _, comment, _ in self.SECTIONS:
+            if resource_type in sections:
+                parts.append(comment)
+                parts.extend(sections[resource_type])
+                parts.append('')
 
         return '\n'.join(parts)
 
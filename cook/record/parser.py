@@ -29,26 +29,34 @@ class CommandParser:
     - git clone
     """
 
+    # (pattern, handler method) pairs compiled once at import; the first
+    # pattern that matches wins, so order matters
+    PATTERNS = (
+        # Package managers
+        (re.compile(r'apt(?:-get)?\s+install\s+(?:-y\s+)?(.+)'), '_parse_apt_install'),
+        (re.compile(r'dnf\s+install\s+(?:-y\s+)?(.+)'), '_parse_dnf_install'),
+        (re.compile(r'pacman\s+-S\s+(.+)'), '_parse_pacman_install'),
+        (re.compile(r'brew\s+install\s+(.+)'), '_parse_brew_install'),
+
+        # Service management
+        (re.compile(r'systemctl\s+(start|stop|restart|reload|enable|disable)\s+(.+)'), '_parse_systemctl'),
+
+        # File operations
+        (re.compile(r'mkdir\s+(?:-p\s+)?(.+)'), '_parse_mkdir'),
+        (re.compile(r'touch\s+(.+)'), '_parse_touch'),
+        (re.compile(r'chmod\s+(\d+)\s+(.+)'), '_parse_chmod'),
+        (re.compile(r'chown\s+([\w-]+):?([\w-]*)\s+(.+)'), '_parse_chown'),
+
+        # Git
+        (re.compile(r'git\s+clone\s+(\S+)(?:\s+(\S+))?'), '_parse_git_clone'),
+    )
+
+    # Every pattern above contains one of these words, so a single search
+    # rejects most history lines (cd, ls, vim...) without trying the table
+    KEYWORDS = re.compile(r'apt|dnf|pacman|brew|systemctl|mkdir|touch|chmod|chown|git')
+
     def __init__(self):
-        self.patterns = [
-            # Package managers
-            (re.compile(r'apt(?:-get)?\s+install\s+(?:-y\s+)?(.+)'), self._parse_apt_install),
-            (re.compile(r'dnf\s+install\s+(?:-y\s+)?(.+)'), self._parse_dnf_install),
-            (re.compile(r'pacman\s+-S\s+(.+)'), self._parse_pacman_install),
-            (re.compile(r'brew\s+install\s+(.+)'), self._parse_brew_install),
-
-            # Service management
-            (re.compile(r'systemctl\s+(start|stop|restart|reload|enable|disable)\s+(.+)'), self._parse_systemctl),
-
-            # File operations
-            (re.compile(r'mkdir\s+(?:-p\s+)?(.+)'), self._parse_mkdir),
-            (re.compile(r'touch\s+(.+)'), self._parse_touch),
-            (re.compile(r'chmod\s+(\d+)\s+(.+)'), self._parse_chmod),
-            (re.compile(r'chown\s+([\w-]+):?([\w-]*)\s+(.+)'), self._parse_chown),
-
-            # Git
-            (re.compile(r'git\s+clone\s+(\S+)(?:\s+(\S+))?'), self._parse_git_clone),
-        ]
+        self.patterns = [(pattern, getattr(self, handler)) for pattern, handler in self.PATTERNS]
 
     def parse(self, command: str) -> Optional[ParsedResource]:
         """
@@ -63,6 +71,8 @@ class CommandParser:
         command = command.strip()
         if not command or command.startswith('#'):
             return None
+        if not self.KEYWORDS.search(command):
+            return None
 
         # Try each pattern
         for pattern, handler in self.patterns:
@@ -23,14 +23,27 @@ import hashlib
 import re
 import shlex
 from enum import Enum
-from typing import Any, Dict, List, Optional
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple
 
 from cook.core.executor import get_executor
 from cook.core import Plan, Platform, Resource
 from cook.logging import get_cook_logger
 
+if TYPE_CHECKING:
+    from cook.transport import Transport
+
 logger = get_cook_logger(__name__)
 
+# Valid environment variable name
+ENV_NAME_RE = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+# Every character that any of Exec.DANGEROUS_PATTERNS needs to match; a
+# command without any of them skips the pattern regexes entirely
+DANGEROUS_CHARS = frozenset(";&|$`<>\n\r")
+
+# Characters that allow command injection through a path or env value
+INJECTION_CHARS = [";", "&", "|", "$", "`", "\n", "\r"]
+
 
 class SecurityLevel(Enum):
     """Security validation levels."""
@@ -54,6 +67,8 @@ class Exec(Resource):
     - creates: Run only if file/dir doesn't exist
     - unless: Run only if command returns non-zero
     - only_if: Run only if command returns zero
+    - unless_fn / only_if_fn: Python predicates given the transport, for
+      guards that would otherwise pipe a command through grep
     - checksum: Track command changes via checksum
 
     Security options:
@@ -72,6 +87,12 @@ class Exec(Resource):
              command="curl -sS https://getcomposer.org/installer | php",
              unless="which composer")
 
+        # Declared footprint: may run next to unrelated changes
+        Exec("download-wordpress",
+             command="wget -O /tmp/wordpress.zip https://wordpress.org/latest.zip",
+             creates="/tmp/wordpress.zip",
+             paths=["/tmp/wordpress.zip"])
+
         # Dry run mode
         Exec("deploy",
              command="./deploy.sh",
@@ -105,13 +126,25 @@ class Exec(Resource):
         r"\bmkfs\.",  # Format filesystem
         r"\b:\(\)\{\s*:\|:\&\s*\};:",  # Fork bomb
         r"\bchmod\s+777",  # World-writable
-        r"\bchown\s+.*root",  # Change to root
-        r"curl.*\|\s*(bash|sh)",  # Pipe to shell
-        r"wget.*\|\s*(bash|sh)",  # Pipe to shell
         r"\beval\s",  # Eval injection
         r"/dev/sd[a-z]",  # Direct disk access
     ]
 
+    # Compiled once per class. Each list is also fused into one alternation
+    # that screens a command in a single scan; the per-pattern loop (which
+    # names what matched) only runs when the screen hits.
+    _PATTERN_RES = [(pattern, re.compile(pattern)) for pattern in DANGEROUS_PATTERNS]
+    _COMMAND_RES = [(pattern, re.compile(pattern, re.IGNORECASE)) for pattern in DANGEROUS_COMMANDS]
+    _ANY_PATTERN_RE = re.compile("|".join(DANGEROUS_PATTERNS))
+    _ANY_COMMAND_RE = re.compile("|".join(f"(?:{p})" for p in DANGEROUS_COMMANDS), re.IGNORECASE)
+
+    # Checked in two scans each rather than as "curl.*\|\s*sh" and
+    # "chown\s+.*root": those regexes backtrack on long inputs, and
+    # bounding the ".*" lets a long enough command through
+    _DOWNLOAD_RE = re.compile(r"curl|wget", re.IGNORECASE)  # Pipe to shell
+    _PIPE_TO_SHELL_RE = re.compile(r"\|\s*(?:ba)?sh\b", re.IGNORECASE)
+    _CHOWN_RE = re.compile(r"\bchown\s", re.IGNORECASE)  # Change to root
+
     def __init__(
         self,
         name: str,
@@ -119,6 +152,8 @@ class Exec(Resource):
         creates: Optional[str] = None,
         unless: Optional[str] = None,
         only_if: Optional[str] = None,
+        unless_fn: Optional[Callable[["Transport"], bool]] = None,
+        only_if_fn: Optional[Callable[["Transport"], bool]] = None,
         cwd: Optional[str] = None,
         environment: Optional[Dict[str, str]] = None,
         dry_run: bool = False,
@@ -126,6 +161,7 @@ class Exec(Resource):
         security_level: str = "strict",  # STRICT BY DEFAULT
         allow_pipes: bool = True,
         allow_redirects: bool = True,
+        paths: Optional[List[str]] = None,
         **options,
     ):
         """
@@ -137,6 +173,9 @@ class Exec(Resource):
             creates: Only run if this file doesn't exist
             unless: Only run if this command fails
             only_if: Only run if this command succeeds
+            unless_fn: Only run if this returns False; called with the
+                transport, so it inspects the target host
+            only_if_fn: Only run if this returns True; called with the transport
             cwd: Working directory
             environment: Environment variables
             dry_run: Preview mode - don't execute (default: False)
@@ -144,20 +183,28 @@ class Exec(Resource):
             security_level: "none", "warn", or "strict" (default: "strict")
             allow_pipes: Allow pipe (|) in commands (default: True)
             allow_redirects: Allow redirects (>, <) in commands (default: True)
+            paths: Every path the command writes or reads from earlier
+                changes. With Executor(apply_workers > 1) the command may
+                then run next to unrelated changes instead of alone
             **options: Additional options
         """
         super().__init__(name, **options)
 
         self.command = command
         self.creates = creates
+        # Whether creates exists, if prefetch() already looked
+        self._creates_exists: Optional[bool] = None
         self.unless = unless
         self.only_if = only_if
+        self.unless_fn = unless_fn
+        self.only_if_fn = only_if_fn
         self.cwd = cwd
         self.environment = environment or {}
         self.dry_run = dry_run
         self.safe_mode = safe_mode
         self.allow_pipes = allow_pipes
         self.allow_redirects = allow_redirects
+        self.paths = paths
 
         # Parse security level
         try:
@@ -238,24 +285,37 @@ class Exec(Resource):
         issues = []
 
         # Check for dangerous patterns
-        for pattern in self.DANGEROUS_PATTERNS:
-            # Skip allowed patterns
-            if pattern == r"\|" and self.allow_pipes:
-                continue
-            if pattern in [r">", r"<"] and self.allow_redirects:
-                continue
-
-            if re.search(pattern, cmd):
-                issues.append(
-                    f"{context}: Contains dangerous pattern '{pattern.replace(chr(92), '')}' in: {cmd[:50]}..."
-                )
+        if not DANGEROUS_CHARS.isdisjoint(cmd) and self._ANY_PATTERN_RE.search(cmd):
+            for pattern, regex in self._PATTERN_RES:
+                # Skip allowed patterns
+                if pattern == r"\|" and self.allow_pipes:
+                    continue
+                if pattern in [r">", r"<"] and self.allow_redirects:
+                    continue
+
+                if regex.search(cmd):
+                    issues.append(
+                        f"{context}: Contains dangerous pattern '{pattern.replace(chr(92), '')}' in: {cmd[:50]}..."
+                    )
 
         # Check for dangerous commands
-        for pattern in self.DANGEROUS_COMMANDS:
-            if re.search(pattern, cmd, re.IGNORECASE):
-                issues.append(
-                    f"{context}: Contains dangerous command pattern matching '{pattern}'"
-                )
+        if self._ANY_COMMAND_RE.search(cmd):
+            for pattern, regex in self._COMMAND_RES:
+                if regex.search(cmd):
+                    issues.append(
+                        f"{context}: Contains dangerous command pattern matching '{pattern}'"
+                    )
+
+        # Any later pipe into a shell, however far past the download
+        download = self._DOWNLOAD_RE.search(cmd)
+        if download and self._PIPE_TO_SHELL_RE.search(cmd, download.end()):
+            issues.append(f"{context}: Pipes {download.group(0)} output to a shell")
+
+        for line in cmd.splitlines():
+            chown = self._CHOWN_RE.search(line)
+            if chown and "root" in line[chown.end():].lower():
+                issues.append(f"{context}: Changes ownership to root")
+                break
 
         # Check for environment variable injection
         if "$" in cmd and "${" not in cmd and "$(" not in cmd:
@@ -271,8 +331,7 @@ class Exec(Resource):
         issues = []
 
         # Check for command injection in paths
-        dangerous = [";", "&", "|", "$", "`", "\n", "\r"]
-        for char in dangerous:
+        for char in INJECTION_CHARS:
             if char in path:
                 issues.append(
                     f"{context}: Path contains dangerous character '{char}': {path}"
@@ -293,14 +352,13 @@ class Exec(Resource):
         issues = []
 
         # Check key
-        if not re.match(r"^[A-Za-z_][A-Za-z0-9_]*$", key):
+        if not ENV_NAME_RE.match(key):
             issues.append(
                 f"environment: Invalid variable name '{key}' (must be alphanumeric)"
             )
 
         # Check value for command injection
-        dangerous = [";", "&", "|", "$", "`", "\n", "\r"]
-        for char in dangerous:
+        for char in INJECTION_CHARS:
             if char in value:
                 issues.append(
                     f"environment: Variable '{key}' contains dangerous character '{char}'"
@@ -308,14 +366,36 @@ class Exec(Resource):
 
         return issues
 
+    @classmethod
+    def prefetch(cls, resources: List[Resource], platform: Platform) -> None:
+        """
+        Stat every creates path with one transport.stat_many() call.
+
+        If that fails, nothing is recorded and each check() looks itself.
+        """
+        guarded = [resource for resource in resources if resource.creates]
+        if len(guarded) < 2:
+            return
+
+        try:
+            stats = guarded[0]._transport.stat_many([resource.creates for resource in guarded])
+        except IOError:
+            return
+        for resource, st in zip(guarded, stats):
+            resource._creates_exists = st is not None
+
     def check(self, platform: Platform) -> Dict[str, Any]:
         """Check if exec should run."""
         should_run = True
         warnings = []
 
-        # Check 'creates' guard
+        # Check 'creates' guard; the plan's first check uses the answer
+        # from prefetch(), later checks (after apply) look again
         if self.creates:
-            if self._transport.file_exists(self.creates):
+            exists, self._creates_exists = self._creates_exists, None
+            if exists is None:
+                exists = self._transport.file_exists(self.creates)
+            if exists:
                 should_run = False
 
         # Check 'unless' guard (skip in dry-run)
@@ -336,6 +416,21 @@ class Exec(Resource):
             except Exception as e:
                 warnings.append(f"only_if guard failed: {e}")
 
+        # Python predicates (skip in dry-run)
+        if should_run and self.unless_fn and not self.dry_run:
+            try:
+                if self.unless_fn(self._transport):
+                    should_run = False
+            except Exception as e:
+                warnings.append(f"unless_fn guard failed: {e}")
+
+        if should_run and self.only_if_fn and not self.dry_run:
+            try:
+                if not self.only_if_fn(self._transport):
+                    should_run = False
+            except Exception as e:
+                warnings.append(f"only_if_fn guard failed: {e}")
+
         return {
             "exists": True,
             "should_run": should_run,
@@ -387,6 +482,10 @@ class Exec(Resource):
                 f"Output: {output}"
             )
 
+    def apply_paths(self, plan: Plan, platform: Platform) -> Optional[Tuple[str, ...]]:
+        """The declared paths, if any; otherwise the command runs alone."""
+        return tuple(self.paths) if self.paths else None
+
     def _build_command(self) -> str:
         """
         Build final command with environment and cwd.
@@ -9,15 +9,88 @@ Handles:
 - Symbolic links
 """
 
+import hashlib
+import mmap
+import os
+from functools import lru_cache
 from pathlib import Path
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Hashable, List, Optional, Tuple
 
 from cook.core.executor import get_executor
 from cook.core.resource import Resource, Platform, Plan, Action
+from cook.transport import LocalTransport
 
 from jinja2 import Environment, FileSystemLoader, select_autoescape
 from jinja2.exceptions import TemplateError, TemplateNotFound
 
+
+# Directories whose files systemd only picks up after a daemon-reload
+SYSTEMD_UNIT_DIRS = (
+    "/etc/systemd/system/",
+    "/run/systemd/system/",
+    "/lib/systemd/system/",
+    "/usr/lib/systemd/system/",
+)
+
+# Read size for hashing source files; memory use stays at one buffer
+SOURCE_CHUNK_SIZE = 1 << 20
+
+
+# Local files at least this large are compared with the desired content
+# through mmap instead of being read into memory
+MMAP_COMPARE_MIN = 1 << 16
+
+
+def _local_content_equals(path: str, data: bytes) -> bool:
+    """
+    Whether a local file holds exactly data, compared against its page
+    cache mapping (one memcmp, no copy of the file into a bytes object).
+    """
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size != len(data):
+            return False
+        if size == 0:
+            return True
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            with memoryview(mapped) as view:
+                return view == data
+
+
+def _file_digest(path: str) -> str:
+    """
+    Content digest of a local file, read in fixed-size chunks.
+
+    Returns:
+        "sha256:<hex>", the same form _remote_digest() produces
+    """
+    digest = hashlib.sha256()
+    buf = bytearray(SOURCE_CHUNK_SIZE)
+    view = memoryview(buf)
+    with open(path, "rb") as f:
+        while True:
+            n = f.readinto(buf)
+            if not n:
+                break
+            digest.update(view[:n])
+    return f"sha256:{digest.hexdigest()}"
+
+
+@lru_cache(maxsize=None)
+def _template_env(directory: str) -> Environment:
+    """
+    Jinja2 environment for templates in one directory, shared by all Files.
+
+    The environment keeps compiled templates, so a template rendered by
+    several resources (or with different vars) is parsed and compiled
+    once. Edits are still picked up: Jinja2 checks the file's mtime.
+    """
+    return Environment(
+        loader=FileSystemLoader(directory),
+        autoescape=select_autoescape(),  # default autoescape behavior
+        keep_trailing_newline=True,
+    )
+
 class File(Resource):
     """
     File resource for managing files and directories.
@@ -43,6 +116,11 @@ class File(Resource):
         File("/etc/nginx/site.conf",
              template="./templates/nginx-site.j2",
              vars={"domain": "example.com", "port": 80})
+
+        # Symbolic link
+        File("/etc/nginx/sites-enabled/example.com",
+             ensure="link",
+             target="/etc/nginx/sites-available/example.com")
     """
 
     def __init__(
@@ -52,10 +130,11 @@ class File(Resource):
         source: Optional[str] = None,
         template: Optional[str] = None,
         vars: Optional[Dict[str, Any]] = None,
-        ensure: str = "file",  # "file", "directory", "absent"
+        ensure: str = "file",  # "file", "directory", "link", "absent"
         mode: Optional[int] = None,
         owner: Optional[str] = None,
         group: Optional[str] = None,
+        target: Optional[str] = None,
         **options,
     ):
         """
@@ -67,14 +146,18 @@ class File(Resource):
             source: Path to source file
             template: Path to Jinja2 template
             vars: Template variables
-            ensure: "file", "directory", or "absent"
+            ensure: "file", "directory", "link", or "absent"
             mode: File mode (e.g., 0o644)
             owner: Owner username
             group: Group name
+            target: Path the link points to (ensure="link")
             **options: Additional options
         """
         super().__init__(path, **options)
 
+        if ensure == "link" and not target:
+            raise ValueError(f"File {path}: ensure='link' requires a target")
+
         self.path = path
         self.content = content
         self.source = source
@@ -84,6 +167,11 @@ class File(Resource):
         self.mode = mode
         self.owner = owner
         self.group = group
+        self.target = target
+        # Inline content encoded once, for checks and writes
+        self._encoded: Tuple[Optional[str], Optional[bytes]] = (
+            content, None if content is None else content.encode("utf-8")
+        )
 
         # Auto-register with global executor
         get_executor().add(self)
@@ -103,6 +191,13 @@ class File(Resource):
             "size": None,
         }
 
+        if self.ensure == "link":
+            # The link itself, not what it points to (which may not exist)
+            output, code = self._transport.run_command(["readlink", self.path])
+            if code == 0:
+                state.update(exists=True, type="symlink", target=output.strip())
+                return state
+
         # Check if file exists via transport
         if not self._transport.file_exists(self.path):
             return state
@@ -137,11 +232,19 @@ class File(Resource):
                 state["owner"] = owner
                 state["group"] = group
 
-        # Read content for files
-        if state["type"] == "file":
+        # Source files are compared by digest, so neither side is loaded
+        if state["type"] == "file" and self.source is not None:
+            state["content"] = self._remote_digest()
+        elif state["type"] == "file" and self._matches_large_local(state["size"]):
+            state["content"] = self.content
+        elif state["type"] == "file":
             try:
                 content = self._transport.read_file(self.path)
-                state["content"] = content.decode("utf-8")
+                if self.content is not None and content == self._encode(self.content):
+                    # Unchanged: the desired text, no decode
+                    state["content"] = self.content
+                else:
+                    state["content"] = content.decode("utf-8")
             except (UnicodeDecodeError, Exception):
                 # Binary file or read error
                 state["content"] = None
@@ -158,11 +261,16 @@ class File(Resource):
         if self.ensure == "absent":
             return state
 
+        if self.ensure == "link":
+            state["type"] = "symlink"
+            state["target"] = self.target
+            return state
+
         # Get desired content
         if self.content is not None:
             state["content"] = self.content
         elif self.source is not None:
-            state["content"] = self._read_source()
+            state["content"] = self._source_digest()
         elif self.template is not None:
             state["content"] = self._render_template()
         else:
@@ -182,13 +290,136 @@ class File(Resource):
         """Apply file changes."""
         path = Path(self.path)
 
-        if plan.action == Action.DELETE:
+        if self.ensure == "link" and plan.action != Action.NONE:
+            # Created and retargeted the same way: atomic replace
+            self._transport.symlink(self.target, self.path)
+        elif plan.action == Action.DELETE:
             self._delete(path)
         elif plan.action == Action.CREATE:
             self._create(path)
         elif plan.action == Action.UPDATE:
             self._update(path, plan)
 
+        self._request_daemon_reload()
+
+    def apply_paths(self, plan: Plan, platform: Platform) -> Optional[Tuple[str, ...]]:
+        """
+        A file change writes its own path and reads its source or
+        template, which an earlier change may write.
+        """
+        return (self.path,) + tuple(path for path in (self.source, self.template) if path is not None)
+
+    def batch_key(self, plan: Plan, platform: Platform) -> Optional[Hashable]:
+        """
+        Neighbouring content writes merge into one transport write_files()
+        call, and neighbouring new directories into one mkdir.
+        """
+        if plan.action == Action.CREATE and self.ensure == "directory":
+            return "mkdir"
+        if self._pending_content(plan) is None:
+            return None
+        return "write"
+
+    @classmethod
+    def apply_batch(cls, batch: List[Tuple[Resource, Plan]], platform: Platform) -> None:
+        """
+        Write the content of several files at once, then apply each file's
+        remaining changes (owner, group, mode) individually.
+        """
+        if batch[0][0].ensure == "directory":
+            cls._create_directories(batch)
+            return
+
+        transport = batch[0][0]._transport
+
+        parents = [
+            str(Path(resource.path).parent)
+            for resource, plan in batch
+            if plan.action == Action.CREATE
+        ]
+        if parents:
+            transport.run_command(["mkdir", "-p"] + list(dict.fromkeys(parents)))
+
+        files = []
+        for resource, plan in batch:
+            # Written with the mode the file ends up with; existing files
+            # keep theirs unless the resource sets one, and new files
+            # without one get the umask default
+            mode = resource.mode if resource.mode is not None else resource._actual_state.get("mode")
+            files.append((resource.path, resource._pending_content(plan), mode))
+        transport.write_files(files)
+
+        for resource, plan in batch:
+            if plan.action == Action.CREATE:
+                resource._set_metadata(Path(resource.path))
+            else:
+                resource._update(Path(resource.path), plan, write_content=False)
+            resource._request_daemon_reload()
+
+    @staticmethod
+    def _create_directories(batch: List[Tuple[Resource, Plan]]) -> None:
+        """
+        Create several directories with one mkdir, then set metadata with
+        one chown/chgrp per owner and one chmod per mode, so each user and
+        group name is looked up once rather than once per directory.
+        """
+        transport = batch[0][0]._transport
+        transport.run_command(["mkdir", "-p"] + [resource.path for resource, _ in batch])
+
+        commands: Dict[Tuple[str, ...], List[str]] = {}
+        for resource, _ in batch:
+            ownership = resource._ownership_command()
+            if ownership is not None:
+                commands.setdefault(ownership, []).append(resource.path)
+        for resource, _ in batch:
+            if resource.mode is not None:
+                commands.setdefault(("chmod", oct(resource.mode)[2:]), []).append(resource.path)
+
+        for command, paths in commands.items():
+            transport.run_command(list(command) + paths)
+
+        for resource, _ in batch:
+            resource._request_daemon_reload()
+
+    def _pending_content(self, plan: Plan) -> Optional[bytes]:
+        """Content this plan writes to a regular file, if any."""
+        if self.source is not None:
+            # Copied from the source file, never held in memory
+            return None
+        if plan.action == Action.CREATE and self.ensure == "file":
+            content = self._desired_state.get("content")
+        elif plan.action == Action.UPDATE:
+            content = next(
+                (change.to_value for change in plan.changes if change.field == "content"), None
+            )
+        else:
+            return None
+        return None if content is None else self._encode(content)
+
+    def _matches_large_local(self, size: Optional[int]) -> bool:
+        """Large local file of the content's size that holds the content."""
+        if self.content is None or not isinstance(self._transport, LocalTransport):
+            return False
+        data = self._encode(self.content)
+        if size != len(data) or size < MMAP_COMPARE_MIN:
+            return False
+        try:
+            return _local_content_equals(self.path, data)
+        except OSError:
+            return False
+
+    def _encode(self, text: str) -> bytes:
+        """UTF-8 bytes of text, reusing the encoding of the inline content."""
+        cached_text, cached_bytes = self._encoded
+        if text is cached_text:
+            return cached_bytes
+        return text.encode("utf-8")
+
+    def _request_daemon_reload(self) -> None:
+        """Tell the executor a systemd unit file changed."""
+        if self._executor is not None and self.path.startswith(SYSTEMD_UNIT_DIRS):
+            self._executor.request_daemon_reload()
+
     def _create(self, path: Path) -> None:
         """Create file or directory."""
         if self.ensure == "directory":
@@ -200,8 +431,10 @@ class File(Resource):
             self._transport.run_command(["mkdir", "-p", parent])
 
             # Write content
-            if self._desired_state.get("content") is not None:
-                content_bytes = self._desired_state["content"].encode("utf-8")
+            if self.source is not None:
+                self._transport.copy_file(self.source, self.path)
+            elif self._desired_state.get("content") is not None:
+                content_bytes = self._encode(self._desired_state["content"])
                 self._transport.write_file(self.path, content_bytes)
             else:
                 # Touch file
@@ -210,11 +443,16 @@ class File(Resource):
         # Set permissions
         self._set_metadata(path)
 
-    def _update(self, path: Path, plan: Plan) -> None:
-        """Update existing file."""
+    def _update(self, path: Path, plan: Plan, write_content: bool = True) -> None:
+        """Update existing file (content already written if write_content is False)."""
         for change in plan.changes:
             if change.field == "content":
-                content_bytes = change.to_value.encode("utf-8")
+                if not write_content:
+                    continue
+                if self.source is not None:
+                    self._transport.copy_file(self.source, self.path)
+                    continue
+                content_bytes = self._encode(change.to_value)
                 self._transport.write_file(self.path, content_bytes)
             elif change.field == "mode":
                 # Convert mode to octal string for chmod
@@ -228,28 +466,34 @@ class File(Resource):
         # Use rm -rf for simplicity (transport-agnostic)
         self._transport.run_command(["rm", "-rf", self.path])
 
+    def _ownership_command(self) -> Optional[Tuple[str, ...]]:
+        """chown/chgrp command (without the path) for owner and group, if set."""
+        if self.owner is not None and self.group is not None:
+            return ("chown", f"{self.owner}:{self.group}")
+        if self.owner is not None:
+            return ("chown", self.owner)
+        if self.group is not None:
+            return ("chgrp", self.group)
+        return None
+
     def _set_metadata(self, path: Path) -> None:
         """Set file owner, group, and mode."""
         # Set owner/group via chown command
-        if self.owner is not None and self.group is not None:
-            self._transport.run_command(
-                ["chown", f"{self.owner}:{self.group}", self.path]
-            )
-        elif self.owner is not None:
-            self._transport.run_command(["chown", self.owner, self.path])
-        elif self.group is not None:
-            self._transport.run_command(["chgrp", self.group, self.path])
+        ownership = self._ownership_command()
+        if ownership is not None:
+            self._transport.run_command(list(ownership) + [self.path])
 
         # Set mode via chmod command
         if self.mode is not None:
             mode_str = oct(self.mode)[2:]
             self._transport.run_command(["chmod", mode_str, self.path])
 
-    def _read_source(self) -> str:
-        """Read content from source file.
+    def _source_digest(self) -> str:
+        """Digest of the source file.
 
-        Validates that a source path was provided and returns its text
-        content decoded as UTF-8. Raises clear errors for missing source,
+        The source is hashed in chunks rather than read whole, and copied
+        with transport.copy_file() on apply, so large or binary sources
+        never sit in memory. Raises clear errors for missing source,
         missing file, or read failures.
         """
         if self.source is None:
@@ -260,10 +504,26 @@ class File(Resource):
             raise FileNotFoundError(f"Source file not found: {self.source}")
 
         try:
-            return source_path.read_text(encoding="utf-8")
+            return _file_digest(self.source)
         except Exception as e:
             raise RuntimeError(f"Failed to read source file {self.source}: {e}") from e
 
+    def _remote_digest(self) -> Optional[str]:
+        """Digest of the target file, computed where it lives."""
+        if isinstance(self._transport, LocalTransport):
+            # Same digest in-process, no sha256sum subprocess
+            try:
+                return _file_digest(self.path)
+            except OSError:
+                return None
+
+        # sha256sum is GNU coreutils; macOS and the BSDs ship shasum
+        for args in (["sha256sum", self.path], ["shasum", "-a", "256", self.path]):
+            output, code = self._transport.run_command(args)
+            if code == 0 and output.strip():
+                return f"sha256:{output.split()[0]}"
+        return None
+
     def _render_template(self) -> str:
         """Render Jinja2 template.
 
@@ -280,12 +540,8 @@ class File(Resource):
         if not template_path.exists():
             raise FileNotFoundError(f"Template not found: {self.template}")
 
-        # Set up Jinja2 environment. Use the template's parent directory as the loader.
-        env = Environment(
-            loader=FileSystemLoader(str(template_path.parent)),
-            autoescape=select_autoescape(),  # default autoescape behavior
-            keep_trailing_newline=True,
-        )
+        # Shared Jinja2 environment rooted at the template's parent directory
+        env = _template_env(str(template_path.parent.resolve()))
 
         try:
             template = env.get_template(template_path.name)
@@ -8,10 +8,184 @@ Supports:
 - brew (macOS)
 """
 
-from typing import Any, Dict, List, Optional
+from functools import lru_cache
+from typing import Any, Dict, Hashable, List, Optional, Tuple
 
 from cook.core.executor import get_executor
 from cook.core import Action, Plan, Platform, Resource
+from cook.logging import get_cook_logger
+from cook.transport import LocalTransport, Transport
+
+logger = get_cook_logger(__name__)
+
+
+# os-release ID (or ID_LIKE entry) to package manager
+PACKAGE_MANAGERS = {
+    "ubuntu": "apt",
+    "debian": "apt",
+    "fedora": "dnf",
+    "rhel": "dnf",
+    "centos": "dnf",
+    "arch": "pacman",
+}
+
+
+@lru_cache(maxsize=8)
+def detect_package_manager(distro: str, system: str, distro_like: str = "") -> str:
+    """
+    Map a platform's distro/system to its package manager.
+
+    Derivatives are resolved through os-release ID_LIKE (e.g. Linux Mint is
+    "ubuntu debian"). Cached so that planning many Package/Repository
+    resources on the same platform resolves the package manager once.
+
+    Raises:
+        ValueError: If the platform is not supported
+    """
+    pm = PACKAGE_MANAGERS.get(distro)
+    if pm is not None:
+        return pm
+
+    for like in distro_like.split():
+        pm = PACKAGE_MANAGERS.get(like)
+        if pm is not None:
+            return pm
+
+    if system == "Darwin":
+        return "brew"
+
+    raise ValueError(f"Unsupported platform: {distro}")
+
+
+# Seconds apt-get waits for the dpkg lock held by another apt process
+# (unattended-upgrades, a concurrent cook run) instead of failing at once
+APT_LOCK_TIMEOUT = 300
+
+APT_GET = ["apt-get", "-o", f"DPkg::Lock::Timeout={APT_LOCK_TIMEOUT}"]
+
+# Each package is listed under its plain and arch-qualified names, so
+# "libc6:i386" matches as well as "nginx"
+DPKG_QUERY_FORMAT = "-f=${Package} ${Version}\n${Package}:${Architecture} ${Version}\n"
+
+# Command prefixes per operation and package manager; packages are appended
+PACKAGE_COMMANDS = {
+    "query": {
+        "apt": ["dpkg-query", "-W", DPKG_QUERY_FORMAT],
+        "dnf": ["rpm", "-q", "--queryformat", "%{NAME} %{VERSION}\n"],
+        "pacman": ["pacman", "-Q"],
+        "brew": ["brew", "list", "--versions"],
+    },
+    # Every installed package, no arguments appended
+    "list": {
+        "apt": ["dpkg-query", "-W", DPKG_QUERY_FORMAT],
+        "dnf": ["rpm", "-qa", "--queryformat", "%{NAME} %{VERSION}\n"],
+        "pacman": ["pacman", "-Q"],
+        "brew": ["brew", "list", "--versions"],
+    },
+    "install": {
+        "apt": APT_GET + ["install", "-y"],
+        "dnf": ["dnf", "install", "-y"],
+        "pacman": ["pacman", "-S", "--noconfirm"],
+        "brew": ["brew", "install"],
+    },
+    "remove": {
+        "apt": APT_GET + ["remove", "-y"],
+        "dnf": ["dnf", "remove", "-y"],
+        "pacman": ["pacman", "-R", "--noconfirm"],
+        "brew": ["brew", "uninstall"],
+    },
+    "upgrade": {
+        "apt": APT_GET + ["install", "--only-upgrade", "-y"],
+        "dnf": ["dnf", "upgrade", "-y"],
+        # No -y: refreshing the databases without a full -Syu is a partial
+        # upgrade; the cache refresh (pacman -Sy) stays with update_cache
+        "pacman": ["pacman", "-S", "--needed", "--noconfirm"],
+        "brew": ["brew", "upgrade"],
+    },
+}
+
+# Plan action to (PACKAGE_COMMANDS operation, error message)
+ACTION_OPERATIONS = {
+    Action.CREATE: ("install", "Package installation failed"),
+    Action.DELETE: ("remove", "Package removal failed"),
+    Action.UPDATE: ("upgrade", "Package upgrade failed"),
+}
+
+# Environment for apt tools so they never stop at a prompt
+APT_ENV = {"DEBIAN_FRONTEND": "noninteractive"}
+
+# Cache refresh command and the exit codes that mean success
+# (dnf check-update returns 100 if updates are available, 0 if not)
+CACHE_UPDATE_COMMANDS = {
+    "apt": (APT_GET + ["update", "-y"], (0,)),
+    "dnf": (["dnf", "check-update", "-y"], (0, 100)),
+    "pacman": (["pacman", "-Sy"], (0,)),
+    "brew": (["brew", "update"], (0,)),
+}
+
+
+def run_package_command(transport: Transport, pm: str, cmd: List[str]) -> Tuple[str, int]:
+    """
+    Run a package-manager command non-interactively.
+
+    apt gets DEBIAN_FRONTEND=noninteractive through the command environment
+    rather than a shell wrapper; the other managers need no environment.
+    """
+    if pm == "apt":
+        return transport.run_command(cmd, env=APT_ENV)
+    return transport.run_command(cmd)
+
+
+def parse_package_versions(output: str) -> Dict[str, str]:
+    """Map package name to version from "name version [...]" query lines."""
+    versions: Dict[str, str] = {}
+    for line in output.splitlines():
+        parts = line.split()
+        if len(parts) >= 2:
+            versions[parts[0]] = parts[1]
+    return versions
+
+
+# dpkg's database of known packages; read directly for local apt checks
+DPKG_STATUS = "/var/lib/dpkg/status"
+
+
+def parse_dpkg_status(content: str) -> Dict[str, str]:
+    """
+    Map package name to version from a dpkg status database.
+
+    Lists the same packages as `dpkg-query -W`: every stanza whose state is
+    not "not-installed" (config-files packages included), under both its
+    plain and its arch-qualified ("name:arch") names.
+    """
+    versions: Dict[str, str] = {}
+    for stanza in content.split("\n\n"):
+        fields = {}
+        for line in stanza.splitlines():
+            if line and not line[0].isspace() and ":" in line:
+                key, value = line.split(":", 1)
+                fields[key] = value.strip()
+        state = fields.get("Status", "").split()[-1:]
+        if "Package" in fields and "Version" in fields and state != ["not-installed"]:
+            versions[fields["Package"]] = fields["Version"]
+            if "Architecture" in fields:
+                versions[f"{fields['Package']}:{fields['Architecture']}"] = fields["Version"]
+    return versions
+
+
+def update_package_cache(transport: Transport, pm: str) -> None:
+    """
+    Refresh the package manager's cache (apt-get update, pacman -Sy, ...).
+
+    Raises:
+        RuntimeError: If the update command fails
+    """
+    logger.info(f"Updating package cache ({pm})...")
+
+    cmd, ok_codes = CACHE_UPDATE_COMMANDS[pm]
+    output, code = run_package_command(transport, pm, cmd)
+    if code not in ok_codes:
+        raise RuntimeError(f"{' '.join(cmd[:2])} failed: {output}")
 
 
 class Package(Resource):
@@ -33,6 +207,11 @@ class Package(Resource):
 
         # Multiple packages (named group)
         Package("build-tools", packages=["gcc", "make", "autoconf"])
+
+    All packages of a resource are handled together: check issues one
+    query, and install/remove/upgrade issue one package-manager command
+    with the full package list. Consecutive Package resources with the
+    same change are merged into one command at apply time.
     """
 
     def __init__(
@@ -65,7 +244,8 @@ class Package(Resource):
         super().__init__(resource_name, **options)
 
         self.package_name = name if isinstance(name, str) and not packages else None
-        self.packages = packages or ([name] if isinstance(name, str) else [])
+        # Drop repeated names (first occurrence wins) so commands stay minimal
+        self.packages = list(dict.fromkeys(packages or ([name] if isinstance(name, str) else [])))
         self.version = version
         self.ensure = ensure
 
@@ -80,10 +260,13 @@ class Package(Resource):
         # Get package manager
         pm = self._get_package_manager(platform)
 
+        # Single package-manager query for the whole group
+        versions = self._check_packages_bulk(pm, platform)
+
         installed_packages = {}
 
         for pkg in self.packages:
-            version = self._check_package(pkg, pm, platform)
+            version = versions.get(pkg)
             installed_packages[pkg] = {
                 "installed": version is not None,
                 "version": version,
@@ -105,113 +288,177 @@ class Package(Resource):
         """Apply package changes."""
         pm = self._get_package_manager(platform)
 
-        if plan.action == Action.CREATE:
-            self._install(pm, platform)
-        elif plan.action == Action.DELETE:
-            self._remove(pm, platform)
-        elif plan.action == Action.UPDATE:
-            self._upgrade(pm, platform)
+        if plan.action in (Action.CREATE, Action.UPDATE):
+            self._refresh_cache_if_dirty(pm)
+
+        try:
+            if plan.action == Action.CREATE:
+                self._install(pm, platform)
+            elif plan.action == Action.DELETE:
+                self._remove(pm, platform)
+            elif plan.action == Action.UPDATE:
+                self._upgrade(pm, platform)
+        finally:
+            self._forget_installed(pm)
+
+    def batch_key(self, plan: Plan, platform: Platform) -> Optional[Hashable]:
+        """Neighbouring installs/removals/upgrades on one package manager merge."""
+        if plan.action not in ACTION_OPERATIONS:
+            return None
+        return (self._get_package_manager(platform), plan.action)
+
+    @classmethod
+    def apply_batch(cls, batch: List[Tuple[Resource, Plan]], platform: Platform) -> None:
+        """
+        Apply several Package changes as one package-manager transaction.
+
+        The union of all packages is passed to a single install/remove/upgrade
+        call, which reaches the same end state as applying them one by one.
+        """
+        first, plan = batch[0]
+        pm = first._get_package_manager(platform)
+
+        if plan.action in (Action.CREATE, Action.UPDATE):
+            first._refresh_cache_if_dirty(pm)
+
+        operation, error = ACTION_OPERATIONS[plan.action]
+        for resource, _ in batch:
+            resource._require_packages(operation)
+
+        packages = list(dict.fromkeys(
+            pkg
+            for resource, _ in batch
+            for pkg in (resource._missing_packages() if plan.action == Action.CREATE else resource.packages)
+        ))
+        try:
+            first._run_operation(operation, error, pm, packages)
+        finally:
+            first._forget_installed(pm)
+
+    def _refresh_cache_if_dirty(self, pm: str) -> None:
+        """
+        Run one cache update if a repository was added earlier in this apply.
+
+        Repositories only mark the cache dirty, so however many are added
+        the update runs once, before the first install that needs it.
+        """
+        executor = self._executor
+        if executor is not None and pm in executor._cache_dirty:
+            update_package_cache(self._transport, pm)
+            executor._cache_dirty.discard(pm)
 
     def _get_package_manager(self, platform: Platform) -> str:
         """Detect package manager."""
-        if platform.distro in ["ubuntu", "debian"]:
-            return "apt"
-        elif platform.distro in ["fedora", "rhel", "centos"]:
-            return "dnf"
-        elif platform.distro == "arch":
-            return "pacman"
-        elif platform.system == "Darwin":
-            return "brew"
-        else:
-            raise ValueError(f"Unsupported platform: {platform.distro}")
+        return detect_package_manager(platform.distro, platform.system, platform.distro_like)
+
+    def _check_packages_bulk(self, pm: str, platform: Platform) -> Dict[str, str]:
+        """
+        Query all packages in one package-manager call.
+
+        Returns:
+            Mapping of installed package name to version. Packages that are
+            not installed are absent from the mapping.
+        """
+        if not self.packages:
+            return {}
+
+        installed = self._installed_packages(pm)
+        if installed is not None:
+            return {pkg: installed[pkg] for pkg in self.packages if pkg in installed}
+
+        prefix = PACKAGE_COMMANDS["query"].get(pm)
+        if prefix is None:
+            return {}
 
-    def _check_package(self, pkg: str, pm: str, platform: Platform) -> Optional[str]:
-        """Check if package is installed and return version."""
         try:
-            if pm == "apt":
-                output, code = self._transport.run_command(
-                    ["dpkg-query", "-W", "-f=${Version}", pkg]
-                )
-                return output.strip() if code == 0 else None
-
-            elif pm == "dnf":
-                output, code = self._transport.run_command(
-                    ["rpm", "-q", "--queryformat", "%{VERSION}", pkg]
-                )
-                return output.strip() if code == 0 else None
-
-            elif pm == "pacman":
-                output, code = self._transport.run_command(["pacman", "-Q", pkg])
-                if code == 0:
-                    # Output: "package-name version"
-                    return output.strip().split()[1]
-                return None
-
-            elif pm == "brew":
-                output, code = self._transport.run_command(
-                    ["brew", "list", "--versions", pkg]
-                )
-                if code == 0:
-                    # Output: "package version"
-                    parts = output.strip().split()
-                    return parts[1] if len(parts) > 1 else None
-                return None
+            # Exit code is non-zero when any package is missing, so parse the
+            # output regardless; missing packages never produce a "name version" line.
+            output, _ = self._transport.run_command(prefix + self.packages)
+        except FileNotFoundError:
+            raise ValueError(f"Package manager not found: {pm}")
+
+        wanted = set(self.packages)
+        return {
+            name: version
+            for name, version in parse_package_versions(output).items()
+            if name in wanted
+        }
+
+    def _installed_packages(self, pm: str) -> Optional[Dict[str, str]]:
+        """
+        Every installed package of pm, listed once and shared by all Package
+        resources of the executor until a package change or the next plan().
 
+        Returns:
+            Name to version mapping, or None without an executor, in which
+            case the caller queries its own packages.
+        """
+        executor = self._executor
+        prefix = PACKAGE_COMMANDS["list"].get(pm)
+        if executor is None or prefix is None:
+            return None
+
+        with executor._installed_lock:
+            if pm not in executor._installed_packages:
+                executor._installed_packages[pm] = self._list_installed(pm, prefix)
+            return executor._installed_packages[pm]
+
+    def _list_installed(self, pm: str, prefix: List[str]) -> Dict[str, str]:
+        """Run the listing command, or read dpkg's database in-process on this host."""
+        if pm == "apt" and isinstance(self._transport, LocalTransport):
+            try:
+                with open(DPKG_STATUS, encoding="utf-8", errors="replace") as f:
+                    return parse_dpkg_status(f.read())
+            except OSError:
+                pass
+
+        try:
+            output, _ = self._transport.run_command(prefix)
         except FileNotFoundError:
             raise ValueError(f"Package manager not found: {pm}")
+        return parse_package_versions(output)
+
+    def _forget_installed(self, pm: str) -> None:
+        """Drop the executor's package listing after packages changed."""
+        executor = self._executor
+        if executor is not None:
+            with executor._installed_lock:
+                executor._installed_packages.pop(pm, None)
+
+    def _require_packages(self, operation: str) -> None:
+        """Refuse to run a package-manager command without package arguments."""
+        if not self.packages:
+            raise ValueError(f"Package resource '{self.name}' has no packages to {operation}")
+
+    def _missing_packages(self) -> List[str]:
+        """Packages the last check found not installed (all of them if unchecked)."""
+        checked = self._actual_state.get("packages")
+        if not checked:
+            return self.packages
+        return [pkg for pkg in self.packages if not checked.get(pkg, {}).get("installed")]
 
     def _install(self, pm: str, platform: Platform) -> None:
-        """Install packages."""
-        if pm == "apt":
-            cmd = ["apt-get", "install", "-y"] + self.packages
-            # Set DEBIAN_FRONTEND=noninteractive via environment
-            output, code = self._transport.run_shell(
-                f"DEBIAN_FRONTEND=noninteractive {' '.join(cmd)}"
-            )
-            if code != 0:
-                raise RuntimeError(f"Package installation failed: {output}")
-        elif pm == "dnf":
-            cmd = ["dnf", "install", "-y"] + self.packages
-            output, code = self._transport.run_command(cmd)
-            if code != 0:
-                raise RuntimeError(f"Package installation failed: {output}")
-        elif pm == "pacman":
-            cmd = ["pacman", "-S", "--noconfirm"] + self.packages
-            output, code = self._transport.run_command(cmd)
-            if code != 0:
-                raise RuntimeError(f"Package installation failed: {output}")
-        elif pm == "brew":
-            cmd = ["brew", "install"] + self.packages
-            output, code = self._transport.run_command(cmd)
-            if code != 0:
-                raise RuntimeError(f"Package installation failed: {output}")
+        """Install the missing packages of the group in a single invocation."""
+        self._require_packages("install")
+        self._run_operation(*ACTION_OPERATIONS[Action.CREATE], pm, self._missing_packages())
 
     def _remove(self, pm: str, platform: Platform) -> None:
-        """Remove packages."""
-        if pm == "apt":
-            cmd = ["apt-get", "remove", "-y"] + self.packages
-            output, code = self._transport.run_shell(
-                f"DEBIAN_FRONTEND=noninteractive {' '.join(cmd)}"
-            )
-            if code != 0:
-                raise RuntimeError(f"Package removal failed: {output}")
-        elif pm == "dnf":
-            cmd = ["dnf", "remove", "-y"] + self.packages
-            output, code = self._transport.run_command(cmd)
-            if code != 0:
-                raise RuntimeError(f"Package removal failed: {output}")
-        elif pm == "pacman":
-            cmd = ["pacman", "-R", "--noconfirm"] + self.packages
-            output, code = self._transport.run_command(cmd)
-            if code != 0:
-                raise RuntimeError(f"Package removal failed: {output}")
-        elif pm == "brew":
-            cmd = ["brew", "uninstall"] + self.packages
-            output, code = self._transport.run_command(cmd)
-            if code != 0:
-                raise RuntimeError(f"Package removal failed: {output}")
+        """Remove packages (all of self.packages in a single invocation)."""
+        self._run_operation(*ACTION_OPERATIONS[Action.DELETE], pm)
 
     def _upgrade(self, pm: str, platform: Platform) -> None:
-        """Upgrade packages to latest version."""
-        # For now, just reinstall
-        self._install(pm, platform)
+        """Upgrade packages to latest version (single invocation)."""
+        self._run_operation(*ACTION_OPERATIONS[Action.UPDATE], pm)
+
+    def _run_operation(
+        self, operation: str, error: str, pm: str, packages: Optional[List[str]] = None
+    ) -> None:
+        """Run one PACKAGE_COMMANDS operation over all packages, raising on failure."""
+        if packages is None:
+            self._require_packages(operation)
+            packages = self.packages
+
+        cmd = PACKAGE_COMMANDS[operation][pm] + packages
+        output, code = run_package_command(self._transport, pm, cmd)
+        if code != 0:
+            raise RuntimeError(f"{error}: {output}")
@@ -8,17 +8,180 @@ Supports:
 - brew (macOS) - tap management, update, upgrade
 """
 
+import base64
 import hashlib
+import http.client
 import re
+import threading
+import weakref
 from pathlib import Path
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import urljoin, urlsplit
 
 from cook.core import Action, Plan, Platform, Resource
 from cook.core.executor import get_executor
 from cook.logging import get_cook_logger
+from cook.resources.pkg import (
+    APT_ENV,
+    APT_GET,
+    detect_package_manager,
+    run_package_command,
+    update_package_cache,
+)
 
 logger = get_cook_logger(__name__)
 
+# uname -m machine names to Debian architecture names
+DEB_ARCHITECTURES = {
+    "x86_64": "amd64",
+    "aarch64": "arm64",
+    "armv7l": "armhf",
+    "i686": "i386",
+    "ppc64le": "ppc64el",
+    "s390x": "s390x",
+}
+
+# Shell substitutions expanded in apt repository lines, in a single pass
+_REPO_VAR_RE = re.compile(r"\$\((lsb_release -cs|dpkg --print-architecture)\)")
+
+# Full system upgrade command per package manager
+SYSTEM_UPGRADE_COMMANDS = {
+    "apt": APT_GET + ["upgrade", "-y"],
+    "dnf": ["dnf", "upgrade", "-y"],
+    "pacman": ["pacman", "-Su", "--noconfirm"],
+    "brew": ["brew", "upgrade"],
+}
+
+# Dearmored GPG keys by key_url, shared by all Repository instances
+_KEY_CACHE: Dict[str, bytes] = {}
+
+# `lsb_release -cs` output per transport, for hosts whose os-release has no
+# codename; dropped together with the transport
+_CODENAME_CACHE: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+_CODENAME_LOCK = threading.Lock()
+
+
+
+# Idle keep-alive HTTP connections by (scheme, host), reused across key fetches
+_HTTP_POOL: Dict[Tuple[str, str], http.client.HTTPConnection] = {}
+_HTTP_POOL_LOCK = threading.Lock()
+
+
+def _fetch_url(url: str, timeout: int = 30, max_redirects: int = 5) -> bytes:
+    """
+    Fetch a URL over a pooled keep-alive connection.
+
+    Raises:
+        OSError: On network errors or non-200 responses
+    """
+    for _ in range(max_redirects + 1):
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https"):
+            raise OSError(f"Unsupported URL scheme: {url}")
+
+        pool_key = (parts.scheme, parts.netloc)
+        target = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+
+        with _HTTP_POOL_LOCK:
+            conn = _HTTP_POOL.pop(pool_key, None)
+        reused = conn is not None
+
+        while True:
+            if conn is None:
+                conn_class = (
+                    http.client.HTTPSConnection if parts.scheme == "https" else http.client.HTTPConnection
+                )
+                conn = conn_class(parts.netloc, timeout=timeout)
+            try:
+                conn.request("GET", target, headers={"User-Agent": "cook"})
+                response = conn.getresponse()
+                body = response.read()
+                break
+            except (http.client.HTTPException, OSError):
+                conn.close()
+                conn = None
+                if not reused:
+                    raise
+                # Idle pooled connection was closed by the server - retry once fresh
+                reused = False
+
+        if response.will_close:
+            conn.close()
+        else:
+            with _HTTP_POOL_LOCK:
+                _HTTP_POOL[pool_key] = conn
+
+        if response.status in (301, 302, 303, 307, 308):
+            location = response.getheader("Location")
+            if not location:
+                raise OSError(f"Redirect without Location fetching {url}")
+            url = urljoin(url, location)
+            continue
+        if response.status != 200:
+            raise OSError(f"HTTP {response.status} fetching {url}")
+        return body
+
+    raise OSError(f"Too many redirects fetching {url}")
+
+
+def _crc24(data: bytes) -> int:
+    """OpenPGP armor checksum (RFC 4880, section 6.1)."""
+    crc = 0xB704CE
+    for byte in data:
+        crc ^= byte << 16
+        for _ in range(8):
+            crc <<= 1
+            if crc & 0x1000000:
+                crc ^= 0x1864CFB
+    return crc & 0xFFFFFF
+
+
+def _dearmor(data: bytes) -> bytes:
+    """
+    Convert an ASCII-armored OpenPGP key to binary, like gpg --dearmor.
+
+    Raises:
+        ValueError: If the data is not an OpenPGP public key (e.g. an HTML
+            error page) or the armor checksum does not match
+    """
+    if not data.lstrip().startswith(b"-----BEGIN PGP"):
+        # Already a binary key
+        key = data
+    else:
+        body = []
+        checksum = None
+        in_block = False
+        in_headers = False
+        for line in data.decode("ascii").splitlines():
+            line = line.strip()
+            if line.startswith("-----BEGIN PGP"):
+                in_block = in_headers = True
+            elif line.startswith("-----END PGP"):
+                break
+            elif in_block:
+                if in_headers:
+                    # Armor headers ("Version: ...") end at the first blank line
+                    if not line or ": " in line:
+                        continue
+                    in_headers = False
+                if line.startswith("=") and len(line) == 5:
+                    # CRC24 checksum line
+                    checksum = line[1:]
+                    continue
+                body.append(line)
+
+        key = base64.b64decode("".join(body), validate=True)
+        if checksum is not None and _crc24(key).to_bytes(3, "big") != base64.b64decode(checksum):
+            raise ValueError("OpenPGP armor checksum mismatch")
+
+    # The first packet of a key must be a public-key packet (tag 6), in the
+    # new (bit 6 set) or old packet format
+    first = key[0] if key else 0
+    tag = first & 0x3F if first & 0x40 else (first >> 2) & 0x0F
+    if not first & 0x80 or tag != 6:
+        raise ValueError("Not an OpenPGP public key")
+    return key
+
 
 class Repository(Resource):
     """
@@ -68,6 +231,7 @@ class Repository(Resource):
         tap: Optional[str] = None,
         filename: Optional[str] = None,
         ensure: str = "present",  # "present", "absent"
+        cache_max_age: int = 3600,
         **options,
     ):
         """
@@ -84,6 +248,8 @@ class Repository(Resource):
             tap: Homebrew tap (macOS only, e.g., "homebrew/core")
             filename: Custom filename for sources list (default: {name}.list)
             ensure: "present" or "absent"
+            cache_max_age: For "update", seconds a package cache stays fresh
+                enough to skip the refresh (default: 3600)
             **options: Additional options
         """
         super().__init__(name, **options)
@@ -97,6 +263,7 @@ class Repository(Resource):
         self.tap = tap
         self.filename = filename or f"{name}.list"
         self.ensure = ensure
+        self.cache_max_age = cache_max_age
 
         # Validate action
         valid_actions = ["add", "update", "upgrade"]
@@ -127,7 +294,12 @@ class Repository(Resource):
         elif self.action == "upgrade":
             return self._check_upgrade(pm, platform)
         elif self.action == "add":
-            return self._check_repository(pm, platform)
+            state = self._check_repository(pm, platform)
+            # Fields this package manager's check cannot see (e.g. the key
+            # of a dnf repository) are taken as desired, not planned
+            for key, value in self.desired_state().items():
+                state.setdefault(key, value)
+            return state
 
         return {"exists": False}
 
@@ -163,21 +335,14 @@ class Repository(Resource):
         elif self.action == "add":
             if plan.action == Action.CREATE:
                 self._add_repository(pm, platform)
+            elif plan.action == Action.UPDATE:
+                self._update_repository(pm, platform, plan)
             elif plan.action == Action.DELETE:
                 self._remove_repository(pm, platform)
 
     def _get_package_manager(self, platform: Platform) -> str:
         """Detect package manager."""
-        if platform.distro in ["ubuntu", "debian"]:
-            return "apt"
-        elif platform.distro in ["fedora", "rhel", "centos"]:
-            return "dnf"
-        elif platform.distro == "arch":
-            return "pacman"
-        elif platform.system == "Darwin":
-            return "brew"
-        else:
-            raise ValueError(f"Unsupported platform: {platform.distro}")
+        return detect_package_manager(platform.distro, platform.system, platform.distro_like)
 
     # ========================================================================
     # APT (Debian/Ubuntu)
@@ -187,24 +352,7 @@ class Repository(Resource):
         """Check if package cache needs updating."""
         if pm == "apt":
             # Check age of apt cache
-            cache_file = "/var/lib/apt/periodic/update-success-stamp"
-            if self._transport.file_exists(cache_file):
-                # Get file age in seconds
-                output, code = self._transport.run_shell(
-                    f"echo $(($(date +%s) - $(stat -c %Y {cache_file})))"
-                )
-                if code == 0:
-                    age_seconds = int(output.strip())
-                    # Consider cache fresh if < 1 hour old
-                    needs_update = age_seconds > 3600
-                    return {
-                        "exists": True,
-                        "needs_update": needs_update,
-                        "cache_age_seconds": age_seconds,
-                    }
-
-            # Cache doesn't exist or couldn't check - needs update
-            return {"exists": True, "needs_update": True}
+            return self._check_cache_age("/var/lib/apt/periodic/update-success-stamp")
 
         elif pm == "dnf":
             # DNF always needs update check (it's fast)
@@ -212,21 +360,7 @@ class Repository(Resource):
 
         elif pm == "pacman":
             # Check package database age
-            db_file = "/var/lib/pacman/sync/core.db"
-            if self._transport.file_exists(db_file):
-                output, code = self._transport.run_shell(
-                    f"echo $(($(date +%s) - $(stat -c %Y {db_file})))"
-                )
-                if code == 0:
-                    age_seconds = int(output.strip())
-                    needs_update = age_seconds > 3600
-                    return {
-                        "exists": True,
-                        "needs_update": needs_update,
-                        "cache_age_seconds": age_seconds,
-                    }
-
-            return {"exists": True, "needs_update": True}
+            return self._check_cache_age("/var/lib/pacman/sync/core.db")
 
         elif pm == "brew":
             # Brew update is always recommended
@@ -234,50 +368,73 @@ class Repository(Resource):
 
         return {"exists": False}
 
+    def _check_cache_age(self, cache_file: str) -> Dict[str, Any]:
+        """
+        Check package cache freshness from a stamp file's mtime.
+
+        The target's current time and the stamp's mtime come from one
+        command on the target, so the controller's clock plays no part. A
+        stamp dated in the target's future counts as stale.
+        """
+        output, code = self._transport.run_command([
+            "sh", "-c", 'date +%s; [ -e "$0" ] && stat -c %Y -- "$0"', cache_file,
+        ])
+        try:
+            now, mtime = (int(field) for field in output.split())
+        except ValueError:
+            # Cache doesn't exist (only the date was printed) - needs update
+            return {"exists": True, "needs_update": True}
+
+        age_seconds = now - mtime
+        return {
+            "exists": True,
+            "needs_update": not 0 <= age_seconds <= self.cache_max_age,
+            "cache_age_seconds": age_seconds,
+        }
+
     def _check_upgrade(self, pm: str, platform: Platform) -> Dict[str, Any]:
         """Check if packages need upgrading."""
         if pm == "apt":
-            # Check for upgradable packages
-            output, code = self._transport.run_shell(
-                "apt list --upgradable 2>/dev/null | grep -v 'Listing'"
-            )
-            upgradable = len(output.strip().split("\n")) if output.strip() else 0
-            return {
-                "exists": True,
-                "needs_upgrade": upgradable > 0,
-                "upgradable_count": upgradable,
-            }
+            # Output: "nginx/jammy-updates 1.18.0-6 amd64 [upgradable from: 1.18.0-5]"
+            output, code = self._transport.run_command(["apt", "list", "--upgradable"])
+            upgradable = [
+                line.split("/", 1)[0]
+                for line in output.splitlines()
+                if "[upgradable from:" in line
+            ]
 
         elif pm == "dnf":
-            output, code = self._transport.run_shell(
-                "dnf check-update --quiet | wc -l"
-            )
-            upgradable = int(output.strip()) if output.strip().isdigit() else 0
-            return {
-                "exists": True,
-                "needs_upgrade": upgradable > 0,
-                "upgradable_count": upgradable,
-            }
+            # Exit code 100 means updates are available, 0 means none
+            output, code = self._transport.run_command(["dnf", "check-update", "--quiet"])
+            upgradable = []
+            if code == 100:
+                # Output: "nginx.x86_64  1:1.24.0-1.fc38  updates", optionally
+                # followed by an "Obsoleting Packages" section to ignore
+                for line in output.splitlines():
+                    if line.startswith("Obsoleting"):
+                        break
+                    fields = line.split()
+                    if len(fields) == 3:
+                        upgradable.append(fields[0].rsplit(".", 1)[0])
 
         elif pm == "pacman":
-            output, code = self._transport.run_shell("pacman -Qu | wc -l")
-            upgradable = int(output.strip()) if output.strip().isdigit() else 0
-            return {
-                "exists": True,
-                "needs_upgrade": upgradable > 0,
-                "upgradable_count": upgradable,
-            }
+            # Output: "nginx 1.24.0-1 -> 1.26.0-1"
+            output, code = self._transport.run_command(["pacman", "-Qu"])
+            upgradable = [line.split()[0] for line in output.splitlines() if line.strip()]
 
         elif pm == "brew":
-            output, code = self._transport.run_shell("brew outdated | wc -l")
-            upgradable = int(output.strip()) if output.strip().isdigit() else 0
-            return {
-                "exists": True,
-                "needs_upgrade": upgradable > 0,
-                "upgradable_count": upgradable,
-            }
+            output, code = self._transport.run_command(["brew", "outdated"])
+            upgradable = [line.split()[0] for line in output.splitlines() if line.strip()]
 
-        return {"exists": False}
+        else:
+            return {"exists": False}
+
+        return {
+            "exists": True,
+            "needs_upgrade": len(upgradable) > 0,
+            "upgradable_count": len(upgradable),
+            "upgradable": upgradable,
+        }
 
     def _check_repository(self, pm: str, platform: Platform) -> Dict[str, Any]:
         """Check if repository is configured."""
@@ -286,30 +443,39 @@ class Repository(Resource):
                 # Check for PPA in sources
                 ppa_name = self.ppa.replace("ppa:", "")
                 source_file = f"/etc/apt/sources.list.d/{ppa_name.replace('/', '-')}-*.list"
-                output, code = self._transport.run_shell(f"ls {source_file} 2>/dev/null")
+                matches = self._transport.glob(source_file)
                 return {
-                    "exists": code == 0,
-                    "source_file": output.strip() if code == 0 else None,
+                    "exists": len(matches) > 0,
+                    "source_file": matches[0] if matches else None,
                 }
             else:
-                # Check for custom repository
+                # Check for custom repository: source file and key in one probe
                 source_file = f"/etc/apt/sources.list.d/{self.filename}"
-                exists = self._transport.file_exists(source_file)
+                source_st, key_st = self._transport.stat_many([source_file, self._key_path()])
+                has_key = key_st is not None
+
+                if source_st is None:
+                    return {"exists": False, "source_file": source_file, "has_key": has_key}
+
+                if self.repo:
+                    # Verify content matches (snapshot reused while file is unchanged)
+                    try:
+                        content = self._transport.read_file_cached(source_file).decode("utf-8")
+                    except FileNotFoundError:
+                        return {"exists": False, "source_file": source_file, "has_key": has_key}
 
-                if exists and self.repo:
-                    # Verify content matches
-                    content = self._transport.read_file(source_file).decode("utf-8")
                     # Expand $(lsb_release -cs) in repo line
                     expanded_repo = self._expand_repo_vars(self.repo, platform)
-                    matches = expanded_repo in content
+                    matches = any(expanded_repo in line for line in content.splitlines())
 
                     return {
                         "exists": matches,
                         "source_file": source_file,
                         "repo_line": expanded_repo,
+                        "has_key": has_key,
                     }
 
-                return {"exists": exists, "source_file": source_file}
+                return {"exists": True, "source_file": source_file, "has_key": has_key}
 
         elif pm == "dnf":
             # Check for repo file in /etc/yum.repos.d/
@@ -318,13 +484,9 @@ class Repository(Resource):
             return {"exists": exists, "repo_file": repo_file}
 
         elif pm == "pacman":
-            # Check pacman.conf for repository
-            conf_file = "/etc/pacman.conf"
-            if self._transport.file_exists(conf_file):
-                content = self._transport.read_file(conf_file).decode("utf-8")
-                exists = f"[{self.name}]" in content
-                return {"exists": exists}
-            return {"exists": False}
+            # Check pacman.conf for the repository section header
+            exists = self._transport.grep("/etc/pacman.conf", f"[{self.name}]")
+            return {"exists": exists}
 
         elif pm == "brew":
             if self.tap:
@@ -339,56 +501,27 @@ class Repository(Resource):
 
     def _do_update(self, pm: str, platform: Platform) -> None:
         """Update package cache."""
-        logger.info(f"Updating package cache ({pm})...")
+        update_package_cache(self._transport, pm)
 
-        if pm == "apt":
-            output, code = self._transport.run_shell(
-                "DEBIAN_FRONTEND=noninteractive apt-get update -y"
-            )
-            if code != 0:
-                raise RuntimeError(f"apt-get update failed: {output}")
-
-        elif pm == "dnf":
-            output, code = self._transport.run_command(["dnf", "check-update", "-y"])
-            # dnf check-update returns 100 if updates are available, 0 if not
-            if code not in [0, 100]:
-                raise RuntimeError(f"dnf check-update failed: {output}")
-
-        elif pm == "pacman":
-            output, code = self._transport.run_command(["pacman", "-Sy"])
-            if code != 0:
-                raise RuntimeError(f"pacman -Sy failed: {output}")
-
-        elif pm == "brew":
-            output, code = self._transport.run_command(["brew", "update"])
-            if code != 0:
-                raise RuntimeError(f"brew update failed: {output}")
+        # Cache is fresh now - later Package installs don't need another update
+        if self._executor is not None:
+            self._executor._cache_dirty.discard(pm)
 
     def _do_upgrade(self, pm: str, platform: Platform) -> None:
         """Upgrade all packages."""
-        logger.info(f"Upgrading packages ({pm})...")
-
-        if pm == "apt":
-            output, code = self._transport.run_shell(
-                "DEBIAN_FRONTEND=noninteractive apt-get upgrade -y"
-            )
-            if code != 0:
-                raise RuntimeError(f"apt-get upgrade failed: {output}")
-
-        elif pm == "dnf":
-            output, code = self._transport.run_command(["dnf", "upgrade", "-y"])
-            if code != 0:
-                raise RuntimeError(f"dnf upgrade failed: {output}")
+        count = self._actual_state.get("upgradable_count")
+        if count:
+            logger.info(f"Upgrading {count} packages ({pm})...")
+        else:
+            logger.info(f"Upgrading packages ({pm})...")
 
-        elif pm == "pacman":
-            output, code = self._transport.run_command(["pacman", "-Su", "--noconfirm"])
-            if code != 0:
-                raise RuntimeError(f"pacman -Su failed: {output}")
+        cmd = SYSTEM_UPGRADE_COMMANDS.get(pm)
+        if cmd is None:
+            return
 
-        elif pm == "brew":
-            output, code = self._transport.run_command(["brew", "upgrade"])
-            if code != 0:
-                raise RuntimeError(f"brew upgrade failed: {output}")
+        output, code = run_package_command(self._transport, pm, cmd)
+        if code != 0:
+            raise RuntimeError(f"{' '.join(cmd[:2])} failed: {output}")
 
     def _add_repository(self, pm: str, platform: Platform) -> None:
         """Add repository."""
@@ -397,20 +530,15 @@ class Repository(Resource):
         if pm == "apt":
             if self.ppa:
                 # Add PPA using add-apt-repository
-                output, code = self._transport.run_shell(
-                    f"DEBIAN_FRONTEND=noninteractive add-apt-repository -y {self.ppa}"
+                output, code = self._transport.run_command(
+                    ["add-apt-repository", "-y", self.ppa], env=APT_ENV
                 )
                 if code != 0:
                     raise RuntimeError(f"Failed to add PPA: {output}")
             else:
                 # Add custom repository
                 # 1. Add GPG key if provided
-                if self.key_url:
-                    self._add_apt_key_from_url(self.key_url, platform)
-                elif self.key_id:
-                    self._add_apt_key_from_keyserver(
-                        self.key_id, self.key_server, platform
-                    )
+                self._add_apt_key(platform)
 
                 # 2. Add repository line
                 expanded_repo = self._expand_repo_vars(self.repo, platform)
@@ -420,6 +548,9 @@ class Repository(Resource):
 
                 logger.info(f"Repository added to {source_file}")
 
+                # add-apt-repository refreshes the cache itself; custom sources don't
+                self._mark_cache_dirty(pm)
+
         elif pm == "dnf":
             # Create .repo file
             repo_file = f"/etc/yum.repos.d/{self.name}.repo"
@@ -427,16 +558,17 @@ class Repository(Resource):
             self._transport.write_file(repo_file, content.encode("utf-8"))
 
         elif pm == "pacman":
-            # Add to pacman.conf
-            if self.repo:
+            # Add to pacman.conf (plan already established the block is absent)
+            if self.repo and not self._actual_state.get("exists"):
                 conf_file = "/etc/pacman.conf"
                 repo_block = f"\n[{self.name}]\n{self.repo}\n"
-                # Append to config
-                output, code = self._transport.run_shell(
-                    f"echo '{repo_block}' >> {conf_file}"
-                )
-                if code != 0:
-                    raise RuntimeError(f"Failed to add repository: {output}")
+                # Append to config without going through a shell
+                try:
+                    self._transport.append_file(conf_file, repo_block.encode("utf-8"))
+                except IOError as e:
+                    raise RuntimeError(f"Failed to add repository: {e}") from e
+
+                self._mark_cache_dirty(pm)
 
         elif pm == "brew":
             if self.tap:
@@ -444,14 +576,26 @@ class Repository(Resource):
                 if code != 0:
                     raise RuntimeError(f"Failed to add tap: {output}")
 
+    def _update_repository(self, pm: str, platform: Platform, plan: Plan) -> None:
+        """Install the missing key of an apt source that is otherwise in place."""
+        if pm == "apt" and any(change.field == "has_key" for change in plan.changes):
+            logger.info(f"Adding missing key for repository '{self.name}'...")
+            self._add_apt_key(platform)
+            self._mark_cache_dirty(pm)
+
+    def _mark_cache_dirty(self, pm: str) -> None:
+        """Defer the cache update to the next Package install in this apply."""
+        if self._executor is not None:
+            self._executor._cache_dirty.add(pm)
+
     def _remove_repository(self, pm: str, platform: Platform) -> None:
         """Remove repository."""
         logger.info(f"Removing repository '{self.name}'...")
 
         if pm == "apt":
             if self.ppa:
-                output, code = self._transport.run_shell(
-                    f"DEBIAN_FRONTEND=noninteractive add-apt-repository --remove -y {self.ppa}"
+                output, code = self._transport.run_command(
+                    ["add-apt-repository", "--remove", "-y", self.ppa], env=APT_ENV
                 )
                 if code != 0:
                     raise RuntimeError(f"Failed to remove PPA: {output}")
@@ -467,45 +611,99 @@ class Repository(Resource):
             if self.tap:
                 self._transport.run_command(["brew", "untap", self.tap])
 
+    def _key_path(self) -> str:
+        """Path of this repository's APT key (modern trusted.gpg.d layout)."""
+        return f"/etc/apt/trusted.gpg.d/{self.name}.gpg"
+
+    def _add_apt_key(self, platform: Platform) -> None:
+        """Add the APT GPG key from key_url or key_id, if either is set."""
+        if self.key_url:
+            self._add_apt_key_from_url(self.key_url, platform)
+        elif self.key_id:
+            self._add_apt_key_from_keyserver(self.key_id, self.key_server, platform)
+
     def _add_apt_key_from_url(self, key_url: str, platform: Platform) -> None:
         """Add APT GPG key from URL."""
-        # Modern approach: add to /etc/apt/trusted.gpg.d/
-        key_filename = f"{self.name}.gpg"
-        key_path = f"/etc/apt/trusted.gpg.d/{key_filename}"
-
-        # Download and add key
-        cmd = f"curl -fsSL {key_url} | gpg --dearmor -o {key_path}"
-        output, code = self._transport.run_shell(cmd)
+        key_path = self._key_path()
+
+        # Reuse a key already fetched by another Repository
+        cached = _KEY_CACHE.get(key_url)
+        if cached is not None:
+            self._transport.write_file(key_path, cached)
+            logger.info(f"GPG key added to {key_path} (cached)")
+            return
+
+        # Fetch in-process over a pooled connection and dearmor without forking gpg
+        try:
+            key = _dearmor(_fetch_url(key_url))
+        except (OSError, ValueError) as e:
+            logger.debug(f"In-process key fetch failed ({e}), using curl on target")
+        else:
+            self._transport.write_file(key_path, key)
+            _KEY_CACHE[key_url] = key
+            logger.info(f"GPG key added to {key_path}")
+            return
+
+        # Fallback: download and dearmor on the target. URL and path are
+        # positional arguments, never interpolated into the script.
+        output, code = self._transport.run_command([
+            "sh", "-c",
+            'curl -fsSL "$0" -o "$1.asc" && gpg --dearmor --yes -o "$1" "$1.asc"; '
+            'rc=$?; rm -f "$1.asc"; exit $rc',
+            key_url, key_path,
+        ])
         if code != 0:
             raise RuntimeError(f"Failed to add GPG key: {output}")
 
+        try:
+            _KEY_CACHE[key_url] = self._transport.read_file(key_path)
+        except Exception:
+            # Caching is best-effort; the key itself is installed
+            pass
+
         logger.info(f"GPG key added to {key_path}")
 
     def _add_apt_key_from_keyserver(
         self, key_id: str, key_server: str, platform: Platform
     ) -> None:
         """Add APT GPG key from keyserver."""
-        key_filename = f"{self.name}.gpg"
-        key_path = f"/etc/apt/trusted.gpg.d/{key_filename}"
+        key_path = self._key_path()
 
         # Fetch key from keyserver
-        cmd = f"gpg --keyserver {key_server} --recv-keys {key_id} && gpg --export {key_id} > {key_path}"
-        output, code = self._transport.run_shell(cmd)
+        output, code = self._transport.run_command([
+            "sh", "-c",
+            'gpg --keyserver "$0" --recv-keys "$1" && gpg --export "$1" > "$2"',
+            key_server, key_id, key_path,
+        ])
         if code != 0:
             raise RuntimeError(f"Failed to fetch GPG key: {output}")
 
         logger.info(f"GPG key {key_id} added to {key_path}")
 
     def _expand_repo_vars(self, repo_line: str, platform: Platform) -> str:
-        """Expand variables in repository line."""
-        if "$(lsb_release -cs)" in repo_line:
-            # Get codename
-            output, code = self._transport.run_shell("lsb_release -cs")
-            if code == 0:
-                codename = output.strip()
-                repo_line = repo_line.replace("$(lsb_release -cs)", codename)
-
-        return repo_line
+        """
+        Expand variables in repository line.
+
+        Uses facts gathered once at platform detection; only falls back to
+        running lsb_release when the codename is unknown.
+        """
+        def resolve(match: "re.Match") -> str:
+            if match.group(1) == "lsb_release -cs":
+                value = platform.codename or self._lsb_codename()
+            else:
+                value = DEB_ARCHITECTURES.get(platform.arch, platform.arch)
+            # Leave a variable that cannot be resolved as written
+            return value or match.group(0)
+
+        return _REPO_VAR_RE.sub(resolve, repo_line)
+
+    def _lsb_codename(self) -> str:
+        """Run `lsb_release -cs` once per transport ("" if it fails)."""
+        with _CODENAME_LOCK:
+            if self._transport not in _CODENAME_CACHE:
+                output, code = self._transport.run_command(["lsb_release", "-cs"])
+                _CODENAME_CACHE[self._transport] = output.strip() if code == 0 else ""
+            return _CODENAME_CACHE[self._transport]
 
     def _generate_dnf_repo_file(self) -> str:
         """Generate DNF repository file content."""
@@ -7,12 +7,50 @@ Supports:
 - service command (fallback)
 """
 
-from typing import Any, Dict, List, Optional
+import shlex
+import time
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Tuple
 
 from cook.core.executor import get_executor
 from cook.core import Plan, Platform, Resource
 
 
+# systemd states that `systemctl is-active` / `is-enabled` report as success
+SYSTEMD_ACTIVE_STATES = frozenset({"active", "reloading"})
+SYSTEMD_ENABLED_STATES = frozenset({
+    "enabled", "enabled-runtime", "static", "alias", "indirect", "generated", "transient",
+})
+
+
+# Seconds between checks for wait_for paths, inside the single wait command
+WAIT_FOR_INTERVAL = 0.1
+
+# One call for everything check() needs; the unit name is appended
+SYSTEMD_SHOW_COMMAND = [
+    "systemctl", "show", "--property=ActiveState,UnitFileState,SubState,LoadState", "--",
+]
+
+# Command prefix per platform and action; the unit name is appended.
+# Actions missing for a platform are no-ops there (macOS services are
+# enabled by being in LaunchAgents/LaunchDaemons).
+SERVICE_COMMANDS = {
+    "Linux": {
+        "start": ["systemctl", "start"],
+        "stop": ["systemctl", "stop"],
+        "enable": ["systemctl", "enable"],
+        "disable": ["systemctl", "disable"],
+        "reload": ["systemctl", "reload"],
+        "restart": ["systemctl", "restart"],
+    },
+    "Darwin": {
+        "start": ["launchctl", "start"],
+        "stop": ["launchctl", "stop"],
+        # Preceded by a best-effort stop, see Service.restart
+        "restart": ["launchctl", "start"],
+    },
+}
+
+
 class Service(Resource):
     """
     Service resource for managing system services.
@@ -34,6 +72,16 @@ class Service(Resource):
         Service("app",
                 running=True,
                 restart_on=[app_binary])
+
+        # Resources declared after this one wait until the app answers
+        Service("app",
+                running=True,
+                healthcheck=("curl -fs http://127.0.0.1:3000/health", 1, 30))
+
+        # Ready once its socket exists (e.g. before nginx proxies to it)
+        Service("php8.1-fpm",
+                running=True,
+                wait_for=["/run/php/php8.1-fpm.sock"])
     """
 
     def __init__(
@@ -43,6 +91,9 @@ class Service(Resource):
         enabled: Optional[bool] = None,
         reload_on: Optional[List] = None,
         restart_on: Optional[List] = None,
+        healthcheck: Optional[Tuple[str, float, int]] = None,
+        wait_for: Optional[List[str]] = None,
+        wait_timeout: float = 30,
         **options,
     ):
         """
@@ -54,6 +105,14 @@ class Service(Resource):
             enabled: Whether service should be enabled at boot
             reload_on: List of resources that trigger reload
             restart_on: List of resources that trigger restart
+            healthcheck: (shell command, interval seconds, retries). After
+                the service is started, restarted or reloaded, the command
+                is run until it exits 0, so dependents only proceed once
+                the service is ready
+            wait_for: Paths (sockets, pid files) that must exist before the
+                service counts as ready, checked at the same points as the
+                healthcheck and before it
+            wait_timeout: Seconds to wait for the wait_for paths
             **options: Additional options
         """
         super().__init__(name, **options)
@@ -61,8 +120,24 @@ class Service(Resource):
         self.service_name = name
         self.running = running
         self.enabled = enabled
-        self.reload_on = self._extract_resource_ids(reload_on or [])
-        self.restart_on = self._extract_resource_ids(restart_on or [])
+        # Sets, so trigger matching after apply is a C-level isdisjoint()
+        self.reload_on = frozenset(self._extract_resource_ids(reload_on or []))
+        self.restart_on = frozenset(self._extract_resource_ids(restart_on or []))
+        self.healthcheck = healthcheck
+        self.wait_for = list(wait_for or [])
+        self.wait_timeout = wait_timeout
+
+        # Full argv per (platform, action), built once instead of per call
+        self._argv = {
+            (system, action): prefix + [name]
+            for system, actions in SERVICE_COMMANDS.items()
+            for action, prefix in actions.items()
+        }
+        self._show_argv = SYSTEMD_SHOW_COMMAND + [name]
+
+        # systemd properties from the last `systemctl show`, shared by
+        # _is_running/_is_enabled; cleared whenever the unit is changed
+        self._systemd_state: Optional[Dict[str, str]] = None
 
         # Auto-register
         get_executor().add(self)
@@ -82,6 +157,7 @@ class Service(Resource):
 
     def check(self, platform: Platform) -> Dict[str, Any]:
         """Check service state."""
+        self._systemd_state = None
         state = {
             "exists": True,  # Assume service exists
             "running": self._is_running(platform),
@@ -102,10 +178,21 @@ class Service(Resource):
 
     def apply(self, plan: Plan, platform: Platform) -> None:
         """Apply service changes."""
+        self._flush_daemon_reload()
+
+        if platform.system == "Linux":
+            self._systemd_state = None
+            for verbs in self._systemctl_verbs(plan):
+                self._systemctl(verbs, [self.service_name])
+            if self._starts(plan):
+                self.wait_healthy()
+            return
+
         for change in plan.changes:
             if change.field == "running":
                 if change.to_value:
                     self._start(platform)
+                    self.wait_healthy()
                 else:
                     self._stop(platform)
             elif change.field == "enabled":
@@ -114,14 +201,148 @@ class Service(Resource):
                 else:
                     self._disable(platform)
 
+    def batch_key(self, plan: Plan, platform: Platform) -> Optional[Hashable]:
+        """Neighbouring services needing the same systemctl verbs merge."""
+        if platform.system != "Linux":
+            return None
+        return tuple(tuple(verbs) for verbs in self._systemctl_verbs(plan))
+
+    @classmethod
+    def apply_batch(cls, batch: List[Tuple[Resource, Plan]], platform: Platform) -> None:
+        """Apply the same transition to several units with one systemctl call per verb."""
+        first, plan = batch[0]
+        first._flush_daemon_reload()
+
+        names = []
+        for service, _ in batch:
+            service._systemd_state = None
+            names.append(service.service_name)
+
+        for verbs in first._systemctl_verbs(plan):
+            first._systemctl(verbs, names)
+
+        if first._starts(plan):
+            for service, _ in batch:
+                service.wait_healthy()
+
+    @classmethod
+    def run_many(cls, action: str, services: List["Service"], platform: Platform) -> List[Exception]:
+        """
+        Restart or reload several services.
+
+        On Linux all units go to one systemctl call. If that fails, each
+        service is retried on its own so the error names the failing unit.
+
+        Returns:
+            One error per service that failed to restart/reload or to
+            become healthy; the other services are still handled
+        """
+        errors: List[Exception] = []
+        if platform.system == "Linux" and len(services) > 1:
+            services[0]._flush_daemon_reload()
+            output, code = services[0]._transport.run_command(
+                ["systemctl", action] + [service.service_name for service in services]
+            )
+            if code == 0:
+                for service in services:
+                    try:
+                        service.wait_healthy()
+                    except Exception as e:
+                        errors.append(e)
+                return errors
+
+        for service in services:
+            try:
+                getattr(service, action)(platform)
+            except Exception as e:
+                errors.append(e)
+        return errors
+
+    @staticmethod
+    def _starts(plan: Plan) -> bool:
+        """Whether the plan starts the service."""
+        return any(change.field == "running" and change.to_value for change in plan.changes)
+
+    def wait_healthy(self) -> None:
+        """
+        Block until the wait_for paths exist and the healthcheck command
+        succeeds; no-op without either.
+
+        Raises:
+            RuntimeError: If a path is still missing after wait_timeout, or
+                the healthcheck still fails after all retries
+        """
+        self._wait_for_paths()
+        if self.healthcheck is None:
+            return
+
+        command, interval, retries = self.healthcheck
+        for attempt in range(max(1, retries)):
+            if attempt:
+                time.sleep(interval)
+            output, code = self._transport.run_shell(command)
+            if code == 0:
+                return
+        raise RuntimeError(
+            f"Service {self.service_name} not healthy after {retries} checks: {output}"
+        )
+
+    def _wait_for_paths(self) -> None:
+        """
+        Wait for the wait_for paths with one command on the target host.
+
+        The loop polls every WAIT_FOR_INTERVAL seconds where the paths are,
+        so a remote wait costs one round trip, not one per check.
+        """
+        if not self.wait_for:
+            return
+
+        present = " && ".join(f"[ -e {shlex.quote(path)} ]" for path in self.wait_for)
+        tries = max(1, int(self.wait_timeout / WAIT_FOR_INTERVAL))
+        output, code = self._transport.run_command([
+            "sh", "-c",
+            f"i=0; until {present}; do i=$((i+1)); "
+            f"[ $i -ge {tries} ] && exit 1; sleep {WAIT_FOR_INTERVAL}; done",
+        ])
+        if code != 0:
+            raise RuntimeError(
+                f"Service {self.service_name} not ready: {', '.join(self.wait_for)} "
+                f"missing after {self.wait_timeout}s {output}".rstrip()
+            )
+
+    def _systemctl_verbs(self, plan: Plan) -> List[List[str]]:
+        """
+        systemctl verbs (with flags) that take the unit from actual to desired.
+
+        Flipping boot and runtime state the same way fuses into one
+        `enable --now` / `disable --now`.
+        """
+        targets = {change.field: change.to_value for change in plan.changes}
+        running = targets.get("running")
+        enabled = targets.get("enabled")
+
+        if running is not None and running == enabled:
+            return [["enable" if running else "disable", "--now"]]
+
+        verbs = []
+        for change in plan.changes:
+            if change.field == "running":
+                verbs.append(["start" if change.to_value else "stop"])
+            elif change.field == "enabled":
+                verbs.append(["enable" if change.to_value else "disable"])
+        return verbs
+
+    def _systemctl(self, verbs: List[str], units: List[str]) -> None:
+        """Run one systemctl verb over one or more units, raising on failure."""
+        output, code = self._transport.run_command(["systemctl"] + verbs + units)
+        if code != 0:
+            raise RuntimeError(f"Failed to {verbs[0]} service: {output}")
+
     def _is_running(self, platform: Platform) -> bool:
         """Check if service is running."""
         try:
             if platform.system == "Linux":
-                _, code = self._transport.run_command(
-                    ["systemctl", "is-active", self.service_name]
-                )
-                return code == 0
+                return self._load_systemd_state().get("ActiveState") in SYSTEMD_ACTIVE_STATES
 
             elif platform.system == "Darwin":
                 _, code = self._transport.run_command(
@@ -138,10 +359,7 @@ class Service(Resource):
         """Check if service is enabled at boot."""
         try:
             if platform.system == "Linux":
-                _, code = self._transport.run_command(
-                    ["systemctl", "is-enabled", self.service_name]
-                )
-                return code == 0
+                return self._load_systemd_state().get("UnitFileState") in SYSTEMD_ENABLED_STATES
 
             elif platform.system == "Darwin":
                 # macOS launchctl doesn't have direct "is-enabled" check
@@ -152,88 +370,70 @@ class Service(Resource):
 
         return False
 
+    def _flush_daemon_reload(self) -> None:
+        """Run the executor's pending daemon-reload before touching the unit."""
+        if self._executor is not None:
+            self._executor.flush_daemon_reload()
+
+    def _load_systemd_state(self) -> Dict[str, str]:
+        """Fetch ActiveState/UnitFileState/LoadState with one systemctl call."""
+        if self._systemd_state is None:
+            output, _ = self._transport.run_command(self._show_argv)
+            # Output: "ActiveState=active\nUnitFileState=enabled\n..."
+            state = {}
+            for line in output.splitlines():
+                key, sep, value = line.partition("=")
+                if sep:
+                    state[key] = value
+            self._systemd_state = state
+        return self._systemd_state
+
     def _start(self, platform: Platform) -> None:
         """Start service."""
-        if platform.system == "Linux":
-            output, code = self._transport.run_command(
-                ["systemctl", "start", self.service_name]
-            )
-            if code != 0:
-                raise RuntimeError(f"Failed to start service: {output}")
-        elif platform.system == "Darwin":
-            output, code = self._transport.run_command(
-                ["launchctl", "start", self.service_name]
-            )
-            if code != 0:
-                raise RuntimeError(f"Failed to start service: {output}")
+        self._service_command("start", platform)
 
     def _stop(self, platform: Platform) -> None:
         """Stop service."""
-        if platform.system == "Linux":
-            output, code = self._transport.run_command(
-                ["systemctl", "stop", self.service_name]
-            )
-            if code != 0:
-                raise RuntimeError(f"Failed to stop service: {output}")
-        elif platform.system == "Darwin":
-            output, code = self._transport.run_command(
-                ["launchctl", "stop", self.service_name]
-            )
-            if code != 0:
-                raise RuntimeError(f"Failed to stop service: {output}")
+        self._service_command("stop", platform)
 
     def _enable(self, platform: Platform) -> None:
         """Enable service at boot."""
-        if platform.system == "Linux":
-            output, code = self._transport.run_command(
-                ["systemctl", "enable", self.service_name]
-            )
-            if code != 0:
-                raise RuntimeError(f"Failed to enable service: {output}")
-        elif platform.system == "Darwin":
-            # macOS services are enabled by being in LaunchAgents/LaunchDaemons
-            pass
+        self._service_command("enable", platform)
 
     def _disable(self, platform: Platform) -> None:
         """Disable service at boot."""
-        if platform.system == "Linux":
-            output, code = self._transport.run_command(
-                ["systemctl", "disable", self.service_name]
-            )
-            if code != 0:
-                raise RuntimeError(f"Failed to disable service: {output}")
+        self._service_command("disable", platform)
 
     def reload(self, platform: Platform) -> None:
         """Reload service configuration."""
-        if platform.system == "Linux":
-            output, code = self._transport.run_command(
-                ["systemctl", "reload", self.service_name]
-            )
-            if code != 0:
-                raise RuntimeError(f"Failed to reload service: {output}")
+        self._flush_daemon_reload()
+        self._service_command("reload", platform)
+        self.wait_healthy()
 
     def restart(self, platform: Platform) -> None:
         """Restart service."""
-        if platform.system == "Linux":
-            output, code = self._transport.run_command(
-                ["systemctl", "restart", self.service_name]
-            )
-            if code != 0:
-                raise RuntimeError(f"Failed to restart service: {output}")
-        elif platform.system == "Darwin":
-            # Stop first (ignore output/errors)
-            self._transport.run_command(["launchctl", "stop", self.service_name])
-            # Then start and check result
-            output, code = self._transport.run_command(
-                ["launchctl", "start", self.service_name]
-            )
-            if code != 0:
-                raise RuntimeError(f"Failed to restart service: {output}")
-
-    def should_reload(self, changed_resource_ids: List[str]) -> bool:
-        """Check if service should reload based on changed resources."""
-        return any(rid in changed_resource_ids for rid in self.reload_on)
-
-    def should_restart(self, changed_resource_ids: List[str]) -> bool:
-        """Check if service should restart based on changed resources."""
-        return any(rid in changed_resource_ids for rid in self.restart_on)
+        self._flush_daemon_reload()
+        if platform.system == "Darwin":
+            # launchctl has no restart: stop first (ignoring errors), then start
+            self._transport.run_command(self._argv[("Darwin", "stop")])
+        self._service_command("restart", platform)
+        self.wait_healthy()
+
+    def _service_command(self, action: str, platform: Platform) -> None:
+        """Run a SERVICE_COMMANDS action on this unit; no-op where unsupported."""
+        self._systemd_state = None
+        argv = self._argv.get((platform.system, action))
+        if argv is None:
+            return
+
+        output, code = self._transport.run_command(argv)
+        if code != 0:
+            raise RuntimeError(f"Failed to {action} service: {output}")
+
+    def should_reload(self, changed_resource_ids: Iterable[str]) -> bool:
+        """Check if service should reload based on changed resources (pass a set)."""
+        return not self.reload_on.isdisjoint(changed_resource_ids)
+
+    def should_restart(self, changed_resource_ids: Iterable[str]) -> bool:
+        """Check if service should restart based on changed resources (pass a set)."""
+        return not self.restart_on.isdisjoint(changed_resource_ids)
@@ -9,10 +9,40 @@ Tracks:
 
 import json
 import sqlite3
+from contextlib import contextmanager
 from dataclasses import dataclass
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+    orjson = None
+
+
+def _json_dumps(value: Any) -> bytes:
+    """Serialize a state dict for a BLOB column."""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(value).encode("utf-8")
+
+
+# orjson parses the stored JSON several times faster when installed
+_json_loads = orjson.loads if ORJSON_AVAILABLE else json.loads
+
+
+def _to_epoch_us(value: datetime) -> int:
+    """Datetime to integer microseconds since the epoch (exact, no float rounding)."""
+    return int(value.replace(microsecond=0).timestamp()) * 1_000_000 + value.microsecond
+
+
+def _from_epoch_us(value: int) -> datetime:
+    """Integer microseconds since the epoch to a local datetime."""
+    seconds, micros = divmod(value, 1_000_000)
+    return datetime.fromtimestamp(seconds).replace(microsecond=micros)
 
 
 @dataclass
@@ -44,6 +74,94 @@ class HistoryEntry:
     error: Optional[str] = None
 
 
+# Timestamps are INTEGER microseconds since the epoch and JSON is stored as
+# BLOB, so reading a row needs no date-string parsing or text decoding
+SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS resources (
+        id TEXT PRIMARY KEY,
+        type TEXT NOT NULL,
+        desired_state BLOB NOT NULL,
+        actual_state BLOB NOT NULL,
+        applied_at INTEGER NOT NULL,
+        applied_by TEXT NOT NULL,
+        hostname TEXT NOT NULL,
+        config_file TEXT NOT NULL,
+        status TEXT NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS history (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        timestamp INTEGER NOT NULL,
+        resource_id TEXT NOT NULL,
+        action TEXT NOT NULL,
+        user TEXT NOT NULL,
+        hostname TEXT NOT NULL,
+        success INTEGER NOT NULL,
+        changes BLOB NOT NULL,
+        error TEXT,
+        FOREIGN KEY (resource_id) REFERENCES resources(id)
+    )
+    """,
+    # Serves "latest N entries for a resource" as an ordered index range
+    # scan that stops after LIMIT rows
+    "DROP INDEX IF EXISTS idx_history_resource",
+    "CREATE INDEX IF NOT EXISTS idx_history_resource_ts ON history(resource_id, timestamp DESC)",
+    "CREATE INDEX IF NOT EXISTS idx_history_timestamp ON history(timestamp DESC)",
+)
+
+RESOURCE_COLUMNS = (
+    "id, type, desired_state, actual_state, applied_at, applied_by, "
+    "hostname, config_file, status"
+)
+INSERT_RESOURCE = (
+    f"INSERT OR REPLACE INTO resources ({RESOURCE_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
+)
+SELECT_RESOURCE = f"SELECT {RESOURCE_COLUMNS} FROM resources WHERE id = ?"
+SELECT_RESOURCES = f"SELECT {RESOURCE_COLUMNS} FROM resources ORDER BY applied_at DESC"
+SELECT_RESOURCES_BY_STATUS = (
+    f"SELECT {RESOURCE_COLUMNS} FROM resources WHERE status = ? ORDER BY applied_at DESC"
+)
+
+
+def _resource_row(cursor: sqlite3.Cursor, row: tuple) -> ResourceState:
+    """Row factory building a ResourceState straight from RESOURCE_COLUMNS."""
+    return ResourceState(
+        id=row[0],
+        type=row[1],
+        desired_state=_json_loads(row[2]),
+        actual_state=_json_loads(row[3]),
+        applied_at=_from_epoch_us(row[4]),
+        applied_by=row[5],
+        hostname=row[6],
+        config_file=row[7],
+        status=row[8],
+    )
+
+
+HISTORY_COLUMNS = "timestamp, resource_id, action, user, hostname, success, changes, error"
+INSERT_HISTORY = f"INSERT INTO history ({HISTORY_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+SELECT_HISTORY = (
+    f"SELECT {HISTORY_COLUMNS} FROM history "
+    "WHERE resource_id = ? ORDER BY timestamp DESC LIMIT ?"
+)
+
+
+def _history_row(cursor: sqlite3.Cursor, row: tuple) -> HistoryEntry:
+    """Row factory building a HistoryEntry straight from HISTORY_COLUMNS."""
+    return HistoryEntry(
+        timestamp=_from_epoch_us(row[0]),
+        resource_id=row[1],
+        action=row[2],
+        user=row[3],
+        hostname=row[4],
+        success=bool(row[5]),
+        changes=_json_loads(row[6]),
+        error=row[7],
+    )
+
+
 class Store:
     """
     SQLite-based state store for Cook.
@@ -56,14 +174,22 @@ class Store:
         store = Store()
         store.save_resource(resource_state)
         resources = store.list_resources()
+
+        # Throwaway store kept in memory (tests, dry runs)
+        store = Store(Store.MEMORY)
     """
 
+    # SQLite's name for a private in-memory database
+    MEMORY = ":memory:"
+
     def __init__(self, db_path: Optional[str] = None):
         """
         Initialize state store.
 
         Args:
-            db_path: Path to SQLite database (default: ~/.cook/state.db)
+            db_path: Path to SQLite database (default: ~/.cook/state.db),
+                or Store.MEMORY for a database that lives only as long as
+                this Store
         """
         if db_path is None:
             db_path = self._default_path()
@@ -71,7 +197,8 @@ class Store:
         self.db_path = db_path
         self._ensure_db_dir()
         self.conn = sqlite3.connect(db_path)
-        self.conn.row_factory = sqlite3.Row
+        self._transaction_depth = 0
+        self._configure()
         self._init_schema()
 
     @staticmethod
@@ -82,41 +209,113 @@ class Store:
 
     def _ensure_db_dir(self) -> None:
         """Ensure state directory exists."""
+        if self.db_path == self.MEMORY:
+            return
         Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
 
-    def _init_schema(self) -> None:
-        """Initialize database schema."""
+    def _configure(self) -> None:
+        """
+        Tune the connection for many small writes.
+
+        WAL with synchronous=NORMAL avoids the rollback journal's extra
+        fsyncs per commit while staying crash-safe for the database file.
+        """
         self.conn.executescript("""
-            CREATE TABLE IF NOT EXISTS resources (
-                id TEXT PRIMARY KEY,
-                type TEXT NOT NULL,
-                desired_state TEXT NOT NULL,
-                actual_state TEXT NOT NULL,
-                applied_at TEXT NOT NULL,
-                applied_by TEXT NOT NULL,
-                hostname TEXT NOT NULL,
-                config_file TEXT NOT NULL,
-                status TEXT NOT NULL
-            );
-
-            CREATE TABLE IF NOT EXISTS history (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                timestamp TEXT NOT NULL,
-                resource_id TEXT NOT NULL,
-                action TEXT NOT NULL,
-                user TEXT NOT NULL,
-                hostname TEXT NOT NULL,
-                success INTEGER NOT NULL,
-                changes TEXT NOT NULL,
-                error TEXT,
-                FOREIGN KEY (resource_id) REFERENCES resources(id)
-            );
-
-            CREATE INDEX IF NOT EXISTS idx_history_resource
-                ON history(resource_id);
-            CREATE INDEX IF NOT EXISTS idx_history_timestamp
-                ON history(timestamp DESC);
+            PRAGMA journal_mode=WAL;
+            PRAGMA synchronous=NORMAL;
+            PRAGMA temp_store=MEMORY;
+            PRAGMA mmap_size=268435456;
+            PRAGMA cache_size=-20000;
         """)
+
+    @contextmanager
+    def transaction(self) -> Iterator["Store"]:
+        """
+        Group writes into one transaction, committed once on exit.
+
+        Rolled back if the block raises. Nested blocks join the outer one.
+
+        Example:
+            with store.transaction():
+                for state in states:
+                    store.save_resource(state)
+        """
+        self._transaction_depth += 1
+        try:
+            yield self
+        except BaseException:
+            if self._transaction_depth == 1:
+                self.conn.rollback()
+            raise
+        else:
+            if self._transaction_depth == 1:
+                self.conn.commit()
+        finally:
+            self._transaction_depth -= 1
+
+    def _commit(self) -> None:
+        """Commit unless inside transaction(), which commits on exit."""
+        if not self._transaction_depth:
+            self.conn.commit()
+
+    def _init_schema(self) -> None:
+        """Initialize database schema, migrating a legacy database first."""
+        if self._is_legacy_schema():
+            self._migrate_legacy_schema()
+            return
+
+        for statement in SCHEMA:
+            self.conn.execute(statement)
+        self.conn.commit()
+
+    def _is_legacy_schema(self) -> bool:
+        """Check for the original schema (ISO text timestamps, text JSON)."""
+        columns = {
+            row[1]: row[2] for row in self.conn.execute("PRAGMA table_info(resources)")
+        }
+        return columns.get("applied_at", "").upper() == "TEXT"
+
+    def _migrate_legacy_schema(self) -> None:
+        """Rewrite a legacy database into the current schema in one transaction."""
+        resources = self.conn.execute(
+            f"SELECT {RESOURCE_COLUMNS} FROM resources"
+        ).fetchall()
+        history = self.conn.execute(
+            f"SELECT {HISTORY_COLUMNS} FROM history ORDER BY id"
+        ).fetchall()
+
+        self.conn.execute("BEGIN")
+        try:
+            self.conn.execute("DROP TABLE history")
+            self.conn.execute("DROP TABLE resources")
+            for statement in SCHEMA:
+                self.conn.execute(statement)
+
+            self.conn.executemany(
+                INSERT_RESOURCE,
+                (
+                    (
+                        row[0], row[1], row[2].encode("utf-8"), row[3].encode("utf-8"),
+                        _to_epoch_us(datetime.fromisoformat(row[4])),
+                        row[5], row[6], row[7], row[8],
+                    )
+                    for row in resources
+                ),
+            )
+            self.conn.executemany(
+                INSERT_HISTORY,
+                (
+                    (
+                        _to_epoch_us(datetime.fromisoformat(row[0])),
+                        row[1], row[2], row[3], row[4], row[5],
+                        row[6].encode("utf-8"), row[7],
+                    )
+                    for row in history
+                ),
+            )
+        except BaseException:
+            self.conn.rollback()
+            raise
         self.conn.commit()
 
     def save_resource(self, state: ResourceState) -> None:
@@ -126,26 +325,33 @@ class Store:
         Args:
             state: ResourceState to save
         """
-        self.conn.execute(
-            """
-            INSERT OR REPLACE INTO resources
-            (id, type, desired_state, actual_state, applied_at, applied_by,
-             hostname, config_file, status)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """,
+        self.save_resources([state])
+
+    def save_resources(self, states: Iterable[ResourceState]) -> None:
+        """
+        Save or update several resource states in one statement.
+
+        Args:
+            states: ResourceStates to save
+        """
+        self.conn.executemany(
+            INSERT_RESOURCE,
             (
-                state.id,
-                state.type,
-                json.dumps(state.desired_state),
-                json.dumps(state.actual_state),
-                state.applied_at.isoformat(),
-                state.applied_by,
-                state.hostname,
-                state.config_file,
-                state.status,
+                (
+                    state.id,
+                    state.type,
+                    _json_dumps(state.desired_state),
+                    _json_dumps(state.actual_state),
+                    _to_epoch_us(state.applied_at),
+                    state.applied_by,
+                    state.hostname,
+                    state.config_file,
+                    state.status,
+                )
+                for state in states
             ),
         )
-        self.conn.commit()
+        self._commit()
 
     def get_resource(self, resource_id: str) -> Optional[ResourceState]:
         """
@@ -157,24 +363,7 @@ class Store:
         Returns:
             ResourceState or None if not found
         """
-        row = self.conn.execute(
-            "SELECT * FROM resources WHERE id = ?", (resource_id,)
-        ).fetchone()
-
-        if not row:
-            return None
-
-        return ResourceState(
-            id=row["id"],
-            type=row["type"],
-            desired_state=json.loads(row["desired_state"]),
-            actual_state=json.loads(row["actual_state"]),
-            applied_at=datetime.fromisoformat(row["applied_at"]),
-            applied_by=row["applied_by"],
-            hostname=row["hostname"],
-            config_file=row["config_file"],
-            status=row["status"],
-        )
+        return self._query_resources(SELECT_RESOURCE, (resource_id,)).fetchone()
 
     def list_resources(self) -> List[ResourceState]:
         """
@@ -183,24 +372,7 @@ class Store:
         Returns:
             List of ResourceState objects
         """
-        rows = self.conn.execute(
-            "SELECT * FROM resources ORDER BY applied_at DESC"
-        ).fetchall()
-
-        return [
-            ResourceState(
-                id=row["id"],
-                type=row["type"],
-                desired_state=json.loads(row["desired_state"]),
-                actual_state=json.loads(row["actual_state"]),
-                applied_at=datetime.fromisoformat(row["applied_at"]),
-                applied_by=row["applied_by"],
-                hostname=row["hostname"],
-                config_file=row["config_file"],
-                status=row["status"],
-            )
-            for row in rows
-        ]
+        return self._query_resources(SELECT_RESOURCES).fetchall()
 
     def add_history(self, entry: HistoryEntry) -> None:
         """
@@ -209,24 +381,32 @@ class Store:
         Args:
             entry: HistoryEntry to record
         """
-        self.conn.execute(
-            """
-            INSERT INTO history
-            (timestamp, resource_id, action, user, hostname, success, changes, error)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        """,
+        self.add_history_batch([entry])
+
+    def add_history_batch(self, entries: Iterable[HistoryEntry]) -> None:
+        """
+        Add several history entries in one statement.
+
+        Args:
+            entries: HistoryEntries to record
+        """
+        self.conn.executemany(
+            INSERT_HISTORY,
             (
-                entry.timestamp.isoformat(),
-                entry.resource_id,
-                entry.action,
-                entry.user,
-                entry.hostname,
-                1 if entry.success else 0,
-                json.dumps(entry.changes),
-                entry.error,
+                (
+                    _to_epoch_us(entry.timestamp),
+                    entry.resource_id,
+                    entry.action,
+                    entry.user,
+                    entry.hostname,
+                    1 if entry.success else 0,
+                    _json_dumps(entry.changes),
+                    entry.error,
+                )
+                for entry in entries
             ),
         )
-        self.conn.commit()
+        self._commit()
 
     def get_history(self, resource_id: str, limit: int = 10) -> List[HistoryEntry]:
         """
@@ -239,29 +419,9 @@ class Store:
         Returns:
             List of HistoryEntry objects
         """
-        rows = self.conn.execute(
-            """
-            SELECT * FROM history
-            WHERE resource_id = ?
-            ORDER BY timestamp DESC
-            LIMIT ?
-        """,
-            (resource_id, limit),
-        ).fetchall()
-
-        return [
-            HistoryEntry(
-                timestamp=datetime.fromisoformat(row["timestamp"]),
-                resource_id=row["resource_id"],
-                action=row["action"],
-                user=row["user"],
-                hostname=row["hostname"],
-                success=bool(row["success"]),
-                changes=json.loads(row["changes"]),
-                error=row["error"],
-            )
-            for row in rows
-        ]
+        cursor = self.conn.cursor()
+        cursor.row_factory = _history_row
+        return cursor.execute(SELECT_HISTORY, (resource_id, limit)).fetchall()
 
     def list_drifted(self) -> List[ResourceState]:
         """
@@ -270,24 +430,13 @@ class Store:
         Returns:
             List of ResourceState objects with status="drift"
         """
-        rows = self.conn.execute(
-            "SELECT * FROM resources WHERE status = 'drift' ORDER BY applied_at DESC"
-        ).fetchall()
+        return self._query_resources(SELECT_RESOURCES_BY_STATUS, ("drift",)).fetchall()
 
-        return [
-            ResourceState(
-                id=row["id"],
-                type=row["type"],
-                desired_state=json.loads(row["desired_state"]),
-                actual_state=json.loads(row["actual_state"]),
-                applied_at=datetime.fromisoformat(row["applied_at"]),
-                applied_by=row["applied_by"],
-                hostname=row["hostname"],
-                config_file=row["config_file"],
-                status=row["status"],
-            )
-            for row in rows
-        ]
+    def _query_resources(self, sql: str, params: tuple = ()) -> sqlite3.Cursor:
+        """Run a resources query whose rows come back as ResourceState."""
+        cursor = self.conn.cursor()
+        cursor.row_factory = _resource_row
+        return cursor.execute(sql, params)
 
     def close(self) -> None:
         """Close database connection."""
@@ -5,12 +5,14 @@ Provides abstraction for:
 - Local command execution
 - SSH remote execution
 - File transfer (SCP)
+- Shell script export
 """
 
 from cook.transport.base import NullTransport, Transport
 from cook.transport.local import LocalTransport
+from cook.transport.script import ScriptTransport
 
-__all__ = ["Transport", "NullTransport", "LocalTransport"]
+__all__ = ["Transport", "NullTransport", "LocalTransport", "ScriptTransport"]
 
 # SSHTransport will be added when paramiko is installed
 try:
@@ -4,8 +4,12 @@ Base transport interface.
 All transport implementations (Local, SSH) must implement this interface.
 """
 
+import os
+import re
+import time
+import uuid
 from abc import ABC, abstractmethod
-from typing import Tuple
+from typing import Dict, Iterator, List, Optional, Tuple
 
 
 class Transport(ABC):
@@ -34,12 +38,13 @@ class Transport(ABC):
         pass
 
     @abstractmethod
-    def run_command(self, args: list) -> Tuple[str, int]:
+    def run_command(self, args: list, env: Optional[Dict[str, str]] = None) -> Tuple[str, int]:
         """
         Run a command from list of arguments (safer - no shell).
 
         Args:
             args: Command and arguments as list
+            env: Extra environment variables for the command
 
         Returns:
             Tuple of (output, exit_code)
@@ -63,6 +68,39 @@ class Transport(ABC):
         """
         pass
 
+    def write_files(self, files: List[Tuple[str, bytes, Optional[int]]]) -> None:
+        """
+        Write several files, creating missing parent directories.
+
+        The default writes them one at a time; remote transports override
+        it to send all files in one stream.
+
+        Args:
+            files: (path, content, mode) per file. mode is the permission
+                set the file should end up with (its current mode when it
+                exists), for implementations that recreate metadata; None
+                for a new file that takes the umask default.
+
+        Raises:
+            IOError: If a write fails
+        """
+        for path, content, _ in files:
+            self.write_file(path, content)
+
+    @abstractmethod
+    def append_file(self, remote_path: str, content: bytes) -> None:
+        """
+        Append content to a file, creating it if needed.
+
+        Args:
+            remote_path: Path to file (may be remote)
+            content: Content to append as bytes
+
+        Raises:
+            IOError: If append fails
+        """
+        pass
+
     @abstractmethod
     def read_file(self, remote_path: str) -> bytes:
         """
@@ -92,6 +130,51 @@ class Transport(ABC):
         """
         pass
 
+    @abstractmethod
+    def stat(self, remote_path: str) -> Optional[os.stat_result]:
+        """
+        Get file status in a single round trip.
+
+        Args:
+            remote_path: Path to file (may be remote)
+
+        Returns:
+            stat_result-like object (st_mode, st_size, st_mtime, ...),
+            or None if the file doesn't exist
+        """
+        pass
+
+    @abstractmethod
+    def glob(self, pattern: str) -> List[str]:
+        """
+        List paths matching a shell wildcard pattern.
+
+        Wildcards are only supported in the final path component.
+
+        Args:
+            pattern: Pattern such as "/etc/apt/sources.list.d/*.list"
+
+        Returns:
+            Sorted list of matching paths (empty if none)
+        """
+        pass
+
+    @abstractmethod
+    def grep(self, remote_path: str, text: str) -> bool:
+        """
+        Check whether any line of a file contains a fixed string.
+
+        The file is scanned where it lives; only the result is returned.
+
+        Args:
+            remote_path: Path to file
+            text: Fixed string to look for (not a regex)
+
+        Returns:
+            True if found, False if not found or the file doesn't exist
+        """
+        pass
+
     @abstractmethod
     def copy_file(self, local_path: str, remote_path: str) -> None:
         """
@@ -117,6 +200,147 @@ class Transport(ABC):
         """
         pass
 
+    def symlink(self, target: str, link_path: str) -> None:
+        """
+        Point link_path at target, atomically replacing whatever link or
+        file is there.
+
+        The new link is created next to link_path and renamed over it, so
+        readers see either the old link or the new one, never neither. The
+        default does this with ln and mv in one command.
+
+        Args:
+            target: Path the link points to
+            link_path: Path of the link itself
+
+        Raises:
+            IOError: If the link can't be created
+        """
+        tmp_path = f"{link_path}.cook-{uuid.uuid4().hex[:8]}"
+        # mv -T (GNU) / -h (BSD) replace a link to a directory instead of
+        # moving into the directory it points to
+        script = (
+            'ln -s "$1" "$3" && { mv -Tf "$3" "$2" 2>/dev/null || mv -hf "$3" "$2"; } '
+            '|| { rm -f "$3"; exit 1; }'
+        )
+        output, code = self.run_command(["sh", "-c", script, "sh", target, link_path, tmp_path])
+        if code != 0:
+            raise IOError(f"Failed to link {link_path} -> {target}: {output}")
+
+    def read_file_stream(self, remote_path: str, chunk_size: int = 1 << 20) -> Iterator[bytes]:
+        """
+        Read file content in chunks, for files too large to hold at once.
+
+        Transports that can read incrementally override this; the default
+        yields the whole of read_file().
+
+        Args:
+            remote_path: Path to file (may be remote)
+            chunk_size: Maximum bytes per chunk
+
+        Yields:
+            Non-empty chunks of the file, in order
+
+        Raises:
+            FileNotFoundError: If file doesn't exist
+        """
+        content = self.read_file(remote_path)
+        if content:
+            yield content
+
+    def stat_many(self, remote_paths: List[str]) -> List[Optional[os.stat_result]]:
+        """
+        Get status for several paths at once.
+
+        Transports where each stat() is a round trip override this to fetch
+        all results in one.
+
+        Args:
+            remote_paths: Paths to stat
+
+        Returns:
+            One stat_result (or None if missing) per path, in order
+
+        Raises:
+            IOError: If a path exists but could not be stat'ed
+        """
+        return [self.stat(path) for path in remote_paths]
+
+    def read_file_cached(self, remote_path: str, ttl: float = 0) -> bytes:
+        """
+        Read a file, reusing the last snapshot while the file is unchanged.
+
+        Snapshots are validated against the file's (mtime, size) with one
+        stat(), so a write between reads invalidates them. With ttl > 0 a
+        snapshot younger than ttl seconds is returned without the stat.
+
+        Args:
+            remote_path: Path to file
+            ttl: Seconds to trust a snapshot without re-validating it
+
+        Returns:
+            File content as bytes
+
+        Raises:
+            FileNotFoundError: If file doesn't exist
+        """
+        cache = getattr(self, "_read_cache", None)
+        if cache is None:
+            cache = self._read_cache = {}
+
+        cached = cache.get(remote_path)
+        now = time.monotonic()
+        if cached is not None and ttl > 0 and now - cached[1] < ttl:
+            return cached[2]
+
+        st = self.stat(remote_path)
+        if st is None:
+            cache.pop(remote_path, None)
+            raise FileNotFoundError(remote_path)
+
+        signature = (st.st_mtime, st.st_size)
+        if cached is not None and cached[0] == signature:
+            cache[remote_path] = (signature, now, cached[2])
+            return cached[2]
+
+        content = self.read_file(remote_path)
+        cache[remote_path] = (signature, now, content)
+        return content
+
+    def run_pipeline(self, commands: List[str]) -> List[Tuple[str, int]]:
+        """
+        Run several shell commands in one round trip.
+
+        Commands run sequentially in a single shell session, each in its own
+        subshell, so one failing command doesn't stop the rest.
+
+        Args:
+            commands: Shell command strings
+
+        Returns:
+            List of (output, exit_code), one per command
+
+        Example:
+            results = transport.run_pipeline(["test -e /etc/hosts", "uname -r"])
+        """
+        if not commands:
+            return []
+
+        # Unique marker separates per-command output and carries the exit code
+        marker = f"__cook_{uuid.uuid4().hex}__"
+        script = "".join(
+            f"( {command}\n) 2>&1; printf '\\n{marker} %d\\n' $?\n" for command in commands
+        )
+        output, code = self.run_command(["sh", "-c", script])
+
+        parts = re.split(rf"\n{marker} (\d+)\n", output)
+        results = [
+            (parts[i], int(parts[i + 1])) for i in range(0, len(parts) - 1, 2)
+        ]
+        if len(results) != len(commands):
+            raise RuntimeError(f"Pipeline interrupted (exit code {code}): {output}")
+        return results
+
     def __enter__(self):
         """Context manager entry."""
         return self
@@ -149,7 +373,7 @@ class NullTransport(Transport):
         self._raise_error("run_shell()")
         return ("", 1)  # Never reached, but satisfies type checker
 
-    def run_command(self, args: list) -> Tuple[str, int]:
+    def run_command(self, args: list, env: Optional[Dict[str, str]] = None) -> Tuple[str, int]:
         """Raise error - transport not initialized."""
         self._raise_error("run_command()")
         return ("", 1)  # Never reached, but satisfies type checker
@@ -158,6 +382,10 @@ class NullTransport(Transport):
         """Raise error - transport not initialized."""
         self._raise_error("write_file()")
 
+    def append_file(self, remote_path: str, content: bytes) -> None:
+        """Raise error - transport not initialized."""
+        self._raise_error("append_file()")
+
     def read_file(self, remote_path: str) -> bytes:
         """Raise error - transport not initialized."""
         self._raise_error("read_file()")
@@ -168,6 +396,21 @@ class NullTransport(Transport):
         self._raise_error("file_exists()")
         return False  # Never reached, but satisfies type checker
 
+    def stat(self, remote_path: str) -> Optional[os.stat_result]:
+        """Raise error - transport not initialized."""
+        self._raise_error("stat()")
+        return None  # Never reached, but satisfies type checker
+
+    def glob(self, pattern: str) -> List[str]:
+        """Raise error - transport not initialized."""
+        self._raise_error("glob()")
+        return []  # Never reached, but satisfies type checker
+
+    def grep(self, remote_path: str, text: str) -> bool:
+        """Raise error - transport not initialized."""
+        self._raise_error("grep()")
+        return False  # Never reached, but satisfies type checker
+
     def copy_file(self, local_path: str, remote_path: str) -> None:
         """Raise error - transport not initialized."""
         self._raise_error("copy_file()")
@@ -8,6 +8,9 @@ import subprocess
 import re
 from typing import Optional, Tuple
 
+# "Key value" lines of `limactl show-ssh --format=config` that we need
+LIMA_SSH_CONFIG_RE = re.compile(r'^\s*(Port|User|IdentityFile)\s+"?([^"\s]+)"?\s*$', re.M)
+
 
 def get_lima_ssh_config(vm_name: str) -> Tuple[str, int, str, Optional[str]]:
     """
@@ -45,20 +48,13 @@ def get_lima_ssh_config(vm_name: str) -> Tuple[str, int, str, Optional[str]]:
     # Parse SSH config
     config = result.stdout
 
-    # Extract values using regex
+    # Extract values using regex (later lines win, as before)
+    fields = {m.group(1): m.group(2) for m in LIMA_SSH_CONFIG_RE.finditer(config)}
+
     host = "127.0.0.1"  # Lima VMs always use localhost
-    port = 22
-    user = "root"
-    key_file = None
-
-    for line in config.split("\n"):
-        line = line.strip()
-        if line.startswith("Port "):
-            port = int(line.split()[1])
-        elif line.startswith("User "):
-            user = line.split()[1]
-        elif line.startswith("IdentityFile "):
-            key_file = line.split()[1].strip('"')
+    port = int(fields.get("Port", 22))
+    user = fields.get("User", "root")
+    key_file = fields.get("IdentityFile")
 
     return host, port, user, key_file
 
@@ -2,18 +2,134 @@
 Local transport - run commands on local machine.
 """
 
+import glob
+import os
+import re
+import shlex
+import shutil
 import subprocess
+import threading
+import uuid
 from pathlib import Path
-from typing import Tuple
+from typing import Dict, Iterator, List, Optional, Tuple
 
+from cook.transport.base import Transport
 
-class LocalTransport:
+
+# Command name to absolute path. Only successful lookups are kept, so a
+# tool installed during the run is still found on a later call.
+_EXECUTABLES: Dict[str, str] = {}
+
+
+def _resolve_executable(args: List[str]) -> List[str]:
+    """
+    Replace a bare command name with its absolute path.
+
+    subprocess only takes the posix_spawn() path for executables with a
+    directory component; a bare name makes it fork the interpreter instead.
+    Unknown commands are left as-is so Popen still raises FileNotFoundError.
+    """
+    name = args[0]
+    if os.sep in name:
+        return args
+    path = _EXECUTABLES.get(name)
+    if path is None:
+        path = shutil.which(name)
+        if path is None:
+            return args
+        _EXECUTABLES[name] = path
+    return [path, *args[1:]]
+
+
+def _copy_file_range(src: str, dst: str) -> bool:
+    """
+    Copy src to dst with copy_file_range(2), which shares extents on CoW
+    filesystems (btrfs, xfs) and copies in-kernel elsewhere.
+
+    Returns:
+        False if the call is unavailable or refused (e.g. across filesystems
+        on older kernels), or if the source ended before its size at open
+        (it shrank mid-copy); the caller then copies another way.
+    """
+    if not hasattr(os, "copy_file_range"):
+        return False
+
+    src_fd = os.open(src, os.O_RDONLY)
+    try:
+        dst_fd = os.open(dst, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o666)
+        try:
+            remaining = os.fstat(src_fd).st_size
+            while remaining > 0:
+                copied = os.copy_file_range(src_fd, dst_fd, remaining)
+                if copied == 0:
+                    # Early end of file: never report a short copy as done
+                    return False
+                remaining -= copied
+        except OSError:
+            return False
+        finally:
+            os.close(dst_fd)
+    finally:
+        os.close(src_fd)
+    return True
+
+
+# Persistent shell sessions a LocalTransport keeps open between commands
+MAX_IDLE_SHELLS = 8
+
+
+def _decode(output: bytes) -> str:
+    """Decode merged command output; undecodable bytes never raise."""
+    return output.decode("utf-8", errors="replace")
+
+
+class LocalTransport(Transport):
     """
     Local transport for running commands on the local machine.
 
-    Uses subprocess for command execution.
+    Uses subprocess for command execution. stderr is merged into stdout
+    by the kernel (one pipe, one read) and decoded once.
+
+    Commands are started with posix_spawn() rather than fork(): arguments
+    carry an absolute executable path and close_fds=False (Python creates
+    descriptors non-inheritable, so nothing leaks). Do not add preexec_fn,
+    cwd, pass_fds or start_new_session to these calls, as any of them
+    sends subprocess back to fork().
+
+    Shell commands go to long-lived /bin/sh sessions, started on first
+    use, so a run pays for a few shell startups instead of one per
+    command. A command checks a session out of a pool and returns it
+    afterwards, so parallel checks never queue behind one another and
+    short-lived worker threads leave no shells behind. At most
+    max_idle_shells sessions are kept between commands. Each command runs
+    in a subshell with stdin from /dev/null, so cd/export/exit do not leak
+    between commands. A session only serves the working directory and
+    environment it was started in; after an os.chdir() or os.environ
+    change, idle sessions are replaced so commands see the new ones.
+    Pass persistent_shell=False for commands that need the terminal's
+    stdin.
     """
 
+    def __init__(self, persistent_shell: bool = True, max_idle_shells: int = MAX_IDLE_SHELLS):
+        """
+        Initialize local transport.
+
+        Args:
+            persistent_shell: Run shell commands in long-lived /bin/sh sessions
+            max_idle_shells: Sessions kept open between commands; extra
+                sessions started for a burst of parallel commands are stopped
+        """
+        self.persistent_shell = persistent_shell
+        self.max_idle_shells = max_idle_shells
+        # Sessions waiting for a command, and every live session for close()
+        self._idle: List[subprocess.Popen] = []
+        self._shells: List[subprocess.Popen] = []
+        # Working directory and environment each session was started in
+        self._session_state: Dict[subprocess.Popen, Tuple[str, Dict[str, str]]] = {}
+        self._shells_lock = threading.Lock()
+        self._shell_marker = f"__COOK_END_{uuid.uuid4().hex}__"
+        self._shell_end = re.compile(rb"\n" + self._shell_marker.encode() + rb" (\d+)\n")
+
     def run_shell(self, command: str) -> Tuple[str, int]:
         """
         Run command via shell.
@@ -24,43 +140,223 @@ class LocalTransport:
         Returns:
             Tuple of (output, exit_code)
         """
+        if self.persistent_shell:
+            shell = self._checkout_session()
+            try:
+                result = self._run_in_session(shell, command)
+            except BrokenPipeError:
+                # The session was already dead when the command was sent, so
+                # it never ran: drop the session and run it on its own
+                self._close_session(shell)
+            except EOFError:
+                # The session died after taking the command (e.g. it killed
+                # its own shell); it may have run, so running it again could
+                # repeat a non-idempotent change
+                self._close_session(shell)
+                raise RuntimeError(
+                    f"Shell session exited while running command: {command}"
+                )
+            except BaseException:
+                # Interrupted mid-command: the session's output is out of step
+                self._close_session(shell)
+                raise
+            else:
+                self._return_session(shell)
+                return result
+
         result = subprocess.run(
-            command,
-            shell=True,
-            capture_output=True,
-            text=True,
+            ["/bin/sh", "-c", command],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            close_fds=False,
         )
-        return result.stdout + result.stderr, result.returncode
+        return _decode(result.stdout), result.returncode
+
+    def _checkout_session(self) -> subprocess.Popen:
+        """Take an idle session from the pool, or start a new one."""
+        state = (os.getcwd(), dict(os.environ))
+        stale = []
+        with self._shells_lock:
+            while self._idle:
+                shell = self._idle.pop()
+                if self._session_state.get(shell) == state:
+                    break
+                stale.append(shell)
+            else:
+                shell = None
+        # Started before a chdir/environment change: the shell kept the old ones
+        for old in stale:
+            self._close_session(old)
+        if shell is not None:
+            return shell
+
+        shell = subprocess.Popen(
+            ["/bin/sh"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            close_fds=False,
+        )
+        with self._shells_lock:
+            self._shells.append(shell)
+            self._session_state[shell] = state
+        return shell
+
+    def _return_session(self, shell: subprocess.Popen) -> None:
+        """Put a session back in the pool, or stop it if the pool is full."""
+        with self._shells_lock:
+            if shell in self._shells and len(self._idle) < self.max_idle_shells:
+                self._idle.append(shell)
+                return
+        self._close_session(shell)
+
+    def _run_in_session(self, shell: subprocess.Popen, command: str) -> Tuple[str, int]:
+        """Send one command to a persistent shell and read until its end marker."""
+        # eval of a quoted string: a syntax error or unbalanced quote in the
+        # command fails inside the subshell instead of derailing the session
+        shell.stdin.write(
+            f"( eval {shlex.quote(command)} ) </dev/null 2>&1; "
+            f"printf '\\n{self._shell_marker} %d\\n' $?\n".encode()
+        )
+        shell.stdin.flush()
+
+        fd = shell.stdout.fileno()
+        buffer = bytearray()
+        # Only the tail can hold a marker that was cut between two reads
+        overlap = len(self._shell_marker) + 16
+        start = 0
+        while True:
+            match = self._shell_end.search(buffer, start)
+            if match:
+                return _decode(bytes(buffer[: match.start()])), int(match.group(1))
+            start = max(0, len(buffer) - overlap)
+            chunk = os.read(fd, 65536)
+            if not chunk:
+                raise EOFError("local shell session exited")
+            buffer += chunk
 
-    def run_command(self, args: list) -> Tuple[str, int]:
+    def _close_session(self, shell: subprocess.Popen) -> None:
+        """Stop one persistent shell."""
+        with self._shells_lock:
+            if shell in self._shells:
+                self._shells.remove(shell)
+            if shell in self._idle:
+                self._idle.remove(shell)
+            self._session_state.pop(shell, None)
+        try:
+            shell.stdin.close()
+        except OSError:
+            pass
+        try:
+            shell.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            shell.kill()
+            shell.wait()
+        shell.stdout.close()
+
+    def run_command(self, args: list, env: Optional[Dict[str, str]] = None) -> Tuple[str, int]:
         """
         Run command from list of arguments (safer - no shell).
 
         Args:
             args: Command and arguments as list
+            env: Extra environment variables for the command
 
         Returns:
             Tuple of (output, exit_code)
         """
         result = subprocess.run(
-            args,
-            capture_output=True,
-            text=True,
+            # An explicit PATH decides the lookup itself
+            _resolve_executable(args) if args and not (env and "PATH" in env) else args,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            close_fds=False,
+            env={**os.environ, **env} if env else None,
         )
-        return result.stdout + result.stderr, result.returncode
+        return _decode(result.stdout), result.returncode
 
     def write_file(self, path: str, content: bytes) -> None:
         """Write content to file."""
         Path(path).write_bytes(content)
 
+    def write_files(self, files: List[Tuple[str, bytes, Optional[int]]]) -> None:
+        """
+        Write several files with os.open()/os.write(), no file objects.
+
+        Each file is opened with its mode, so a new file never exists with
+        a wider mode than asked for; existing files are truncated in place
+        (owner and inode stay) and get the mode with fchmod(). Files without
+        a mode are created under the umask, as write_file() does.
+        """
+        flags = os.O_WRONLY | os.O_CREAT | os.O_TRUNC
+        for path, content, mode in files:
+            create_mode = 0o666 if mode is None else mode
+            try:
+                fd = os.open(path, flags, create_mode)
+            except FileNotFoundError:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                fd = os.open(path, flags, create_mode)
+            try:
+                view = memoryview(content)
+                while view:
+                    view = view[os.write(fd, view):]
+                if mode is not None:
+                    os.fchmod(fd, mode)
+            finally:
+                os.close(fd)
+
+    def append_file(self, path: str, content: bytes) -> None:
+        """Append content to file."""
+        with open(path, "ab") as f:
+            f.write(content)
+
     def read_file(self, path: str) -> bytes:
         """Read file content."""
         return Path(path).read_bytes()
 
+    def read_file_stream(self, path: str, chunk_size: int = 1 << 20) -> Iterator[bytes]:
+        """Read file content in chunks of up to chunk_size bytes."""
+        with open(path, "rb") as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    return
+                yield chunk
+
     def file_exists(self, path: str) -> bool:
         """Check if file exists."""
         return Path(path).exists()
 
+    def stat(self, path: str) -> Optional[os.stat_result]:
+        """Get file status, or None if the file doesn't exist."""
+        try:
+            return os.stat(path)
+        except FileNotFoundError:
+            return None
+
+    def glob(self, pattern: str) -> List[str]:
+        """List paths matching a wildcard pattern."""
+        return sorted(glob.glob(pattern))
+
+    def grep(self, remote_path: str, text: str) -> bool:
+        """Check whether any line of a file contains text, stopping at the first match."""
+        try:
+            with open(remote_path, "r", encoding="utf-8", errors="replace") as f:
+                return any(text in line for line in f)
+        except FileNotFoundError:
+            return False
+
+    def symlink(self, target: str, link_path: str) -> None:
+        """Point link_path at target with symlink(2) + rename(2), no subprocess."""
+        tmp_path = f"{link_path}.cook-{uuid.uuid4().hex[:8]}"
+        try:
+            os.symlink(target, tmp_path)
+            os.replace(tmp_path, link_path)
+        except OSError as e:
+            if os.path.lexists(tmp_path):
+                os.unlink(tmp_path)
+            raise IOError(f"Failed to link {link_path} -> {target}: {e}") from e
+
     def copy_file(self, local_path: str, remote_path: str) -> None:
         """
         Copy file locally.
@@ -69,9 +365,15 @@ class LocalTransport:
             local_path: Source path
             remote_path: Destination path
         """
-        content = Path(local_path).read_bytes()
-        Path(remote_path).write_bytes(content)
+        # Reflink/in-kernel copy where the filesystem allows it; otherwise
+        # shutil.copyfile, which uses sendfile() (Linux) or fcopyfile()
+        # (macOS) and only bounces through userspace as a last resort
+        if not _copy_file_range(local_path, remote_path):
+            shutil.copyfile(local_path, remote_path)
 
     def close(self) -> None:
-        """No-op for local transport."""
-        pass
+        """Stop all persistent shell sessions."""
+        with self._shells_lock:
+            shells, self._shells, self._idle = self._shells, [], []
+        for shell in shells:
+            self._close_session(shell)
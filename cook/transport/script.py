@@ -0,0 +1,100 @@
+"""
+Script transport - record changes as a shell script instead of running them.
+"""
+
+import base64
+import os
+import shlex
+import uuid
+from typing import Dict, List, Optional, Tuple
+
+from cook.transport.base import Transport
+
+
+class ScriptTransport(Transport):
+    """
+    Transport that turns every change into a line of POSIX shell.
+
+    Commands are recorded, not run, and report success with no output.
+    File writes become heredocs (base64 for binary content). Reads find
+    nothing, so it is only meant for applying a plan made against the
+    real host (see Executor.export_script).
+    """
+
+    def __init__(self):
+        self.lines: List[str] = []
+
+    def script(self) -> str:
+        """The recorded lines as a script that stops at the first failure."""
+        return "\n".join(["#!/bin/sh", "set -e", ""] + self.lines) + "\n"
+
+    def comment(self, text: str) -> None:
+        """Add a comment line (e.g. the resource the next lines belong to)."""
+        self.lines.append(f"# {text}")
+
+    def run_shell(self, command: str) -> Tuple[str, int]:
+        """Record a shell command."""
+        self.lines.append(command.strip())
+        return "", 0
+
+    def run_command(self, args: list, env: Optional[Dict[str, str]] = None) -> Tuple[str, int]:
+        """Record a command, with its environment as env assignments."""
+        prefix = [f"{key}={value}" for key, value in (env or {}).items()]
+        self.lines.append(shlex.join((["env"] + prefix if prefix else []) + list(args)))
+        return "", 0
+
+    def write_file(self, remote_path: str, content: bytes) -> None:
+        """Record a file write."""
+        self._write(remote_path, content, ">")
+
+    def append_file(self, remote_path: str, content: bytes) -> None:
+        """Record an append."""
+        self._write(remote_path, content, ">>")
+
+    def copy_file(self, local_path: str, remote_path: str) -> None:
+        """Embed a local file in the script."""
+        with open(local_path, "rb") as f:
+            self._write(remote_path, f.read(), ">")
+
+    def _write(self, path: str, content: bytes, redirect: str) -> None:
+        """Emit content into path: a quoted heredoc for text, base64 otherwise."""
+        target = f"{redirect} {shlex.quote(path)}"
+        try:
+            text = content.decode("utf-8")
+        except UnicodeDecodeError:
+            text = None
+
+        if text is None or not text.endswith("\n"):
+            # A heredoc always ends in a newline, so exact bytes go as base64
+            encoded = base64.encodebytes(content).decode("ascii")
+            self.lines.append(f"base64 -d {target} <<'COOK_EOF'\n{encoded}COOK_EOF")
+            return
+
+        delimiter = "COOK_EOF"
+        while delimiter in text:
+            delimiter = f"COOK_EOF_{uuid.uuid4().hex[:8]}"
+        self.lines.append(f"cat {target} <<'{delimiter}'\n{text}{delimiter}")
+
+    def read_file(self, remote_path: str) -> bytes:
+        """Nothing can be read while recording."""
+        raise FileNotFoundError(remote_path)
+
+    def file_exists(self, remote_path: str) -> bool:
+        """Nothing exists while recording."""
+        return False
+
+    def stat(self, remote_path: str) -> Optional[os.stat_result]:
+        """Nothing exists while recording."""
+        return None
+
+    def glob(self, pattern: str) -> List[str]:
+        """Nothing matches while recording."""
+        return []
+
+    def grep(self, remote_path: str, text: str) -> bool:
+        """Nothing matches while recording."""
+        return False
+
+    def close(self) -> None:
+        """Nothing to close."""
+        pass
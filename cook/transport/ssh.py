@@ -2,14 +2,416 @@
 SSH transport - run commands on remote hosts via SSH.
 """
 
+import fnmatch
+import getpass
+import io
 import os
+import posixpath
+import re
+import secrets
+import shlex
+import shutil
+import socket
+import subprocess
+import tarfile
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import lru_cache
 from pathlib import Path
-from typing import Tuple, Optional
+from typing import Dict, Iterator, List, Optional, Set, Tuple
 import paramiko
 
 from cook.transport.base import Transport
 
 
+# stat(1) format matching the os.stat_result fields we populate: GNU
+# `stat -c` and the same fields for BSD/macOS `stat -f`
+STAT_FORMAT = "%f %u %g %s %X %Y %Z"
+BSD_STAT_FORMAT = "%Xp %u %g %z %a %m %c"
+
+
+def _stat_command(path: str) -> str:
+    """
+    Shell command printing the STAT_FORMAT fields of path, or nothing if
+    path does not exist. Exits non-zero if path exists but stat failed.
+    """
+    path = shlex.quote(path)
+    return (
+        f"if [ -e {path} ] || [ -h {path} ]; then "
+        f"stat -c {shlex.quote(STAT_FORMAT)} -- {path} 2>/dev/null || "
+        f"stat -f {shlex.quote(BSD_STAT_FORMAT)} -- {path}; fi"
+    )
+
+
+def _stat_result(path: str, output: str, code: int) -> Optional[os.stat_result]:
+    """
+    Interpret the output of _stat_command(path).
+
+    Returns:
+        The stat_result, or None if path does not exist
+
+    Raises:
+        IOError: If path exists but could not be stat'ed
+    """
+    if code == 0 and not output.strip():
+        return None
+    st = _parse_stat(output) if code == 0 else None
+    if st is None:
+        raise IOError(f"Failed to stat {path}: {output.strip()}")
+    return st
+
+
+def _parse_stat(output: str) -> Optional[os.stat_result]:
+    """Build an os.stat_result from STAT_FORMAT (or BSD_STAT_FORMAT) output."""
+    try:
+        mode, uid, gid, size, atime, mtime, ctime = output.split()
+        return os.stat_result(
+            (int(mode, 16), 0, 0, 0, int(uid), int(gid),
+             int(size), int(atime), int(mtime), int(ctime))
+        )
+    except ValueError:
+        return None
+
+
+# SFTP request sizes (paramiko defaults to 32 KB). OpenSSH's sftp-server
+# drops messages over 256 KiB and has served reads of up to 64 KiB since
+# long before its read limit was raised, so these are the largest sizes
+# every server accepts in full.
+SFTP_WRITE_BLOCK_SIZE = 252 * 1024
+SFTP_READ_BLOCK_SIZE = 64 * 1024
+
+# Uploads at least this large are split across several SFTP channels
+SFTP_PARALLEL_THRESHOLD = 8 * 1024 * 1024
+SFTP_PARALLEL_STREAMS = 4
+
+# Uploads at least this large go through OpenSSH's scp when it is
+# installed: its C transfer loop is much faster than paramiko's SFTP
+SCP_THRESHOLD = 1024 * 1024
+
+# Seconds an idle OpenSSH ControlMaster (used for scp) stays up
+SSH_CONTROL_PERSIST = 60
+
+
+# Per-channel flow control window (paramiko default: 2 MiB) and maximum
+# packet size (kept at the common 32 KiB that every server accepts)
+SSH_WINDOW_SIZE = 8 * 1024 * 1024
+SSH_MAX_PACKET_SIZE = 32768
+
+# Channels (shell sessions, SFTP clients, one-off commands) a transport
+# keeps open at once; below OpenSSH's default MaxSessions of 10
+MAX_SESSIONS = 8
+
+
+@lru_cache(maxsize=512)
+def _quote_arg(arg: str) -> str:
+    """
+    shlex.quote, memoized.
+
+    Command arguments repeat heavily across a run (command names, flags,
+    the same paths and unit names), so most lookups skip the regex scan.
+    """
+    return shlex.quote(arg)
+
+
+def _default_user() -> Optional[str]:
+    """
+    Local login name: $LOGNAME/$USER, else the password database entry.
+
+    The database fallback covers cron jobs and systemd units, which often
+    run without $USER set.
+    """
+    try:
+        return getpass.getuser()
+    except Exception:
+        return None
+
+
+# Looked up once; the login name does not change while cook runs
+_DEFAULT_USER = _default_user()
+
+
+def _staging_path(suffix: str) -> str:
+    """
+    Unique /tmp path for staging a sudo write.
+
+    Random rather than derived from the target path: no hashing per file,
+    no clash between concurrent writes, and not guessable by other users.
+    """
+    return f"/tmp/cook-{secrets.token_hex(8)}{suffix}"
+
+
+def _sftp_write(sftp: "paramiko.SFTPClient", remote_path: str, content: bytes, mode: str = "wb") -> None:
+    """
+    Write content through an open SFTP session with pipelining on.
+
+    A pipelined handle sends each write request without waiting for the
+    previous acknowledgement, so large writes are not one round trip per
+    block. Errors are still raised, on close. The handle is unbuffered
+    (bufsize=0): content is sliced into requests straight from the caller's
+    bytes instead of first being copied into paramiko's write buffer.
+    """
+    with sftp.open(remote_path, mode, bufsize=0) as f:
+        f.MAX_REQUEST_SIZE = SFTP_WRITE_BLOCK_SIZE
+        f.set_pipelined(True)
+        f.write(content)
+
+
+def _sftp_put(
+    sftp: "paramiko.SFTPClient",
+    local_path: str,
+    remote_path: str,
+    start: int = 0,
+    end: Optional[int] = None,
+) -> None:
+    """
+    Upload a local file, or the byte range [start, end) of it, in
+    SFTP_WRITE_BLOCK_SIZE pipelined requests.
+
+    Replaces sftp.put(), which reads 32 KB at a time and stats the remote
+    file afterwards (an extra round trip per file). A range is written in
+    place into an existing remote file.
+    """
+    mode = "wb" if start == 0 and end is None else "r+b"
+    with open(local_path, "rb") as src, sftp.open(remote_path, mode, bufsize=0) as f:
+        f.MAX_REQUEST_SIZE = SFTP_WRITE_BLOCK_SIZE
+        f.set_pipelined(True)
+        if end is None:
+            end = os.fstat(src.fileno()).st_size
+        if start:
+            src.seek(start)
+            f.seek(start)
+        remaining = end - start
+        while remaining > 0:
+            block = src.read(min(SFTP_WRITE_BLOCK_SIZE, remaining))
+            if not block:
+                break
+            f.write(block)
+            remaining -= len(block)
+
+
+# Handshakes run here so that constructing several transports connects to
+# all of their hosts at once (see SSHTransport.__init__)
+_CONNECT_POOL = ThreadPoolExecutor(max_workers=32, thread_name_prefix="cook-ssh-connect")
+
+
+class _PooledClient:
+    """A connection shared by every open SSHTransport with the same login."""
+
+    def __init__(self, future: Future):
+        self.future = future
+        self.refs = 0
+
+    def reusable(self) -> bool:
+        """False once the handshake failed or the connection dropped."""
+        if not self.future.done():
+            return True
+        if self.future.exception() is not None:
+            return False
+        transport = self.future.result().get_transport()
+        return transport is not None and transport.is_active()
+
+
+# (host, port, user, key_file, password) -> connection in use
+_CLIENT_POOL: Dict[Tuple, _PooledClient] = {}
+_CLIENT_POOL_LOCK = threading.Lock()
+
+
+def _channel_closed(item) -> bool:
+    """True once the channel under a session or SFTP client has closed."""
+    get_channel = getattr(item, "get_channel", None)
+    return (get_channel() if get_channel else item).closed
+
+
+def _close_quietly(item) -> None:
+    try:
+        item.close()
+    except Exception:
+        pass
+
+
+class _ChannelPool:
+    """
+    Channels on one connection, shared by all threads and capped.
+
+    sshd refuses channels past its MaxSessions (10 for OpenSSH unless
+    configured), so however many threads run commands and SFTP requests,
+    at most max_sessions channels are open at once. A thread takes an idle
+    channel of the kind it needs, else opens one while under the cap, else
+    closes an idle channel of another kind, else waits for one to be
+    returned. A channel is used by one thread at a time: paramiko's
+    SFTPClient does not support concurrent requests from several threads.
+    """
+
+    def __init__(self, max_sessions: int = MAX_SESSIONS):
+        self.max_sessions = max_sessions
+        self._idle: Dict[str, list] = {}
+        self._open: list = []
+        # Open channels plus those being opened
+        self._count = 0
+        self._cond = threading.Condition()
+
+    def acquire(self, kind: str, opener):
+        """
+        Take an idle channel of this kind, or open one with opener().
+
+        Raises:
+            Whatever opener() raises (e.g. paramiko.ChannelException when
+            the server refuses the channel)
+        """
+        with self._cond:
+            while True:
+                idle = self._idle.setdefault(kind, [])
+                while idle:
+                    item = idle.pop()
+                    if not _channel_closed(item):
+                        return item
+                    self._forget(item)
+                if self._count < self.max_sessions:
+                    self._count += 1
+                    break
+                victim = next((items.pop() for items in self._idle.values() if items), None)
+                if victim is not None:
+                    self._forget(victim)
+                    _close_quietly(victim)
+                else:
+                    self._cond.wait()
+
+        try:
+            item = opener()
+        except BaseException as e:
+            with self._cond:
+                self._count -= 1
+                if isinstance(e, paramiko.ChannelException):
+                    # The server allows fewer channels than max_sessions;
+                    # stay below the number it just refused
+                    self.max_sessions = max(1, self._count)
+                self._cond.notify()
+            raise
+
+        with self._cond:
+            self._open.append(item)
+        return item
+
+    def release(self, kind: str, item) -> None:
+        """Give a channel back for reuse; closed ones free their slot."""
+        with self._cond:
+            if item in self._open:
+                if _channel_closed(item):
+                    self._forget(item)
+                else:
+                    self._idle.setdefault(kind, []).append(item)
+            self._cond.notify()
+
+    def discard(self, item) -> None:
+        """Close a channel and free its slot."""
+        with self._cond:
+            self._forget(item)
+            self._cond.notify()
+        _close_quietly(item)
+
+    def _forget(self, item) -> None:
+        # Caller holds self._cond
+        if item in self._open:
+            self._open.remove(item)
+            self._count -= 1
+
+    def close(self) -> None:
+        """Close every channel opened so far."""
+        with self._cond:
+            items, self._open, self._idle = self._open, [], {}
+            self._count = 0
+            self._cond.notify_all()
+        for item in items:
+            _close_quietly(item)
+
+
+class _ShellSessions:
+    """
+    Long-lived remote shell channels, reused across commands.
+
+    Opening a channel for every command costs a round trip before the
+    command is even sent. Session channels are taken from the channel pool
+    and fed commands on stdin; each command's exit code follows its output
+    behind a random end marker. Each command is run by the user's login
+    shell ($SHELL -c, as sshd runs a command of its own) with stdin from
+    /dev/null: it keeps the login shell's syntax and environment, and
+    cd/export/exit do not leak into the next one.
+    """
+
+    def __init__(self, channels: _ChannelPool):
+        self._channels = channels
+        self._marker = f"__COOK_END_{uuid.uuid4().hex}__"
+        self._end = re.compile(rb"\n" + self._marker.encode() + rb" (\d+)\n")
+
+    def run(self, client: "paramiko.SSHClient", command: str) -> Tuple[str, int]:
+        """
+        Run command in a pooled session, opening one if needed.
+
+        Raises:
+            paramiko.SSHException: If no session channel could be opened;
+                the command was not sent
+            RuntimeError: If the session ended after the command was sent.
+                It may have run, so it is not sent again.
+        """
+        request = (
+            f'"${{SHELL:-/bin/sh}}" -c {shlex.quote(command)} </dev/null 2>&1; '
+            f"printf '\\n{self._marker} %d\\n' $?\n"
+        ).encode()
+
+        # An idle session can die unnoticed (e.g. the server closed it);
+        # if the request cannot be written, it never reached a shell
+        for attempt in range(2):
+            channel = self._channels.acquire("shell", lambda: self._open(client))
+            try:
+                channel.sendall(request)
+                break
+            except OSError:
+                self._channels.discard(channel)
+                if attempt:
+                    raise
+
+        buffer = bytearray()
+        # Only the tail can hold a marker that was cut between two reads
+        overlap = len(self._marker) + 16
+        start = 0
+        try:
+            while True:
+                match = self._end.search(buffer, start)
+                if match:
+                    break
+                start = max(0, len(buffer) - overlap)
+                chunk = channel.recv(65536)
+                if not chunk:
+                    raise EOFError("remote shell session exited")
+                buffer += chunk
+        except (EOFError, OSError) as e:
+            self._channels.discard(channel)
+            raise RuntimeError(f"Shell session closed while running command: {command}") from e
+        except BaseException:
+            self._channels.discard(channel)
+            raise
+
+        self._channels.release("shell", channel)
+        output = bytes(buffer[: match.start()])
+        return output.decode("utf-8", errors="replace"), int(match.group(1))
+
+    @staticmethod
+    def _open(client: "paramiko.SSHClient") -> "paramiko.Channel":
+        """Open a session channel running /bin/sh on its stdin."""
+        channel = client.get_transport().open_session()
+        try:
+            channel.set_combine_stderr(True)
+            channel.exec_command("/bin/sh")
+        except BaseException:
+            _close_quietly(channel)
+            raise
+        return channel
+
+
 class SSHTransport(Transport):
     """
     SSH transport for running commands on remote hosts.
@@ -26,6 +428,10 @@ class SSHTransport(Transport):
         with transport:
             output, code = transport.run_command(["ls", "-la"])
             print(output)
+
+    The connection is made in the background: the constructor returns at
+    once, and the first operation waits for the handshake. Connection
+    errors are raised there, or earlier by wait_connected().
     """
 
     def __init__(
@@ -37,6 +443,8 @@ class SSHTransport(Transport):
         key_file: Optional[str] = None,
         timeout: int = 30,
         sudo: bool = False,
+        persistent_shell: bool = True,
+        max_sessions: int = MAX_SESSIONS,
     ):
         """
         Initialize SSH transport.
@@ -49,23 +457,72 @@ class SSHTransport(Transport):
             key_file: Path to private key file
             timeout: Connection timeout in seconds
             sudo: Use sudo for all commands (default: False)
+            persistent_shell: Run commands in long-lived remote shell
+                sessions instead of opening a channel for each one
+            max_sessions: Channels kept open at once; keep it below the
+                server's MaxSessions
         """
         self.host = host
         self.port = port
-        self.user = user or os.getenv("USER")
+        self.user = user or _DEFAULT_USER
         self.password = password
         self.key_file = key_file
+        # Expanded once; reconnects reuse the same path
+        self._key_filename = str(Path(key_file).expanduser()) if key_file else None
         self.timeout = timeout
         self.sudo = sudo
-        self.client: Optional[paramiko.SSHClient] = None
+        self.persistent_shell = persistent_shell
+        self._client: Optional[paramiko.SSHClient] = None
+        self._channels = _ChannelPool(max_sessions)
+        self._shells = _ShellSessions(self._channels)
+        # Remote directories known to exist (see _in_parent_dir)
+        self._known_dirs: Set[str] = set()
+        # False once tar -x failed here (see write_files)
+        self._tar_writes = True
+        # OpenSSH ControlMaster socket for scp; None until first needed,
+        # "" if OpenSSH is unavailable (see _openssh_master)
+        self._control_path: Optional[str] = None
+        self._control_lock = threading.Lock()
+
+        # Share a live connection to the same login, or start the
+        # handshake for a new one; the first use of self.client waits for it
+        self._pool_key = (host, port, self.user, self._key_filename, password)
+        with _CLIENT_POOL_LOCK:
+            pooled = _CLIENT_POOL.get(self._pool_key)
+            if pooled is None or not pooled.reusable():
+                pooled = _PooledClient(_CONNECT_POOL.submit(self._connect))
+                _CLIENT_POOL[self._pool_key] = pooled
+            pooled.refs += 1
+        self._pooled: Optional[_PooledClient] = pooled
+        self._connect_future: Optional[Future] = pooled.future
 
-        # Connect immediately
-        self._connect()
+    @property
+    def client(self) -> "paramiko.SSHClient":
+        """The connected SSH client, waiting for the handshake if needed."""
+        self.wait_connected()
+        return self._client
 
-    def _connect(self) -> None:
+    @client.setter
+    def client(self, client: "paramiko.SSHClient") -> None:
+        self._connect_future = None
+        self._pooled = None
+        self._client = client
+
+    def wait_connected(self) -> None:
+        """
+        Wait for the background connection.
+
+        Raises:
+            Exception: Whatever the connection attempt raised (socket
+                errors, paramiko.AuthenticationException, ...)
+        """
+        if self._connect_future is not None:
+            self._client = self._connect_future.result()
+
+    def _connect(self) -> "paramiko.SSHClient":
         """Establish SSH connection."""
-        self.client = paramiko.SSHClient()
-        self.client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        client = paramiko.SSHClient()
+        client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
 
         # Prepare authentication
         connect_kwargs = {
@@ -80,12 +537,43 @@ class SSHTransport(Transport):
             connect_kwargs["password"] = self.password
 
         # Key-based auth
-        if self.key_file:
-            key_path = Path(self.key_file).expanduser()
-            connect_kwargs["key_filename"] = str(key_path)
+        if self._key_filename:
+            connect_kwargs["key_filename"] = self._key_filename
+
+        # Connect over our own socket so it can be tuned: without Nagle,
+        # small requests (commands, SFTP stats) leave immediately instead
+        # of waiting on the previous segment's ACK
+        sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        connect_kwargs["sock"] = sock
+        client.connect(**connect_kwargs)
+
+        # All commands share this connection (one channel each); keep it
+        # alive across long plans so it isn't dropped between operations
+        transport = client.get_transport()
+        transport.set_keepalive(30)
 
-        # Connect
-        self.client.connect(**connect_kwargs)
+        # Let channels opened from here on (commands, SFTP) have more data
+        # in flight before waiting for a window adjust; this bounds
+        # throughput at roughly window / RTT
+        transport.default_window_size = SSH_WINDOW_SIZE
+        transport.default_max_packet_size = SSH_MAX_PACKET_SIZE
+        return client
+
+    @contextmanager
+    def _sftp_session(self) -> Iterator["paramiko.SFTPClient"]:
+        """
+        Borrow an SFTP client from the channel pool for a block.
+
+        Opening one starts a channel and an SFTP subsystem handshake
+        (several round trips), so clients are kept open and reused.
+        """
+        client = self.client
+        sftp = self._channels.acquire("sftp", client.open_sftp)
+        try:
+            yield sftp
+        finally:
+            self._channels.release("sftp", sftp)
 
     def run_shell(self, command: str) -> Tuple[str, int]:
         """
@@ -101,29 +589,58 @@ class SSHTransport(Transport):
         if self.sudo:
             command = f"sudo -n {command}"
 
-        stdin, stdout, stderr = self.client.exec_command(command)
+        if self.persistent_shell:
+            try:
+                return self._shells.run(self.client, command)
+            except paramiko.SSHException:
+                # No session channel could be opened, so the command was
+                # not sent; try it on a channel of its own
+                pass
 
-        # Wait for command to complete
-        exit_code = stdout.channel.recv_exit_status()
+        return self._exec(command)
 
-        # Get output
-        output = stdout.read().decode() + stderr.read().decode()
+    def _exec(self, command: str, data: Optional[bytes] = None) -> Tuple[str, int]:
+        """
+        Run a shell command on a channel of its own, with data as its stdin.
 
+        The channel counts against max_sessions while it is open.
+        """
+        client = self.client
+        channel = self._channels.acquire("exec", lambda: client.get_transport().open_session())
+        try:
+            channel.exec_command(command)
+            stdout = channel.makefile("rb")
+            stderr = channel.makefile_stderr("rb")
+            if data is not None:
+                channel.sendall(data)
+                channel.shutdown_write()
+
+            # Wait for command to complete
+            exit_code = channel.recv_exit_status()
+
+            output = stdout.read().decode() + stderr.read().decode()
+        finally:
+            self._channels.discard(channel)
         return output, exit_code
 
-    def run_command(self, args: list) -> Tuple[str, int]:
+    def run_command(self, args: list, env: Optional[Dict[str, str]] = None) -> Tuple[str, int]:
         """
         Run command from list of arguments on remote host.
 
         Args:
             args: Command and arguments as list
+            env: Extra environment variables for the command
 
         Returns:
             Tuple of (output, exit_code)
         """
+        # Most sshd configs reject client-sent environment variables, and
+        # sudo resets the environment, so pass them through env(1) instead
+        if env:
+            args = ["env"] + [f"{key}={value}" for key, value in env.items()] + list(args)
+
         # Paramiko doesn't have direct list support, so we need to escape
-        import shlex
-        command = " ".join(shlex.quote(arg) for arg in args)
+        command = " ".join(map(_quote_arg, args))
 
         # Prepend sudo if enabled
         if self.sudo:
@@ -141,44 +658,157 @@ class SSHTransport(Transport):
         """
         if self.sudo:
             # When sudo is enabled, write to temp file then move with sudo
-            import tempfile
-            import hashlib
-
-            # Generate unique temp filename
-            file_hash = hashlib.md5(remote_path.encode()).hexdigest()[:8]
-            temp_path = f"/tmp/cook-{file_hash}.tmp"
+            temp_path = _staging_path(".tmp")
 
             # Write to temp location via SFTP (no sudo needed for /tmp)
-            sftp = self.client.open_sftp()
-            try:
-                with sftp.open(temp_path, "wb") as f:
-                    f.write(content)
-            finally:
-                sftp.close()
-
-            # Create parent directory with sudo if needed
-            parent = str(Path(remote_path).parent)
-            self.run_command(["mkdir", "-p", parent])
+            with self._sftp_session() as sftp:
+                _sftp_write(sftp, temp_path, content)
 
-            # Move to final location with sudo
-            self.run_command(["mv", temp_path, remote_path])
+            # Create parent directory and move into place with sudo
+            self._install_staged(temp_path, remote_path)
         else:
             # Normal SFTP write (no sudo)
-            sftp = self.client.open_sftp()
+            def write():
+                with self._sftp_session() as sftp:
+                    _sftp_write(sftp, remote_path, content)
+
+            self._in_parent_dir(remote_path, write)
+
+    def _in_parent_dir(self, remote_path: str, write) -> None:
+        """
+        Run write() once the parent directory of remote_path exists.
+
+        Directories seen or created before are remembered, so a run writing
+        many files into a few directories stats each directory once. If one
+        was removed since, the write fails with FileNotFoundError, the cache
+        is dropped and the write retried after recreating the directory.
+        """
+        parent = posixpath.dirname(remote_path)
+        self._ensure_dir(parent)
+        try:
+            write()
+        except FileNotFoundError:
+            self._known_dirs.clear()
+            self._ensure_dir(parent)
+            write()
+
+    def _ensure_dir(self, directory: str) -> None:
+        """Create a remote directory (and parents) unless known to exist."""
+        if not directory or directory in self._known_dirs:
+            return
+        # The SFTP client goes back to the pool before mkdir takes a shell
+        with self._sftp_session() as sftp:
             try:
-                # Create parent directory if needed
-                parent = str(Path(remote_path).parent)
-                try:
-                    sftp.stat(parent)
-                except FileNotFoundError:
-                    # Create parent dirs
-                    self.run_command(["mkdir", "-p", parent])
+                sftp.stat(directory)
+                missing = False
+            except FileNotFoundError:
+                missing = True
+        if missing:
+            self.run_command(["mkdir", "-p", directory])
+
+        # Every ancestor of an existing directory exists too
+        while directory not in ("", "/", ".") and directory not in self._known_dirs:
+            self._known_dirs.add(directory)
+            directory = posixpath.dirname(directory)
+
+    def write_files(self, files: List[Tuple[str, bytes, Optional[int]]]) -> None:
+        """
+        Write several files with one tar stream over one channel.
+
+        Replaces a round trip (or several) per file with a single
+        `tar -x` on the remote host. Existing files are truncated in place,
+        so their owner and inode stay; mode is set from each entry. Files
+        without a mode get the remote umask applied, as write_file() does,
+        which takes a second stream when both kinds are written. Missing
+        parent directories are created.
+
+        The options used are GNU tar's. If the extraction fails (e.g. BSD
+        or busybox tar), the files are written one at a time instead, and
+        later calls skip tar.
 
-                # Write file
-                with sftp.open(remote_path, "wb") as f:
-                    f.write(content)
-            finally:
-                sftp.close()
+        Args:
+            files: (path, content, mode) per file; mode None for the default
+
+        Raises:
+            IOError: If a write fails
+        """
+        if len(files) < 2 or not self._tar_writes:
+            super().write_files(files)
+            return
+
+        streams = (
+            ([entry for entry in files if entry[2] is not None], "--same-permissions"),
+            ([entry for entry in files if entry[2] is None], "--no-same-permissions"),
+        )
+        for entries, permissions in streams:
+            if not entries:
+                continue
+            if not self._tar_writes:
+                super().write_files(entries)
+                continue
+
+            buffer = io.BytesIO()
+            now = time.time()
+            with tarfile.open(fileobj=buffer, mode="w", format=tarfile.GNU_FORMAT) as tar:
+                for path, content, mode in entries:
+                    info = tarfile.TarInfo(path.lstrip("/"))
+                    info.size = len(content)
+                    info.mode = 0o666 if mode is None else mode
+                    info.mtime = now
+                    tar.addfile(info, io.BytesIO(content))
+
+            command = f"tar -x -f - -C / --overwrite --no-same-owner {permissions}"
+            if self.sudo:
+                command = f"sudo -n {command}"
+
+            output, code = self._exec(command, buffer.getvalue())
+            if code != 0:
+                self._tar_writes = False
+                super().write_files(entries)
+
+    def _install_staged(self, temp_path: str, remote_path: str) -> None:
+        """
+        Move a staged /tmp file to its destination with one remote command.
+
+        mkdir -p of the parent and the mv share a single channel; the staged
+        file is removed even if the move fails.
+
+        Raises:
+            IOError: If the directory cannot be created or the move fails
+        """
+        parent = str(Path(remote_path).parent)
+        # Paths are passed as positional args, never interpolated into the script
+        output, code = self.run_command([
+            "sh", "-c", 'mkdir -p -- "$1" && mv -- "$0" "$2"; rc=$?; rm -f -- "$0"; exit $rc',
+            temp_path, parent, remote_path,
+        ])
+        if code != 0:
+            raise IOError(f"Failed to write {remote_path}: {output}")
+
+    def append_file(self, remote_path: str, content: bytes) -> None:
+        """
+        Append content to file on remote host.
+
+        Args:
+            remote_path: Path to file on remote host
+            content: Content to append as bytes
+        """
+        if self.sudo:
+            # When sudo is enabled, stage in /tmp then append with sudo
+            temp_path = _staging_path(".append")
+
+            with self._sftp_session() as sftp:
+                _sftp_write(sftp, temp_path, content)
+
+            # Paths are passed as positional args, never interpolated into the script
+            output, code = self.run_command(
+                ["sh", "-c", 'cat "$0" >> "$1"; rc=$?; rm -f "$0"; exit $rc', temp_path, remote_path]
+            )
+            if code != 0:
+                raise IOError(f"Failed to append to {remote_path}: {output}")
+        else:
+            with self._sftp_session() as sftp:
+                _sftp_write(sftp, remote_path, content, mode="ab")
 
     def read_file(self, remote_path: str) -> bytes:
         """
@@ -190,12 +820,29 @@ class SSHTransport(Transport):
         Returns:
             File content as bytes
         """
-        sftp = self.client.open_sftp()
-        try:
-            with sftp.open(remote_path, "rb") as f:
-                return f.read()
-        finally:
-            sftp.close()
+        with self._sftp_session() as sftp, sftp.open(remote_path, "rb") as f:
+            # Queue reads for the whole file up front instead of one
+            # round trip per block
+            f.MAX_REQUEST_SIZE = SFTP_READ_BLOCK_SIZE
+            f.prefetch()
+            return f.read()
+
+    def read_file_stream(self, remote_path: str, chunk_size: int = 1 << 20) -> Iterator[bytes]:
+        """
+        Read a remote file in chunks of up to chunk_size bytes.
+
+        Reads are prefetched as in read_file(), but only one chunk is held
+        at a time instead of the whole file. The SFTP client stays checked
+        out until the generator is exhausted or closed.
+        """
+        with self._sftp_session() as sftp, sftp.open(remote_path, "rb") as f:
+            f.MAX_REQUEST_SIZE = SFTP_READ_BLOCK_SIZE
+            f.prefetch()
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    return
+                yield chunk
 
     def file_exists(self, remote_path: str) -> bool:
         """
@@ -213,15 +860,94 @@ class SSHTransport(Transport):
             return code == 0
         else:
             # Normal SFTP check (no sudo)
-            sftp = self.client.open_sftp()
+            with self._sftp_session() as sftp:
+                try:
+                    sftp.stat(remote_path)
+                    return True
+                except Exception:
+                    # Catch all exceptions, not just FileNotFoundError
+                    return False
+
+    def stat(self, remote_path: str) -> Optional[os.stat_result]:
+        """
+        Get file status on remote host.
+
+        Args:
+            remote_path: Path to file on remote host
+
+        Returns:
+            stat_result-like object, or None if file doesn't exist
+
+        Raises:
+            IOError: If the file exists but could not be stat'ed
+        """
+        if self.sudo:
+            # When sudo is enabled, use stat command which respects sudo
+            output, code = self.run_command(["sh", "-c", _stat_command(remote_path)])
+            return _stat_result(remote_path, output, code)
+        else:
+            with self._sftp_session() as sftp:
+                try:
+                    return sftp.stat(remote_path)
+                except FileNotFoundError:
+                    return None
+
+    def stat_many(self, remote_paths: List[str]) -> List[Optional[os.stat_result]]:
+        """
+        Get status for several remote paths in one round trip.
+
+        Args:
+            remote_paths: Paths on remote host
+
+        Returns:
+            One stat_result (or None if missing) per path, in order
+
+        Raises:
+            IOError: If a path exists but could not be stat'ed
+        """
+        results = self.run_pipeline([_stat_command(path) for path in remote_paths])
+        return [
+            _stat_result(path, output, code)
+            for path, (output, code) in zip(remote_paths, results)
+        ]
+
+    def glob(self, pattern: str) -> List[str]:
+        """
+        List remote paths matching a wildcard pattern (one SFTP listdir).
+
+        Args:
+            pattern: Pattern with wildcards in the final path component
+
+        Returns:
+            Sorted list of matching paths
+        """
+        directory, name_pattern = posixpath.split(pattern)
+        with self._sftp_session() as sftp:
             try:
-                sftp.stat(remote_path)
-                return True
-            except Exception:
-                # Catch all exceptions, not just FileNotFoundError
-                return False
-            finally:
-                sftp.close()
+                names = sftp.listdir(directory or ".")
+            except (FileNotFoundError, PermissionError):
+                return []
+
+        return sorted(
+            posixpath.join(directory, name)
+            for name in fnmatch.filter(names, name_pattern)
+        )
+
+    def grep(self, remote_path: str, text: str) -> bool:
+        """
+        Check whether any line of a remote file contains text.
+
+        Runs grep on the remote host so the file itself is never transferred.
+
+        Args:
+            remote_path: Path to remote file
+            text: Fixed string to look for
+
+        Returns:
+            True if found, False otherwise
+        """
+        output, code = self.run_command(["grep", "-qF", "--", text, remote_path])
+        return code == 0
 
     def copy_file(self, local_path: str, remote_path: str) -> None:
         """
@@ -233,42 +959,159 @@ class SSHTransport(Transport):
         """
         if self.sudo:
             # When sudo is enabled, copy to temp location then move with sudo
-            import hashlib
-
-            # Generate unique temp filename
-            file_hash = hashlib.md5(remote_path.encode()).hexdigest()[:8]
-            temp_path = f"/tmp/cook-{file_hash}.tmp"
+            temp_path = _staging_path(".tmp")
 
             # Copy to temp location via SFTP (no sudo needed for /tmp)
-            sftp = self.client.open_sftp()
-            try:
-                sftp.put(local_path, temp_path)
-            finally:
-                sftp.close()
+            self._upload(local_path, temp_path)
 
-            # Create parent directory with sudo if needed
-            parent = str(Path(remote_path).parent)
-            self.run_command(["mkdir", "-p", parent])
-
-            # Move to final location with sudo
-            self.run_command(["mv", temp_path, remote_path])
+            # Create parent directory and move into place with sudo
+            self._install_staged(temp_path, remote_path)
         else:
             # Normal SFTP copy (no sudo)
-            sftp = self.client.open_sftp()
-            try:
-                # Create parent directory if needed
-                parent = str(Path(remote_path).parent)
-                try:
-                    sftp.stat(parent)
-                except FileNotFoundError:
-                    self.run_command(["mkdir", "-p", parent])
+            self._in_parent_dir(remote_path, lambda: self._upload(local_path, remote_path))
+
+    def _upload(self, local_path: str, remote_path: str) -> None:
+        """
+        Upload a file; large files are split across parallel SFTP channels.
+
+        One channel is capped at window / RTT. Past SFTP_PARALLEL_THRESHOLD,
+        up to SFTP_PARALLEL_STREAMS channels (as many as the channel pool
+        allows) each write one contiguous range, which multiplies the data
+        in flight. If any range fails, the file is sent again over a single
+        channel.
+        """
+        size = os.path.getsize(local_path)
+        if size >= SCP_THRESHOLD and self._scp(local_path, remote_path):
+            return
+        if size < SFTP_PARALLEL_THRESHOLD:
+            with self._sftp_session() as sftp:
+                _sftp_put(sftp, local_path, remote_path)
+            return
+
+        # Block-aligned ranges, one per stream
+        step = -(-size // SFTP_PARALLEL_STREAMS // SFTP_WRITE_BLOCK_SIZE) * SFTP_WRITE_BLOCK_SIZE
+        ranges = [(start, min(start + step, size)) for start in range(0, size, step)]
+
+        try:
+            # Create/truncate once; every range then writes in place
+            with self._sftp_session() as sftp, sftp.open(remote_path, "wb"):
+                pass
+            with ThreadPoolExecutor(max_workers=len(ranges)) as pool:
+                list(pool.map(lambda r: self._upload_range(local_path, remote_path, *r), ranges))
+        except (IOError, paramiko.SSHException):
+            with self._sftp_session() as sftp:
+                _sftp_put(sftp, local_path, remote_path)
+
+    def _upload_range(self, local_path: str, remote_path: str, start: int, end: int) -> None:
+        """Write one byte range of a parallel upload on a pooled SFTP channel."""
+        with self._sftp_session() as sftp:
+            _sftp_put(sftp, local_path, remote_path, start, end)
+
+    def _scp(self, local_path: str, remote_path: str) -> bool:
+        """
+        Upload a file with OpenSSH scp over the ControlMaster connection.
+
+        Returns:
+            False if scp is unavailable or failed; the caller then uses SFTP
+        """
+        # Legacy scp hands the remote path to a shell; keep to plain paths
+        if shlex.quote(remote_path) != remote_path:
+            return False
+        control_path = self._openssh_master()
+        if not control_path:
+            return False
+
+        result = subprocess.run(
+            [
+                "scp", "-q", "-o", "BatchMode=yes", "-o", f"ControlPath={control_path}",
+                "-P", str(self.port), local_path, f"{self._destination()}:{remote_path}",
+            ],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        return result.returncode == 0
+
+    def _openssh_master(self) -> str:
+        """
+        Start (once) an OpenSSH ControlMaster for this host.
+
+        Only key or agent authentication can be used, as OpenSSH runs
+        without a terminal to prompt on. Host keys are checked against the
+        user's known_hosts as usual; an unknown host makes the master fail
+        and uploads stay on SFTP. The master exits on its own
+        SSH_CONTROL_PERSIST seconds after its last use, so it does not
+        outlive a transport that is never closed.
+
+        Returns:
+            The control socket path, or "" if OpenSSH is not usable here
+        """
+        with self._control_lock:
+            if self._control_path is not None:
+                return self._control_path
+
+            self._control_path = ""
+            if self.password or not (shutil.which("ssh") and shutil.which("scp")):
+                return ""
+
+            control_path = os.path.join(tempfile.mkdtemp(prefix="cook-ssh-"), "control")
+            command = [
+                "ssh", "-M", "-S", control_path, "-f", "-N",
+                "-o", f"ControlPersist={SSH_CONTROL_PERSIST}",
+                "-o", "BatchMode=yes",
+                "-o", f"ConnectTimeout={self.timeout}",
+                "-p", str(self.port),
+            ]
+            if self._key_filename:
+                command += ["-i", self._key_filename]
+            command.append(self._destination())
+
+            # -f: ssh returns once authenticated and keeps the master in the
+            # background; its output must not hold our pipes open
+            result = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            if result.returncode == 0:
+                self._control_path = control_path
+            else:
+                shutil.rmtree(os.path.dirname(control_path), ignore_errors=True)
+            return self._control_path
 
-                # Copy file
-                sftp.put(local_path, remote_path)
-            finally:
-                sftp.close()
+    def _destination(self) -> str:
+        """OpenSSH destination: user@host, or host if no user is known."""
+        return f"{self.user}@{self.host}" if self.user else self.host
+
+    def _close_openssh_master(self) -> None:
+        """Stop the ControlMaster, if one was started."""
+        control_path, self._control_path = self._control_path, None
+        if not control_path:
+            return
+        subprocess.run(
+            ["ssh", "-S", control_path, "-O", "exit", self.host],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        shutil.rmtree(os.path.dirname(control_path), ignore_errors=True)
 
     def close(self) -> None:
-        """Close SSH connection."""
-        if self.client:
-            self.client.close()
+        """
+        Close shell and SFTP sessions and release the SSH connection.
+
+        The connection itself is closed when the last transport sharing it
+        is closed.
+        """
+        self._channels.close()
+        self._close_openssh_master()
+
+        pooled, self._pooled = self._pooled, None
+        if pooled is None:
+            if self._connect_future is None and self._client:
+                self._client.close()
+            return
+
+        with _CLIENT_POOL_LOCK:
+            pooled.refs -= 1
+            if pooled.refs > 0:
+                return
+            if _CLIENT_POOL.get(self._pool_key) is pooled:
+                del _CLIENT_POOL[self._pool_key]
+        # A failed handshake leaves nothing to close
+        if pooled.future.exception() is None:
+            pooled.future.result().close()
@@ -29,56 +29,77 @@ Environment Variables:
 """
 
 from cook import File, Package, Service, Exec, Repository
+from cook.core.executor import get_executor
+import hashlib
 import os
 
 # Get the directory containing this script
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 FILES_DIR = os.path.join(SCRIPT_DIR, "files")
+SERVER_JS = os.path.join(FILES_DIR, "server.js")
+PACKAGE_JSON = os.path.join(FILES_DIR, "package.json")
+SERVICE_UNIT = os.path.join(FILES_DIR, "minimidia.service")
+NGINX_TEMPLATE = os.path.join(FILES_DIR, "nginx.conf.j2")
 
 # Configuration
 DOMAIN = os.getenv("DOMAIN", "minimidia.com")
 APP_DIR = "/opt/apps/minimidia"
 APP_PORT = int(os.getenv("APP_PORT", "3000"))
 ADMIN_EMAIL = os.getenv("ADMIN_EMAIL", "admin@minimidia.com")
+CERT_PATH = f"/etc/letsencrypt/live/{DOMAIN}/fullchain.pem"
 NODE_MAJOR = "20"  # Node.js major version
 
-print("=" * 75)
-print("    Minimidia SaaS Infrastructure Deployment")
-print("=" * 75)
-print(f"  Domain:       {DOMAIN}")
-print(f"  App Dir:      {APP_DIR}")
-print(f"  App Port:     {APP_PORT}")
-print(f"  Admin Email:  {ADMIN_EMAIL}")
-print(f"  Node Version: {NODE_MAJOR}.x")
-print()
+# node_modules built from this package.json on this Node.js major version;
+# native modules (better-sqlite3) tie it to the Node.js ABI
+with open(PACKAGE_JSON, "rb") as f:
+    NPM_HASH = hashlib.sha256(f.read() + NODE_MAJOR.encode()).hexdigest()[:16]
+NPM_CACHE_DIR = "/var/cache/cook/npm"
+NPM_CACHE = f"{NPM_CACHE_DIR}/{NPM_HASH}.tar.gz"
+
+print("\n".join([
+    "=" * 75,
+    "    Minimidia SaaS Infrastructure Deployment",
+    "=" * 75,
+    f"  Domain:       {DOMAIN}",
+    f"  App Dir:      {APP_DIR}",
+    f"  App Port:     {APP_PORT}",
+    f"  Admin Email:  {ADMIN_EMAIL}",
+    f"  Node Version: {NODE_MAJOR}.x",
+    "",
+]))
+
+
+def _output(transport, args):
+    """Output of a command on the target, or "" if it fails or is missing."""
+    try:
+        output, code = transport.run_command(args)
+    except OSError:
+        return ""
+    return output if code == 0 else ""
+
+
+def _ufw_allows(rule):
+    """Guard: true when ufw already allows rule, or ufw is not installed."""
+    def check(transport):
+        output = _output(transport, ["ufw", "status"])
+        return not output or any(
+            line.startswith(rule) and "ALLOW" in line for line in output.splitlines()
+        )
+    return check
+
 
 # Phase 1: System Updates & Repository Setup
 print("Phase 1: System Updates & Repository Setup")
 
-Repository("apt-update", action="update")
-Repository("apt-upgrade", action="upgrade")
-
-# Install Node.js v20.x from NodeSource
-# This will upgrade from any older version
-Exec(
-    "install-nodejs-20",
-    command=f"""
-# Remove old versions and clean up
-apt-get remove -y nodejs npm || true
-apt-get autoremove -y
-rm -rf /usr/lib/node_modules /usr/local/lib/node_modules ~/.npm
-
-# Install Node.js 20.x from NodeSource
-curl -fsSL https://deb.nodesource.com/setup_{NODE_MAJOR}.x | bash -
-apt-get install -y nodejs
-
-# Verify installation
-node --version
-npm --version
-""",
-    unless=f"node --version 2>/dev/null | grep -q '^v{NODE_MAJOR}\\.' && npm --version 2>/dev/null",
-    safe_mode=False,
-    security_level="none"
+# Node.js comes from the NodeSource apt repository, declared like the Docker
+# one below rather than by piping their setup script into bash (which ran its
+# own apt-get update on top of ours)
+Repository(
+    "nodesource",
+    action="add",
+    repo=f"deb https://deb.nodesource.com/node_{NODE_MAJOR}.x nodistro main",
+    key_url="https://deb.nodesource.com/gpgkey/nodesource-repo.gpg.key",
+    filename="nodesource.list"
 )
 
 Repository(
@@ -89,11 +110,31 @@ Repository(
     filename="docker.list"
 )
 
+# One cache refresh, after every repository is registered; skipped when
+# the cache is less than an hour old
 Repository("apt-update-after-repos", action="update")
+Repository("apt-upgrade", action="upgrade")
 
 # Phase 2: Core Package Installation
 print("Phase 2: Core Package Installation")
 
+# Package("nodejs") only checks that some nodejs is installed, so a distro
+# build of another major version would stay. Remove it (and the distro npm,
+# which conflicts with the npm bundled in NodeSource's nodejs) first.
+Exec(
+    "remove-distro-nodejs",
+    command="""apt-get remove -y nodejs npm && apt-get autoremove -y &&
+rm -rf /usr/lib/node_modules /usr/local/lib/node_modules""",
+    only_if=f"dpkg -s nodejs >/dev/null 2>&1 && ! node --version 2>/dev/null | grep -q '^v{NODE_MAJOR}\\.'",
+    safe_mode=False,
+    security_level="none"
+)
+
+# Keep these together: neighbouring Package resources are installed with one
+# apt-get call, so dependencies are resolved and dpkg triggers run only once
+
+# NodeSource's build, which bundles npm
+Package("nodejs")
 Package("nginx")
 Package("certbot", packages=["certbot", "python3-certbot-nginx"])
 Package("docker", packages=[
@@ -131,9 +172,9 @@ File("/var/www/html", ensure="directory", mode=0o755, owner="www-data", group="w
 print("Phase 4: Node.js Application Setup")
 
 # Read server.js from external file
-File(
+server_js = File(
     f"{APP_DIR}/server.js",
-    source=os.path.join(FILES_DIR, "server.js"),
+    source=SERVER_JS,
     mode=0o644,
     owner="root",
     group="root"
@@ -141,13 +182,13 @@ File(
 
 File(
     f"{APP_DIR}/package.json",
-    source=os.path.join(FILES_DIR, "package.json"),
+    source=PACKAGE_JSON,
     mode=0o644,
     owner="root",
     group="root"
 )
 
-File(
+app_env = File(
     f"{APP_DIR}/.env",
     content=f"""NODE_ENV=production
 PORT={APP_PORT}
@@ -178,10 +219,20 @@ Exec(
     security_level="none"
 )
 
+# Unpack node_modules from the cache when this dependency set was installed
+# before (by an earlier apply or a host sharing /var/cache/cook); otherwise
+# npm install and store the result. The marker file names the hash, so a
+# changed package.json installs again.
 Exec(
     "npm-install",
-    command=f"cd {APP_DIR} && npm install --production --no-audit --no-fund",
-    unless=f"test -d {APP_DIR}/node_modules && node --version | grep -q '^v{NODE_MAJOR}\\.'",
+    command=f"""cd {APP_DIR} && if [ -f {NPM_CACHE} ]; then
+    rm -rf node_modules && tar -xzf {NPM_CACHE}
+else
+    npm install --production --no-audit --no-fund &&
+    mkdir -p {NPM_CACHE_DIR} &&
+    tar -czf {NPM_CACHE}.tmp node_modules && mv {NPM_CACHE}.tmp {NPM_CACHE}
+fi && touch node_modules/.cook-{NPM_HASH}""",
+    creates=f"{APP_DIR}/node_modules/.cook-{NPM_HASH}",
     environment={"NODE_ENV": "production"},
     safe_mode=False,
     security_level="none"
@@ -192,15 +243,17 @@ print("Phase 5: Systemd Service Configuration")
 
 minimidia_service = File(
     "/etc/systemd/system/minimidia.service",
-    source=os.path.join(FILES_DIR, "minimidia.service"),
+    source=SERVICE_UNIT,
     mode=0o644,
     owner="root",
     group="root"
 )
 
-Exec("systemd-reload", command="systemctl daemon-reload")
-
-Service("minimidia", running=True, enabled=True)
+# A changed unit file queues one daemon-reload on its own (cook does this for
+# files under /etc/systemd/system), and the service is restarted only when
+# the unit or the code it runs actually changed
+Service("minimidia", running=True, enabled=True,
+        restart_on=[minimidia_service, server_js, app_env])
 
 # Phase 6: Nginx Configuration
 print("Phase 6: Nginx Reverse Proxy Configuration")
@@ -208,7 +261,7 @@ print("Phase 6: Nginx Reverse Proxy Configuration")
 # Create initial HTTP-only nginx config for certbot verification
 nginx_conf = File(
     f"/etc/nginx/sites-available/{DOMAIN}",
-    template=os.path.join(FILES_DIR, "nginx.conf.j2"),
+    template=NGINX_TEMPLATE,
     vars={
         "domain": DOMAIN,
         "app_port": APP_PORT,
@@ -220,39 +273,46 @@ nginx_conf = File(
     group="root"
 )
 
-Exec(
-    "enable-nginx-site",
-    command=f"ln -sf /etc/nginx/sites-available/{DOMAIN} /etc/nginx/sites-enabled/{DOMAIN}",
-    creates=f"/etc/nginx/sites-enabled/{DOMAIN}"
+nginx_site = File(
+    f"/etc/nginx/sites-enabled/{DOMAIN}",
+    ensure="link",
+    target=f"/etc/nginx/sites-available/{DOMAIN}"
 )
 
-Exec("remove-default-nginx-site", command="rm -f /etc/nginx/sites-enabled/default", only_if="test -f /etc/nginx/sites-enabled/default")
+nginx_default_site = File("/etc/nginx/sites-enabled/default", ensure="absent")
 
 # Test nginx config and start/reload nginx
-Service("nginx", running=True, enabled=True, reload_on=[nginx_conf])
+Service("nginx", running=True, enabled=True, reload_on=[nginx_conf, nginx_site, nginx_default_site])
 
 # Phase 7: Let's Encrypt TLS Certificate
-print("Phase 7: Let's Encrypt TLS Certificate Setup")
-print("NOTE: Certbot requires DNS to be properly configured.")
-print("      In test environments without real DNS, certbot will fail (expected).")
-print("      The application will still work with HTTP-only configuration.")
-
-# Obtain SSL certificate (will fail without proper DNS)
+print("\n".join([
+    "Phase 7: Let's Encrypt TLS Certificate Setup",
+    "NOTE: Certbot requires DNS to be properly configured.",
+    "      In test environments without real DNS, certbot will fail (expected).",
+    "      The application will still work with HTTP-only configuration.",
+]))
+
+# Obtain SSL certificate (will fail without proper DNS). The webroot
+# authenticator writes the challenge into /var/www/html, which the HTTP-only
+# site already serves, so nginx is not reloaded by certbot; the only reload
+# is the one for the HTTPS config on the next apply
 Exec(
     "certbot-obtain-certificate",
-    command=f"certbot certonly --nginx -d {DOMAIN} --non-interactive --agree-tos --email {ADMIN_EMAIL} --cert-name {DOMAIN}",
-    creates=f"/etc/letsencrypt/live/{DOMAIN}/fullchain.pem",
+    command=f"certbot certonly --webroot -w /var/www/html -d {DOMAIN} --non-interactive --agree-tos --email {ADMIN_EMAIL} --cert-name {DOMAIN}",
+    creates=CERT_PATH,
     safe_mode=False,
     security_level="none"
 )
 
 # Only update to HTTPS config if certificate exists
-# This is conditional - won't replace HTTP config if certbot failed
-if os.path.exists(f"/etc/letsencrypt/live/{DOMAIN}/fullchain.pem"):
+# This is conditional - won't replace HTTP config if certbot failed.
+# Asked through the executor's transport so the target host is checked,
+# not the machine loading this file (they differ with --host).
+if get_executor().transport.file_exists(CERT_PATH):
     print(f"  SSL certificates found - enabling HTTPS for {DOMAIN}")
     File(
         f"/etc/nginx/sites-available/{DOMAIN}",
-        template=os.path.join(FILES_DIR, "nginx.conf.j2"),
+        template=NGINX_TEMPLATE,
         vars={
             "domain": DOMAIN,
             "app_port": APP_PORT,
@@ -272,16 +332,19 @@ print("Phase 8: Docker Configuration")
 
 Service("docker", running=True, enabled=True)
 
-Exec("docker-group-www-data", command="usermod -aG docker www-data", unless="groups www-data | grep -q docker")
+Exec("docker-group-www-data", command="usermod -aG docker www-data",
+     unless_fn=lambda t: "docker" in _output(t, ["id", "-nG", "www-data"]).split())
 
-Exec("docker-buildx-setup", command="docker buildx create --use --name minimidia-builder 2>/dev/null || true", unless="docker buildx ls | grep -q minimidia-builder", safe_mode=False, security_level="none")
+Exec("docker-buildx-setup", command="docker buildx create --use --name minimidia-builder 2>/dev/null || true",
+     unless_fn=lambda t: "minimidia-builder" in _output(t, ["docker", "buildx", "ls"]),
+     safe_mode=False, security_level="none")
 
 # Phase 9: Security & System Hardening
 print("Phase 9: Security & System Hardening")
 
-Exec("ufw-allow-ssh", command="ufw allow 22/tcp", unless="ufw status | grep -q '22/tcp.*ALLOW' || ! command -v ufw", safe_mode=False, security_level="none")
-Exec("ufw-allow-http", command="ufw allow 80/tcp", unless="ufw status | grep -q '80/tcp.*ALLOW' || ! command -v ufw", safe_mode=False, security_level="none")
-Exec("ufw-allow-https", command="ufw allow 443/tcp", unless="ufw status | grep -q '443/tcp.*ALLOW' || ! command -v ufw", safe_mode=False, security_level="none")
+Exec("ufw-allow-ssh", command="ufw allow 22/tcp", unless_fn=_ufw_allows("22/tcp"))
+Exec("ufw-allow-http", command="ufw allow 80/tcp", unless_fn=_ufw_allows("80/tcp"))
+Exec("ufw-allow-https", command="ufw allow 443/tcp", unless_fn=_ufw_allows("443/tcp"))
 Exec("chown-app-data", command=f"chown -R www-data:www-data {APP_DIR}/data {APP_DIR}/logs", unless=f"test -O {APP_DIR}/data")
 
 # Phase 10: Monitoring & Maintenance
@@ -308,22 +371,24 @@ File(
 
 Exec("certbot-renewal-cron", command="systemctl enable certbot.timer && systemctl start certbot.timer", unless="systemctl is-enabled certbot.timer 2>/dev/null", safe_mode=False, security_level="none")
 
-# Deployment Summary
-print()
-print("=" * 75)
-print("                    Deployment Complete!")
-print("=" * 75)
-print()
-print(f"Application: https://{DOMAIN}")
-print(f"Health:      https://{DOMAIN}/health")
-print()
-print(f"Services:")
-print(f"  systemctl status minimidia")
-print(f"  systemctl status nginx")
-print(f"  systemctl status docker")
-print()
-print(f"Logs:")
-print(f"  journalctl -u minimidia -f")
-print(f"  tail -f /var/log/nginx/{DOMAIN}-access.log")
-print()
-print("=" * 75)
+# Deployment Summary (one write)
+print("\n".join([
+    "",
+    "=" * 75,
+    "                    Deployment Complete!",
+    "=" * 75,
+    "",
+    f"Application: https://{DOMAIN}",
+    f"Health:      https://{DOMAIN}/health",
+    "",
+    "Services:",
+    "  systemctl status minimidia",
+    "  systemctl status nginx",
+    "  systemctl status docker",
+    "",
+    "Logs:",
+    "  journalctl -u minimidia -f",
+    f"  tail -f /var/log/nginx/{DOMAIN}-access.log",
+    "",
+    "=" * 75,
+]))
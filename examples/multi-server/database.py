@@ -31,19 +31,32 @@ Package("postgresql", packages=[
 
 # Database Setup
 
-# Create database
-Exec("create-database",
-     command=f"sudo -u postgres psql -c \"CREATE DATABASE {DB_NAME};\"",
-     unless=f"sudo -u postgres psql -lqt | cut -d \\| -f 1 | grep -qw {DB_NAME}")
+# Database, user and grant in one psql session. \gexec runs each CREATE only
+# when its SELECT finds the object missing, so the script is safe to re-run.
+BOOTSTRAP_SQL = f"""
+SELECT 'CREATE DATABASE {DB_NAME}' WHERE NOT EXISTS (SELECT FROM pg_database WHERE datname = '{DB_NAME}')\\gexec
+SELECT 'CREATE USER {DB_USER} WITH PASSWORD ''{DB_PASSWORD}''' WHERE NOT EXISTS (SELECT FROM pg_roles WHERE rolname = '{DB_USER}')\\gexec
+GRANT ALL PRIVILEGES ON DATABASE {DB_NAME} TO {DB_USER};
+"""
+
+
+def database_ready(transport):
+    """Database and user exist and the grant is in place (one query)."""
+    try:
+        output, code = transport.run_command([
+            "sudo", "-u", "postgres", "psql", "-tAc",
+            f"SELECT has_database_privilege('{DB_USER}', '{DB_NAME}', 'CREATE, CONNECT, TEMPORARY')",
+        ])
+    except OSError:
+        return False
+    return code == 0 and output.strip() == "t"
 
-# Create user
-Exec("create-user",
-     command=f"""sudo -u postgres psql -c "CREATE USER {DB_USER} WITH PASSWORD '{DB_PASSWORD}';" """,
-     unless=f"sudo -u postgres psql -c \"\\du\" | grep -q {DB_USER}")
 
-# Grant privileges
-Exec("grant-privileges",
-     command=f"""sudo -u postgres psql -c "GRANT ALL PRIVILEGES ON DATABASE {DB_NAME} TO {DB_USER};" """)
+Exec("bootstrap-database",
+     command=f"sudo -u postgres psql -v ON_ERROR_STOP=1 <<'SQL'\n{BOOTSTRAP_SQL}SQL",
+     unless_fn=database_ready,
+     safe_mode=False,
+     security_level="none")
 
 # PostgreSQL Configuration
 
@@ -129,9 +142,10 @@ File(
     "/usr/local/bin/db-health-check",
     content=f"""#!/bin/bash
 # Database health check script
+# pg_isready only exchanges the startup packet: no login, query or backend
+# process, so frequent probes stay cheap and out of pg_stat_activity
 
-psql -U {DB_USER} -d {DB_NAME} -c "SELECT 1;" > /dev/null 2>&1
-if [ $? -eq 0 ]; then
+if pg_isready -h 127.0.0.1 -p 5432 -U {DB_USER} -d {DB_NAME} -q; then
     echo "OK: Database is healthy"
     exit 0
 else
@@ -84,10 +84,11 @@ pm.max_spare_servers = 3
 
 print("\nStep 5: Installing WordPress")
 
-# Download WordPress
+# Download WordPress (with --apply-workers, overlaps the config writes above)
 Exec("download-wordpress",
      command="wget -O /tmp/wordpress.zip https://wordpress.org/latest.zip",
-     creates="/tmp/wordpress.zip")
+     creates="/tmp/wordpress.zip",
+     paths=["/tmp/wordpress.zip"])
 
 # Extract WordPress
 Exec("extract-wordpress",
@@ -199,8 +200,9 @@ print("\nStep 7: Starting services")
 # Start and enable MySQL
 Service("mysql", running=True, enabled=True)
 
-# Start and enable PHP-FPM
-Service("php8.1-fpm", running=True, enabled=True)
+# Start and enable PHP-FPM; nginx below only starts once its socket exists
+Service("php8.1-fpm", running=True, enabled=True,
+        wait_for=["/run/php/php8.1-fpm.sock"])
 
 # Start and enable nginx (reload when config changes)
 Service("nginx",
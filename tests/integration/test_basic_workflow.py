@@ -5,7 +5,6 @@ Tests the full plan/apply cycle with real resources.
 """
 
 import os
-import tempfile
 import pytest
 from pathlib import Path
 
@@ -22,108 +21,81 @@ class TestBasicWorkflow:
         """Reset executor before each test."""
         reset_executor()
 
-    def test_file_create_workflow(self):
+    def test_file_create_workflow(self, tmp_path):
         """Test creating a file through plan/apply."""
         executor = Executor()
+        test_file = str(tmp_path / "test.txt")
 
-        # Create temp file path
-        with tempfile.NamedTemporaryFile(delete=False) as f:
-            test_file = f.name
-        os.unlink(test_file)  # Delete so we can test creation
-
-        try:
-            # Add file resource
-            file_resource = File(test_file, content="test content\n", mode=0o644)
-            executor.add(file_resource)
-
-            # Plan
-            plan_result = executor.plan()
-            assert plan_result.has_changes
-            assert plan_result.change_count == 1
-
-            # Apply
-            apply_result = executor.apply(plan_result)
-            assert apply_result.success
-            assert len(apply_result.changed_resources) == 1
-
-            # Verify file exists
-            assert os.path.exists(test_file)
-            with open(test_file) as f:
-                assert f.read() == "test content\n"
-
-            # Test idempotency
-            reset_executor()
-            executor = Executor()
-            executor.add(File(test_file, content="test content\n", mode=0o644))
-
-            plan_result = executor.plan()
-            assert not plan_result.has_changes
-
-        finally:
-            # Cleanup
-            if os.path.exists(test_file):
-                os.unlink(test_file)
-
-    def test_directory_create_workflow(self):
-        """Test creating a directory through plan/apply."""
+        # Add file resource
+        file_resource = File(test_file, content="test content\n", mode=0o644)
+        executor.add(file_resource)
+
+        # Plan
+        plan_result = executor.plan()
+        assert plan_result.has_changes
+        assert plan_result.change_count == 1
+
+        # Apply
+        apply_result = executor.apply(plan_result)
+        assert apply_result.success
+        assert len(apply_result.changed_resources) == 1
+
+        # Verify file exists
+        assert os.path.exists(test_file)
+        with open(test_file) as f:
+            assert f.read() == "test content\n"
+
+        # Test idempotency
+        reset_executor()
         executor = Executor()
+        executor.add(File(test_file, content="test content\n", mode=0o644))
 
-        # Create temp directory path
-        test_dir = tempfile.mkdtemp()
-        os.rmdir(test_dir)  # Delete so we can test creation
+        plan_result = executor.plan()
+        assert not plan_result.has_changes
 
-        try:
-            # Add directory resource
-            dir_resource = File(test_dir, ensure="directory", mode=0o755)
-            executor.add(dir_resource)
+    def test_directory_create_workflow(self, tmp_path):
+        """Test creating a directory through plan/apply."""
+        executor = Executor()
+        test_dir = str(tmp_path / "created")
 
-            # Plan
-            plan_result = executor.plan()
-            assert plan_result.has_changes
+        # Add directory resource
+        dir_resource = File(test_dir, ensure="directory", mode=0o755)
+        executor.add(dir_resource)
 
-            # Apply
-            apply_result = executor.apply(plan_result)
-            assert apply_result.success
+        # Plan
+        plan_result = executor.plan()
+        assert plan_result.has_changes
 
-            # Verify directory exists
-            assert os.path.isdir(test_dir)
+        # Apply
+        apply_result = executor.apply(plan_result)
+        assert apply_result.success
 
-        finally:
-            # Cleanup
-            if os.path.exists(test_dir):
-                os.rmdir(test_dir)
+        # Verify directory exists
+        assert os.path.isdir(test_dir)
 
-    def test_multiple_resources(self):
+    def test_multiple_resources(self, tmp_path):
         """Test managing multiple resources."""
         executor = Executor()
 
-        test_dir = tempfile.mkdtemp()
+        test_dir = str(tmp_path / "app")
         test_file = os.path.join(test_dir, "test.txt")
 
-        try:
-            # Add multiple resources
-            executor.add(File(test_dir, ensure="directory", mode=0o755))
-            executor.add(File(test_file, content="multi-resource test\n", mode=0o644))
+        # Add multiple resources
+        executor.add(File(test_dir, ensure="directory", mode=0o755))
+        executor.add(File(test_file, content="multi-resource test\n", mode=0o644))
 
-            # Plan
-            plan_result = executor.plan()
-            assert plan_result.change_count == 2
+        # Plan
+        plan_result = executor.plan()
+        assert plan_result.change_count == 2
 
-            # Apply
-            apply_result = executor.apply(plan_result)
-            assert apply_result.success
-            assert len(apply_result.changed_resources) == 2
+        # Apply
+        apply_result = executor.apply(plan_result)
+        assert apply_result.success
+        assert len(apply_result.changed_resources) == 2
 
-            # Verify both exist
-            assert os.path.isdir(test_dir)
-            assert os.path.exists(test_file)
-
-        finally:
-            # Cleanup
-            if os.path.exists(test_file):
-                os.unlink(test_file)
-            if os.path.exists(test_dir):
-                os.rmdir(test_dir)
+        # Verify both exist
+        assert os.path.isdir(test_dir)
+        assert os.path.exists(test_file)
 
 
 class TestStateIntegration:
@@ -133,35 +105,29 @@ class TestStateIntegration:
         """Reset executor before each test."""
         reset_executor()
 
-    def test_state_tracking(self):
+    def test_state_tracking(self, tmp_path):
         """Test that state is tracked after apply."""
         executor = Executor()
         executor.enable_state_tracking()
 
-        test_file = tempfile.mktemp()
-
-        try:
-            # Create resource
-            executor.add(File(test_file, content="state test\n", mode=0o644))
+        test_file = str(tmp_path / "state.txt")
 
-            # Apply
-            plan_result = executor.plan()
-            apply_result = executor.apply(plan_result)
+        # Create resource
+        executor.add(File(test_file, content="state test\n", mode=0o644))
 
-            assert apply_result.success
+        # Apply
+        plan_result = executor.plan()
+        apply_result = executor.apply(plan_result)
 
-            # Check state was saved
-            from cook.state import Store
-            with Store() as store:
-                state = store.get_resource(f"file:{test_file}")
-                assert state is not None
-                assert state.type == "file"
-                assert state.status == "success"
+        assert apply_result.success
 
-        finally:
-            # Cleanup
-            if os.path.exists(test_file):
-                os.unlink(test_file)
+        # Check state was saved
+        from cook.state import Store
+        with Store() as store:
+            state = store.get_resource(f"file:{test_file}")
+            assert state is not None
+            assert state.type == "file"
+            assert state.status == "success"
 
 
 class TestRecordingIntegration:
@@ -21,6 +21,20 @@ pytestmark = pytest.mark.skipif(
 )
 
 
+def remove_test_files(paths):
+    """Remove whichever of paths exist, listing each directory once."""
+    by_dir = {}
+    for path in paths:
+        by_dir.setdefault(os.path.dirname(path), set()).add(os.path.basename(path))
+    for directory, names in by_dir.items():
+        try:
+            present = set(os.listdir(directory))
+        except FileNotFoundError:
+            continue
+        for name in names & present:
+            os.remove(os.path.join(directory, name))
+
+
 class TestRepositoryUpdateWorkflow:
     """Test repository update workflows."""
 
@@ -86,14 +100,10 @@ class TestRepositoryAddWorkflow:
 
     def teardown_method(self):
         """Clean up test repositories."""
-        # Remove test repository file if it exists
-        test_files = [
+        remove_test_files([
             "/etc/apt/sources.list.d/test-cook-repo.list",
             "/etc/apt/trusted.gpg.d/test-cook-repo.gpg",
-        ]
-        for f in test_files:
-            if os.path.exists(f):
-                os.remove(f)
+        ])
 
     def test_add_repository_workflow(self):
         """Test adding a custom repository."""
@@ -261,13 +271,10 @@ class TestRepositoryRealWorld:
 
     def teardown_method(self):
         """Clean up test repositories."""
-        test_files = [
+        remove_test_files([
             "/etc/apt/sources.list.d/test-nodesource.list",
             "/etc/apt/trusted.gpg.d/test-nodesource.gpg",
-        ]
-        for f in test_files:
-            if os.path.exists(f):
-                os.remove(f)
+        ])
 
     @pytest.mark.slow
     @pytest.mark.skip(reason="Requires actual GPG key download - manual test only")
@@ -339,9 +346,7 @@ class TestRepositoryStateTracking:
 
     def teardown_method(self):
         """Clean up test repositories."""
-        test_file = "/etc/apt/sources.list.d/test-state-repo.list"
-        if os.path.exists(test_file):
-            os.remove(test_file)
+        remove_test_files(["/etc/apt/sources.list.d/test-state-repo.list"])
 
     def test_repository_state_persistence(self):
         """Test that repository state is persisted."""
@@ -0,0 +1,97 @@
+"""
+Unit tests for drift detection.
+"""
+
+import os
+import time
+from datetime import datetime
+
+from cook.core import Platform
+from cook.core.executor import reset_executor
+from cook.monitor import DriftDetector
+from cook.monitor.drift import SIGNATURE_KEY
+from cook.resources.file import File
+from cook.state import ResourceState, Store
+from cook.transport import LocalTransport
+
+
+def save_file_state(store: Store, path: str) -> None:
+    """Record a file's current state the way the executor does after apply."""
+    resource = File(path, content=open(path).read())
+    store.save_resource(ResourceState(
+        id=resource.id,
+        type="file",
+        desired_state=resource.desired_state(),
+        actual_state=resource.check(Platform.detect()),
+        applied_at=datetime(2024, 1, 1, 12, 0, 0),
+        applied_by="tester",
+        hostname="host",
+        config_file="server.py",
+        status="success",
+    ))
+
+
+class TestDriftDetector:
+    """Unit tests for DriftDetector."""
+
+    def setup_method(self):
+        reset_executor()
+
+    def test_unchanged_file_skips_content_read(self, tmp_path, monkeypatch):
+        """Test that a file whose stat matches the last clean check isn't read again."""
+        path = tmp_path / "app.conf"
+        path.write_text("port=80\n")
+        reads = []
+        read_file = LocalTransport.read_file
+        monkeypatch.setattr(
+            LocalTransport, "read_file", lambda self, p: reads.append(p) or read_file(self, p)
+        )
+
+        with Store(Store.MEMORY) as store:
+            save_file_state(store, str(path))
+            detector = DriftDetector(store)
+
+            reads.clear()
+            assert not detector.check_all()[0].drifted
+            assert reads == [str(path)]
+            assert SIGNATURE_KEY in store.list_resources()[0].actual_state
+
+            reads.clear()
+            assert not detector.check_all()[0].drifted
+            assert reads == []
+
+    def test_modified_file_detected(self, tmp_path):
+        """Test that a content change after the last clean check is reported."""
+        path = tmp_path / "app.conf"
+        path.write_text("port=80\n")
+
+        with Store(Store.MEMORY) as store:
+            save_file_state(store, str(path))
+            detector = DriftDetector(store)
+            assert not detector.check_all()[0].drifted
+
+            path.write_text("port=8080\n")
+            os.utime(path, (0, 0))
+            result = detector.check_all()[0]
+
+        assert result.drifted
+        assert result.differences["content"]["actual"] == "port=8080\n"
+
+    def test_change_with_restored_mtime_detected(self, tmp_path):
+        """Test that an edit which keeps size and resets mtime still gets a content check."""
+        path = tmp_path / "app.conf"
+        path.write_text("port=80\n")
+        st = path.stat()
+
+        with Store(Store.MEMORY) as store:
+            save_file_state(store, str(path))
+            detector = DriftDetector(store)
+            assert not detector.check_all()[0].drifted
+
+            time.sleep(0.01)
+            path.write_text("port=81\n")
+            os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns))
+            result = detector.check_all()[0]
+
+        assert result.drifted
+        assert result.differences["content"]["actual"] == "port=81\n"
@@ -5,8 +5,7 @@ Tests the executor's resource management and plan/apply workflow.
 """
 
 import pytest
-import tempfile
-import os
+import time
 
 from cook.core import Platform, Action, Resource
 from cook.core.executor import Executor, reset_executor
@@ -34,6 +33,30 @@ class MockResource(Resource):
         pass
 
 
+class SlowResource(MockResource):
+    """Mock resource whose check blocks like a remote round trip."""
+
+    def check(self, platform: Platform):
+        time.sleep(0.1)
+        if self.value == "fail":
+            raise RuntimeError(f"check failed for {self.name}")
+        return {"exists": False}
+
+
+class PathResource(MockResource):
+    """Mock resource touching one path; apply blocks and records its span."""
+
+    log = []
+
+    def apply_paths(self, plan, platform):
+        return (self.value,)
+
+    def apply(self, plan, platform):
+        start = time.time()
+        time.sleep(0.1)
+        PathResource.log.append((self.name, start, time.time()))
+
+
 class TestExecutorResourceManagement:
     """Unit tests for executor resource management."""
 
@@ -144,58 +167,44 @@ class TestExecutorResourceManagement:
 class TestExecutorPlanApply:
     """Unit tests for executor plan/apply workflow."""
 
-    def test_plan_no_changes(self):
+    def test_plan_no_changes(self, tmp_path):
         """Test planning when no changes are needed."""
         executor = Executor()
-        platform = Platform.detect()
-
-        # Create a temp file with specific content
-        with tempfile.NamedTemporaryFile(mode='w', delete=False) as f:
-            f.write("existing content")
-            test_file = f.name
 
-        try:
-            # Define resource matching existing state
-            file_res = File(test_file, content="existing content", mode=0o644)
-            os.chmod(test_file, 0o644)
-            executor.add(file_res)
+        # Create a file with specific content
+        test_file = tmp_path / "test-executor-existing.txt"
+        test_file.write_text("existing content")
+        test_file.chmod(0o644)
 
-            # Plan should show no changes
-            plan_result = executor.plan()
-            assert not plan_result.has_changes
-            assert plan_result.change_count == 0
+        # Define resource matching existing state
+        file_res = File(str(test_file), content="existing content", mode=0o644)
+        executor.add(file_res)
 
-        finally:
-            os.unlink(test_file)
+        # Plan should show no changes
+        plan_result = executor.plan()
+        assert not plan_result.has_changes
+        assert plan_result.change_count == 0
 
-    def test_plan_with_changes(self):
+    def test_plan_with_changes(self, tmp_path):
         """Test planning when changes are needed."""
         executor = Executor()
-        platform = Platform.detect()
 
-        test_file = "/tmp/test-executor-plan.txt"
-        if os.path.exists(test_file):
-            os.unlink(test_file)
+        test_file = str(tmp_path / "test-executor-plan.txt")
 
-        try:
-            # Define resource for non-existent file
-            file_res = File(test_file, content="new content", mode=0o644)
-            executor.add(file_res)
+        # Define resource for non-existent file
+        file_res = File(test_file, content="new content", mode=0o644)
+        executor.add(file_res)
 
-            # Plan should show changes (file needs to be created)
-            plan_result = executor.plan()
-            assert plan_result.has_changes
-            assert plan_result.change_count == 1
+        # Plan should show changes (file needs to be created)
+        plan_result = executor.plan()
+        assert plan_result.has_changes
+        assert plan_result.change_count == 1
 
-            # Verify the plan action
-            plan = plan_result.plans.get(file_res.id)
-            assert plan.action == Action.CREATE
+        # Verify the plan action
+        plan = plan_result.plans.get(file_res.id)
+        assert plan.action == Action.CREATE
 
-        finally:
-            if os.path.exists(test_file):
-                os.unlink(test_file)
-
-    def test_plan_replaced_resource(self):
+    def test_plan_replaced_resource(self, tmp_path):
         """
         Test that planning works correctly with replaced resources.
 
@@ -203,32 +212,198 @@ class TestExecutorPlanApply:
         is generated based on the final (latest) definition.
         """
         executor = Executor()
-        platform = Platform.detect()
 
-        test_file = "/tmp/test-executor-replaced.txt"
-        if os.path.exists(test_file):
-            os.unlink(test_file)
+        test_file = str(tmp_path / "test-executor-replaced.txt")
+
+        # First definition
+        file1 = File(test_file, content="first version", mode=0o644)
+        executor.add(file1)
+
+        # Second definition (replaces first)
+        file2 = File(test_file, content="second version", mode=0o600)
+        executor.add(file2)
+
+        # Plan should be based on the SECOND definition
+        plan_result = executor.plan()
+        plan = plan_result.plans.get(f"file:{test_file}")
+
+        assert plan.action == Action.CREATE
+
+        # Find content change
+        content_change = next((c for c in plan.changes if c.field == "content"), None)
+        assert content_change is not None
+        assert content_change.to_value == "second version"
+
+    def test_plan_checks_sequential_by_default(self):
+        """Test that plan() only checks concurrently when asked to."""
+        assert Executor().max_workers == 1
+
+    def test_plan_checks_run_concurrently(self):
+        """Test that plan() overlaps independent resource checks."""
+        executor = Executor(max_workers=8)
+        for i in range(8):
+            executor.add(SlowResource(f"slow{i}", "value"))
+
+        start = time.time()
+        plan_result = executor.plan()
+        elapsed = time.time() - start
+
+        assert len(plan_result.plans) == 8
+        assert list(plan_result.plans) == [r.id for r in executor.resources]
+        assert elapsed < 0.5
+
+    def test_plan_collects_errors_concurrently(self):
+        """Test that a failing check doesn't drop the other plans."""
+        executor = Executor(max_workers=4)
+        executor.add(SlowResource("ok1", "value"))
+        executor.add(SlowResource("bad", "fail"))
+        executor.add(SlowResource("ok2", "value"))
+
+        plan_result = executor.plan()
+
+        assert plan_result.has_errors
+        assert len(plan_result.errors) == 1
+        assert set(plan_result.plans) == {"mock:ok1", "mock:ok2"}
+
+
+    def test_default_apply_batch_applies_each(self, caplog):
+        """Test that a type defining only batch_key() has its batches applied one by one."""
+        applied = []
+
+        class KeyedResource(MockResource):
+            def batch_key(self, plan, platform):
+                return "keyed"
+
+            def apply(self, plan, platform):
+                applied.append(self.name)
+
+        executor = Executor()
+        executor.add(KeyedResource("a", "1"))
+        executor.add(KeyedResource("b", "2"))
+
+        result = executor.apply(executor.plan())
+
+        assert result.errors == []
+        assert applied == ["a", "b"]
+        assert "retrying individually" not in caplog.text
+
+class TestExecutorConcurrentApply:
+    """Unit tests for apply_workers."""
+
+    def setup_method(self):
+        PathResource.log = []
+
+    def _spans(self):
+        return {name: (start, end) for name, start, end in PathResource.log}
+
+    def test_unrelated_paths_overlap(self):
+        """Test that changes to unrelated paths are applied at the same time."""
+        executor = Executor(apply_workers=4)
+        for name in ["a", "b", "c", "d"]:
+            executor.add(PathResource(name, f"/srv/{name}"))
+
+        start = time.time()
+        result = executor.apply(executor.plan())
+
+        assert time.time() - start < 0.3
+        assert result.changed_resources == ["mock:a", "mock:b", "mock:c", "mock:d"]
+
+    def test_nested_paths_keep_order(self):
+        """Test that a path inside an earlier change's path waits for it."""
+        executor = Executor(apply_workers=4)
+        executor.add(PathResource("dir", "/opt/app"))
+        executor.add(PathResource("file", "/opt/app/server.js"))
+        executor.add(PathResource("sibling", "/opt/application"))
+
+        executor.apply(executor.plan())
+        spans = self._spans()
+
+        assert spans["file"][0] >= spans["dir"][1]
+        assert spans["sibling"][0] < spans["dir"][1]
+
+    def test_unknown_footprint_is_a_barrier(self):
+        """Test that resources without apply_paths() never overlap with others."""
+        executor = Executor(apply_workers=4)
+        executor.add(PathResource("before", "/srv/a"))
+        executor.add(MockResource("opaque", "x"))
+        executor.add(PathResource("after", "/srv/b"))
+        order = []
+        executor.resources[1].apply = lambda plan, platform: order.append(len(PathResource.log))
+
+        executor.apply(executor.plan())
+
+        assert order == [1]
+        assert [name for name, _, _ in PathResource.log] == ["before", "after"]
+
+    def test_exec_with_declared_paths_overlaps(self, tmp_path):
+        """Test that Execs declaring unrelated paths run at the same time."""
+        from cook.resources.exec import Exec
+
+        reset_executor()
+        executor = Executor(apply_workers=4)
+        for name in ["one", "two"]:
+            target = str(tmp_path / name)
+            executor.add(Exec(f"fetch-{name}", command="sleep 0.3", creates=target, paths=[target]))
+
+        start = time.time()
+        result = executor.apply(executor.plan())
+
+        assert result.errors == []
+        assert time.time() - start < 0.55
+
+    def test_sequential_by_default(self):
+        """Test that the default applies one change at a time."""
+        executor = Executor()
+        executor.add(PathResource("a", "/srv/a"))
+        executor.add(PathResource("b", "/srv/b"))
+
+        executor.apply(executor.plan())
+        spans = self._spans()
+
+        assert spans["b"][0] >= spans["a"][1]
+
+
+class TestExecutorExportScript:
+    """Unit tests for export_script."""
+
+    def setup_method(self):
+        reset_executor()
+
+    def test_script_reproduces_apply(self, tmp_path):
+        """Test that the exported script makes the planned changes when run, and export changes nothing."""
+        import subprocess
+        from cook.resources.exec import Exec
+
+        app = tmp_path / "app"
+        executor = Executor(max_workers=1)
+        executor.add(File(str(app), ensure="directory", mode=0o750))
+        executor.add(File(str(app / "site.conf"), content="server {\n    listen 80;\n}\n", mode=0o640))
+        executor.add(File(str(app / "raw.bin"), content="no trailing newline"))
+        executor.add(Exec("marker", command=f"touch {app / 'done'}", creates=str(app / "done")))
+
+        script = executor.export_script(executor.plan())
 
-        try:
-            # First definition
-            file1 = File(test_file, content="first version", mode=0o644)
-            executor.add(file1)
+        assert not app.exists()
+        assert script.startswith("#!/bin/sh\nset -e\n")
+        assert f"# file:{app}" in script
 
-            # Second definition (replaces first)
-            file2 = File(test_file, content="second version", mode=0o600)
-            executor.add(file2)
+        subprocess.run(["sh", "-c", script], check=True)
 
-            # Plan should be based on the SECOND definition
-            plan_result = executor.plan()
-            plan = plan_result.plans.get(f"file:{test_file}")
+        assert oct(app.stat().st_mode & 0o777) == oct(0o750)
+        assert (app / "site.conf").read_text() == "server {\n    listen 80;\n}\n"
+        assert oct((app / "site.conf").stat().st_mode & 0o777) == oct(0o640)
+        assert (app / "raw.bin").read_text() == "no trailing newline"
+        assert (app / "done").exists()
+        assert not executor.plan().has_changes
 
-            assert plan.action == Action.CREATE
+    def test_script_starts_from_clean_trigger_state(self):
+        """Test that leftover cache and daemon-reload marks do not leak into the script."""
+        executor = Executor(max_workers=1)
+        executor._cache_dirty.add("apt")
+        executor._daemon_reload_pending = True
 
-            # Find content change
-            content_change = next((c for c in plan.changes if c.field == "content"), None)
-            assert content_change is not None
-            assert content_change.to_value == "second version"
+        script = executor.export_script(executor.plan())
 
-        finally:
-            if os.path.exists(test_file):
-                os.unlink(test_file)
+        assert "update" not in script
+        assert "daemon-reload" not in script
+        assert executor._cache_dirty == set()
@@ -0,0 +1,247 @@
+"""
+Unit tests for Package resource.
+
+Tests package management operations in isolation using mocks.
+"""
+
+import pytest
+
+from cook.core import Platform, Plan, Action
+from cook.core.executor import Executor, reset_executor
+from cook.resources.pkg import APT_GET, DPKG_QUERY_FORMAT, Package, parse_dpkg_status
+
+
+class MockTransport:
+    """Mock transport for testing."""
+
+    def __init__(self, installed=None):
+        self.installed = installed or {}
+        self.commands = []
+        self.envs = []
+        self.shells = []
+
+    def run_command(self, cmd, env=None):
+        self.commands.append(cmd)
+        self.envs.append(env)
+        if cmd[0] == "dpkg-query":
+            lines = []
+            code = 0
+            # No package arguments lists everything installed
+            for pkg in cmd[3:] or list(self.installed):
+                if pkg in self.installed:
+                    # Installed names may carry an arch ("libc6:i386"); amd64 otherwise
+                    name, _, arch = pkg.partition(":")
+                    lines.append(f"{name} {self.installed[pkg]}")
+                    lines.append(f"{name}:{arch or 'amd64'} {self.installed[pkg]}")
+                else:
+                    lines.append(f"dpkg-query: no packages found matching {pkg}")
+                    code = 1
+            return ("\n".join(lines) + "\n", code)
+        return ("", 0)
+
+    def run_shell(self, cmd):
+        self.shells.append(cmd)
+        return ("", 0)
+
+
+class TestPackageResource:
+    """Unit tests for Package resource."""
+
+    def setup_method(self):
+        """Reset executor before each test."""
+        reset_executor()
+
+    def test_check_single_query_for_group(self):
+        """Test that checking a package group issues one query."""
+        pkg = Package(["nginx", "curl", "git"])
+        pkg._transport = MockTransport({"nginx": "1.18.0-1", "curl": "7.81.0-1"})
+
+        platform = Platform(system="Linux", distro="ubuntu", version="22.04", arch="x86_64")
+
+        state = pkg.check(platform)
+
+        assert len(pkg._transport.commands) == 1
+        assert state["exists"] is False
+        assert state["packages"]["nginx"] == {"installed": True, "version": "1.18.0-1"}
+        assert state["packages"]["curl"]["installed"] is True
+        assert state["packages"]["git"] == {"installed": False, "version": None}
+
+    def test_check_all_installed(self):
+        """Test checking a group where every package is installed."""
+        pkg = Package("build-tools", packages=["gcc", "make"])
+        pkg._transport = MockTransport({"gcc": "11.2.0", "make": "4.3"})
+
+        platform = Platform(system="Linux", distro="debian", version="12", arch="x86_64")
+
+        plan = pkg.plan(platform)
+
+        assert plan.action == Action.NONE
+
+    def test_upgrade_single_invocation(self):
+        """Test that upgrade uses the upgrade verb with all packages in one call."""
+        pkg = Package(["nginx", "curl"], ensure="latest")
+        pkg._transport = MockTransport()
+
+        platform = Platform(system="Linux", distro="fedora", version="38", arch="x86_64")
+
+        pkg._upgrade("dnf", platform)
+
+        assert pkg._transport.commands == [["dnf", "upgrade", "-y", "nginx", "curl"]]
+
+    def test_install_requires_packages(self):
+        """Test that an empty package list is rejected before running apt-get."""
+        pkg = Package([])
+        pkg._transport = MockTransport()
+
+        platform = Platform(system="Linux", distro="ubuntu", version="22.04", arch="x86_64")
+
+        with pytest.raises(ValueError, match="no packages"):
+            pkg._install("apt", platform)
+
+        assert pkg._transport.commands == []
+
+    def test_dirty_cache_updated_once_before_installs(self):
+        """Test that a stale cache triggers one update shared by all installs."""
+        platform = Platform(system="Linux", distro="ubuntu", version="22.04", arch="x86_64")
+        executor = Executor(platform=platform, transport=MockTransport())
+        nginx = executor.add(Package("nginx"))
+        curl = executor.add(Package("curl"))
+
+        # A repository added earlier in the apply marks the cache dirty
+        executor._cache_dirty.add("apt")
+
+        nginx.apply(Plan(action=Action.CREATE), platform)
+        curl.apply(Plan(action=Action.CREATE), platform)
+
+        commands = executor.transport.commands
+        assert commands.count(APT_GET + ["update", "-y"]) == 1
+        assert commands[0] == APT_GET + ["update", "-y"]
+        assert executor._cache_dirty == set()
+
+    def test_install_command_per_package_manager(self):
+        """Test that apt runs without a shell, non-interactive via the environment."""
+        platform = Platform(system="Linux", distro="ubuntu", version="22.04", arch="x86_64")
+
+        pkg = Package(["nginx", "curl"])
+        pkg._transport = MockTransport()
+        pkg._install("apt", platform)
+        assert pkg._transport.commands == [APT_GET + ["install", "-y", "nginx", "curl"]]
+        assert pkg._transport.envs == [{"DEBIAN_FRONTEND": "noninteractive"}]
+        assert pkg._transport.shells == []
+
+        pkg._transport = MockTransport()
+        pkg._remove("pacman", platform)
+        assert pkg._transport.commands == [["pacman", "-R", "--noconfirm", "nginx", "curl"]]
+        assert pkg._transport.envs == [None]
+
+        pkg._transport = MockTransport()
+        pkg._upgrade("pacman", platform)
+        assert pkg._transport.commands == [["pacman", "-S", "--needed", "--noconfirm", "nginx", "curl"]]
+
+    def test_install_only_missing_packages(self):
+        """Test that installing a partly installed group passes only the missing packages."""
+        platform = Platform(system="Linux", distro="ubuntu", version="22.04", arch="x86_64")
+        executor = Executor(platform=platform, transport=MockTransport({"php-fpm": "8.1"}))
+        executor.add(Package(["php-fpm", "php-mysql", "php-curl"]))
+
+        result = executor.apply(executor.plan())
+
+        installs = [cmd for cmd in executor.transport.commands if cmd[:4] == APT_GET + ["install"]]
+        assert installs == [APT_GET + ["install", "-y", "php-mysql", "php-curl"]]
+        assert result.errors == []
+
+    def test_installed_packages_listed_once_per_plan(self):
+        """Test that all Package checks share one listing, refreshed after an install."""
+        platform = Platform(system="Linux", distro="ubuntu", version="22.04", arch="x86_64")
+        executor = Executor(platform=platform, transport=MockTransport({"nginx": "1.18"}), max_workers=1)
+        executor.add(Package("nginx"))
+        executor.add(Package("curl"))
+        executor.add(Package(["git", "nginx"]))
+
+        plan = executor.plan()
+        queries = [cmd for cmd in executor.transport.commands if cmd[0] == "dpkg-query"]
+        assert queries == [["dpkg-query", "-W", DPKG_QUERY_FORMAT]]
+
+        executor.transport.commands.clear()
+        executor.apply(plan)
+        queries = [cmd for cmd in executor.transport.commands if cmd[0] == "dpkg-query"]
+        assert len(queries) == 1
+
+    def test_arch_qualified_package_installed(self):
+        """Test that an installed name:arch package needs no change."""
+        platform = Platform(system="Linux", distro="ubuntu", version="22.04", arch="x86_64")
+        executor = Executor(platform=platform, transport=MockTransport({"libc6:i386": "2.35"}), max_workers=1)
+        executor.add(Package("libc6:i386"))
+
+        plan = executor.plan()
+
+        assert not plan.has_changes
+        assert plan.errors == []
+
+    def test_parse_dpkg_status(self):
+        """Test that the dpkg database lists what dpkg-query -W would."""
+        content = (
+            "Package: nginx\nStatus: install ok installed\nVersion: 1.18\n"
+            "Description: web server\n Package: not-a-field\n\n"
+            "Package: apache2\nStatus: deinstall ok config-files\nVersion: 2.4\n\n"
+            "Package: curl\nStatus: purge ok not-installed\n\n"
+            "Package: git\nStatus: purge ok not-installed\nVersion: 2.34\n"
+        )
+
+        assert parse_dpkg_status(content) == {"nginx": "1.18", "apache2": "2.4"}
+
+    def test_parse_dpkg_status_arch_qualified(self):
+        """Test that packages are also keyed by their name:arch form."""
+        content = (
+            "Package: libc6\nStatus: install ok installed\nArchitecture: i386\n"
+            "Version: 2.35\n"
+        )
+
+        assert parse_dpkg_status(content) == {"libc6": "2.35", "libc6:i386": "2.35"}
+
+    def test_duplicate_packages_dropped(self):
+        """Test that repeated package names are passed once."""
+        pkg = Package(["nginx", "curl", "nginx"])
+
+        assert pkg.packages == ["nginx", "curl"]
+
+    def test_consecutive_installs_merged(self):
+        """Test that neighbouring Package installs run as one transaction."""
+        platform = Platform(system="Linux", distro="ubuntu", version="22.04", arch="x86_64")
+        executor = Executor(platform=platform, transport=MockTransport())
+        executor.add(Package("nginx"))
+        executor.add(Package(["curl", "nginx"]))
+        executor.add(Package("git"))
+
+        result = executor.apply(executor.plan())
+
+        installs = [cmd for cmd in executor.transport.commands if cmd[:4] == APT_GET + ["install"]]
+        assert installs == [APT_GET + ["install", "-y", "nginx", "curl", "git"]]
+        assert len(result.changed_resources) == 3
+        assert result.errors == []
+
+    def test_failed_batch_retried_individually(self):
+        """Test that a failing merged install falls back to per-resource installs."""
+
+        class FailingTransport(MockTransport):
+            def run_command(self, cmd, env=None):
+                result = super().run_command(cmd, env)
+                if cmd[:4] == APT_GET + ["install"] and "missing-pkg" in cmd:
+                    return ("E: Unable to locate package missing-pkg", 100)
+                return result
+
+        platform = Platform(system="Linux", distro="ubuntu", version="22.04", arch="x86_64")
+        executor = Executor(platform=platform, transport=FailingTransport())
+        executor.add(Package("nginx"))
+        executor.add(Package("missing-pkg"))
+
+        result = executor.apply(executor.plan())
+
+        installs = [cmd for cmd in executor.transport.commands if cmd[:4] == APT_GET + ["install"]]
+        assert installs[0] == APT_GET + ["install", "-y", "nginx", "missing-pkg"]
+        assert installs[1:] == [
+            APT_GET + ["install", "-y", "nginx"],
+            APT_GET + ["install", "-y", "missing-pkg"],
+        ]
+        assert result.changed_resources == ["pkg:nginx"]
+        assert len(result.errors) == 1
@@ -4,36 +4,91 @@ Unit tests for Repository resource.
 Tests repository management operations in isolation using mocks.
 """
 
+import fnmatch
+import os
+import time
+from typing import Dict
+
 import pytest
 from unittest.mock import Mock, MagicMock
 
 from cook.core import Platform, Action
-from cook.core.executor import reset_executor
-from cook.resources.repository import Repository
-from cook.transport import NullTransport
+from cook.core.executor import Executor, reset_executor
+from cook.resources import repository as repository_module
+from cook.resources.repository import Repository, _KEY_CACHE, _dearmor
+from cook.resources.pkg import APT_GET
+from cook.transport import NullTransport, Transport
+
+UBUNTU_22 = Platform(system="Linux", distro="ubuntu", version="22.04", arch="x86_64")
+FEDORA_38 = Platform(system="Linux", distro="fedora", version="38", arch="x86_64")
+ARCH = Platform(system="Linux", distro="arch", version="", arch="x86_64")
+MACOS = Platform(system="Darwin", distro="macos", version="13.0", arch="arm64")
+WINDOWS = Platform(system="Windows", distro="windows", version="10", arch="x86_64")
 
 
 class MockTransport:
     """Mock transport for testing."""
 
     def __init__(self):
-        self.files = {}
+        self.files: Dict[str, bytes] = {}
+        self.mtimes = {}
+        self.reads = []
+        self.greps = []
         self.commands = []
         self.shells = []
+        self.created = time.time()
+        # Target clock minus controller clock
+        self.clock_offset = 0
 
     def file_exists(self, path):
         return path in self.files
 
+    def stat(self, path):
+        if path not in self.files:
+            return None
+        # Files default to 2 hours old
+        mtime = self.mtimes.get(path, self.created - 7200)
+        size = len(self.files[path])
+        return os.stat_result((0o100644, 0, 0, 1, 0, 0, size, mtime, mtime, mtime))
+
     def read_file(self, path):
+        self.reads.append(path)
         if path in self.files:
-            return self.files[path].encode("utf-8")
+            return self.files[path]
         raise FileNotFoundError(path)
 
     def write_file(self, path, content):
-        self.files[path] = content.decode("utf-8") if isinstance(content, bytes) else content
+        self.files[path] = content
+
+    def glob(self, pattern):
+        return sorted(fnmatch.filter(self.files, pattern))
 
-    def run_command(self, cmd):
+    read_file_cached = Transport.read_file_cached
+    stat_many = Transport.stat_many
+
+    def append_file(self, path, content):
+        self.files[path] = self.files.get(path, b"") + content
+
+    def grep(self, path, text):
+        self.greps.append(path)
+        return any(text.encode("utf-8") in line for line in self.files.get(path, b"").splitlines())
+
+    def run_command(self, cmd, env=None):
         self.commands.append(cmd)
+        if cmd == ["lsb_release", "-cs"]:
+            return ("jammy", 0)
+        if cmd[:2] == ["sh", "-c"] and cmd[2].startswith("date +%s;"):
+            now = int(time.time() + self.clock_offset)
+            st = self.stat(cmd[3])
+            if st is None:
+                return (f"{now}\n", 1)
+            return (f"{now}\n{int(st.st_mtime)}\n", 0)
+        if cmd[:3] == ["apt", "list", "--upgradable"]:
+            return (
+                "Listing... Done\n"
+                "nginx/jammy 1.18.0-1 amd64 [upgradable from: 1.17.0-1]\n",
+                0,
+            )
         return ("", 0)
 
     def run_shell(self, cmd):
@@ -41,8 +96,6 @@ class MockTransport:
         # Mock responses for common commands
         if "lsb_release -cs" in cmd:
             return ("jammy", 0)
-        if "apt list --upgradable" in cmd:
-            return ("nginx/jammy 1.18.0-1 amd64 [upgradable from: 1.17.0-1]", 0)
         if "date +%s" in cmd or "stat" in cmd:
             return ("7200", 0)  # 2 hours old
         return ("", 0)
@@ -109,12 +162,12 @@ class TestRepositoryResource:
         """Test checking update with fresh cache."""
         repo = Repository("apt-update", action="update")
         repo._transport = MockTransport()
-        repo._transport.files["/var/lib/apt/periodic/update-success-stamp"] = ""
+        repo._transport.files["/var/lib/apt/periodic/update-success-stamp"] = b""
 
-        platform = Platform(system="Linux", distro="ubuntu", version="22.04", arch="x86_64")
+        platform = UBUNTU_22
 
-        # Mock recent cache (1 hour old)
-        repo._transport.run_shell = lambda cmd: ("3600", 0) if "date +%s" in cmd else ("", 0)
+        # Mock recent cache (just under 1 hour old)
+        repo._transport.mtimes["/var/lib/apt/periodic/update-success-stamp"] = time.time() - 3500
 
         state = repo.check(platform)
 
@@ -125,30 +178,82 @@ class TestRepositoryResource:
         """Test checking update with stale cache."""
         repo = Repository("apt-update", action="update")
         repo._transport = MockTransport()
-        repo._transport.files["/var/lib/apt/periodic/update-success-stamp"] = ""
+        repo._transport.files["/var/lib/apt/periodic/update-success-stamp"] = b""
 
-        platform = Platform(system="Linux", distro="ubuntu", version="22.04", arch="x86_64")
+        platform = UBUNTU_22
 
         # Mock old cache (2 hours old)
-        repo._transport.run_shell = lambda cmd: ("7200", 0) if "date +%s" in cmd else ("", 0)
+        repo._transport.mtimes["/var/lib/apt/periodic/update-success-stamp"] = time.time() - 7200
 
         state = repo.check(platform)
 
         assert state["exists"] is True
         assert state["needs_update"] is True
 
+    def test_cache_age_uses_target_clock(self):
+        """Test that the cache age is measured against the target's clock, not the controller's."""
+        repo = Repository("apt-update", action="update")
+        repo._transport = MockTransport()
+        stamp = "/var/lib/apt/periodic/update-success-stamp"
+        repo._transport.files[stamp] = b""
+
+        # Target a day behind; stamp written 30 minutes ago by its clock
+        repo._transport.clock_offset = -86400
+        repo._transport.mtimes[stamp] = time.time() - 86400 - 1800
+        state = repo.check(UBUNTU_22)
+        assert state["needs_update"] is False
+        assert 1790 <= state["cache_age_seconds"] <= 1810
+
+        # A stamp in the target's future is not taken as fresh
+        repo._transport.clock_offset = 0
+        repo._transport.mtimes[stamp] = time.time() + 3600
+        assert repo.check(UBUNTU_22)["needs_update"] is True
+
+    def test_repository_check_update_custom_max_age(self):
+        """Test that cache_max_age widens the freshness window."""
+        repo = Repository("apt-update", action="update", cache_max_age=86400)
+        repo._transport = MockTransport()
+        repo._transport.files["/var/lib/apt/periodic/update-success-stamp"] = b""
+
+        platform = UBUNTU_22
+
+        # 2 hours old: stale by default, fresh with a one-day window
+        state = repo.check(platform)
+
+        assert state["needs_update"] is False
+
     def test_repository_check_upgrade_needed(self):
         """Test checking upgrade when packages are upgradable."""
         repo = Repository("apt-upgrade", action="upgrade")
         repo._transport = MockTransport()
 
-        platform = Platform(system="Linux", distro="ubuntu", version="22.04", arch="x86_64")
+        platform = UBUNTU_22
 
         state = repo.check(platform)
 
         assert state["exists"] is True
         assert state["needs_upgrade"] is True
         assert state["upgradable_count"] > 0
+        assert state["upgradable"] == ["nginx"]
+
+    def test_repository_check_upgrade_dnf(self):
+        """Test parsing dnf check-update output, skipping obsoletes."""
+        repo = Repository("dnf-upgrade", action="upgrade")
+        repo._transport = MockTransport()
+        repo._transport.run_command = lambda cmd: (
+            "nginx.x86_64   1:1.24.0-1.fc38   updates\n"
+            "curl.x86_64    8.0.1-5.fc38      updates\n"
+            "Obsoleting Packages\n"
+            "grub2-tools.x86_64   1:2.06-95.fc38   updates\n",
+            100,
+        )
+
+        platform = FEDORA_38
+
+        state = repo.check(platform)
+
+        assert state["upgradable"] == ["nginx", "curl"]
+        assert state["upgradable_count"] == 2
 
     def test_repository_check_add_not_exists(self):
         """Test checking repository that doesn't exist."""
@@ -159,7 +264,7 @@ class TestRepositoryResource:
         )
         repo._transport = MockTransport()
 
-        platform = Platform(system="Linux", distro="ubuntu", version="22.04", arch="x86_64")
+        platform = UBUNTU_22
 
         state = repo.check(platform)
 
@@ -175,14 +280,55 @@ class TestRepositoryResource:
         )
         repo._transport = MockTransport()
         repo._transport.files["/etc/apt/sources.list.d/nodesource.list"] = (
-            "deb https://deb.nodesource.com/node_20.x nodistro main\n"
+            b"deb https://deb.nodesource.com/node_20.x nodistro main\n"
+        )
+
+        platform = UBUNTU_22
+
+        state = repo.check(platform)
+
+        assert state["exists"] is True
+
+    def test_repository_check_add_key_probed_with_source(self):
+        """Test that source file and key are probed together and the key reported."""
+        repo = Repository(
+            "docker",
+            action="add",
+            repo="deb https://download.docker.com/linux/ubuntu jammy stable",
+            key_url="https://download.docker.com/linux/ubuntu/gpg",
+            filename="docker.list"
+        )
+        repo._transport = MockTransport()
+        repo._transport.files["/etc/apt/sources.list.d/docker.list"] = (
+            b"deb https://download.docker.com/linux/ubuntu jammy stable\n"
         )
+        repo._transport.files["/etc/apt/trusted.gpg.d/docker.gpg"] = b"key"
+        probes = []
+        repo._transport.stat_many = lambda paths: probes.append(paths) or [
+            repo._transport.stat(path) for path in paths
+        ]
 
-        platform = Platform(system="Linux", distro="ubuntu", version="22.04", arch="x86_64")
+        platform = UBUNTU_22
+
+        plan = repo.plan(platform)
+
+        assert probes == [["/etc/apt/sources.list.d/docker.list", "/etc/apt/trusted.gpg.d/docker.gpg"]]
+        assert repo._actual_state["has_key"] is True
+        assert not plan.has_changes()
+
+    def test_repository_check_ppa_exists(self):
+        """Test that PPA detection globs sources.list.d without a shell."""
+        repo = Repository("ondrej-php", action="add", ppa="ppa:ondrej/php")
+        repo._transport = MockTransport()
+        repo._transport.files["/etc/apt/sources.list.d/ondrej-php-jammy.list"] = b"deb ...\n"
+
+        platform = UBUNTU_22
 
         state = repo.check(platform)
 
         assert state["exists"] is True
+        assert state["source_file"] == "/etc/apt/sources.list.d/ondrej-php-jammy.list"
+        assert repo._transport.shells == []
 
     def test_repository_desired_state_update(self):
         """Test desired state for update action."""
@@ -226,7 +372,7 @@ class TestRepositoryResource:
         repo = Repository("apt-update", action="update")
         repo._transport = MockTransport()
 
-        platform = Platform(system="Linux", distro="ubuntu", version="22.04", arch="x86_64")
+        platform = UBUNTU_22
 
         plan = repo.plan(platform)
 
@@ -242,7 +388,7 @@ class TestRepositoryResource:
         )
         repo._transport = MockTransport()
 
-        platform = Platform(system="Linux", distro="ubuntu", version="22.04", arch="x86_64")
+        platform = UBUNTU_22
 
         plan = repo.plan(platform)
 
@@ -258,13 +404,46 @@ class TestRepositoryResource:
         )
         repo._transport = MockTransport()
 
-        platform = Platform(system="Linux", distro="ubuntu", version="22.04", arch="x86_64")
+        platform = UBUNTU_22
 
         expanded = repo._expand_repo_vars(repo.repo, platform)
 
         assert "$(lsb_release -cs)" not in expanded
         assert "jammy" in expanded
 
+    def test_repository_expand_vars_runs_lsb_release_once(self):
+        """Test that the lsb_release fallback runs once per transport."""
+        transport = MockTransport()
+        repos = [
+            Repository(name, action="add", repo=f"deb https://example.com/{name} $(lsb_release -cs) main")
+            for name in ("one", "two")
+        ]
+        for repo in repos:
+            repo._transport = transport
+
+        expanded = [repo._expand_repo_vars(repo.repo, UBUNTU_22) for repo in repos * 2]
+
+        assert expanded[0] == "deb https://example.com/one jammy main"
+        assert transport.commands == [["lsb_release", "-cs"]]
+
+    def test_repository_expand_vars_from_platform(self):
+        """Test expansion uses platform facts without running commands."""
+        repo = Repository(
+            "docker",
+            action="add",
+            repo="deb [arch=$(dpkg --print-architecture)] https://download.docker.com/linux/ubuntu $(lsb_release -cs) stable"
+        )
+        repo._transport = MockTransport()
+
+        platform = Platform(
+            system="Linux", distro="ubuntu", version="24.04", arch="aarch64", codename="noble"
+        )
+
+        expanded = repo._expand_repo_vars(repo.repo, platform)
+
+        assert expanded == "deb [arch=arm64] https://download.docker.com/linux/ubuntu noble stable"
+        assert repo._transport.shells == []
+
     def test_repository_generate_dnf_repo_file(self):
         """Test generating DNF repository file."""
         repo = Repository(
@@ -285,7 +464,7 @@ class TestRepositoryResource:
     def test_repository_get_package_manager_ubuntu(self):
         """Test package manager detection for Ubuntu."""
         repo = Repository("test", action="update")
-        platform = Platform(system="Linux", distro="ubuntu", version="22.04", arch="x86_64")
+        platform = UBUNTU_22
 
         pm = repo._get_package_manager(platform)
 
@@ -294,7 +473,7 @@ class TestRepositoryResource:
     def test_repository_get_package_manager_fedora(self):
         """Test package manager detection for Fedora."""
         repo = Repository("test", action="update")
-        platform = Platform(system="Linux", distro="fedora", version="38", arch="x86_64")
+        platform = FEDORA_38
 
         pm = repo._get_package_manager(platform)
 
@@ -303,7 +482,7 @@ class TestRepositoryResource:
     def test_repository_get_package_manager_arch(self):
         """Test package manager detection for Arch."""
         repo = Repository("test", action="update")
-        platform = Platform(system="Linux", distro="arch", version="", arch="x86_64")
+        platform = ARCH
 
         pm = repo._get_package_manager(platform)
 
@@ -312,16 +491,28 @@ class TestRepositoryResource:
     def test_repository_get_package_manager_macos(self):
         """Test package manager detection for macOS."""
         repo = Repository("test", action="update")
-        platform = Platform(system="Darwin", distro="macos", version="13.0", arch="arm64")
+        platform = MACOS
 
         pm = repo._get_package_manager(platform)
 
         assert pm == "brew"
 
+    def test_repository_get_package_manager_derivative(self):
+        """Test package manager detection through os-release ID_LIKE."""
+        repo = Repository("test", action="update")
+        platform = Platform(
+            system="Linux", distro="linuxmint", version="21", arch="x86_64",
+            distro_like="ubuntu debian",
+        )
+
+        pm = repo._get_package_manager(platform)
+
+        assert pm == "apt"
+
     def test_repository_get_package_manager_unsupported(self):
         """Test package manager detection for unsupported platform."""
         repo = Repository("test", action="update")
-        platform = Platform(system="Windows", distro="windows", version="10", arch="x86_64")
+        platform = WINDOWS
 
         with pytest.raises(ValueError, match="Unsupported platform"):
             repo._get_package_manager(platform)
@@ -356,31 +547,37 @@ class TestRepositoryResource:
         assert update.id != upgrade.id  # Different IDs for different actions
 
 
+def offline_fetch(url):
+    """Stand-in for _fetch_url when the controller has no network."""
+    raise OSError(f"network unavailable: {url}")
+
+
+def is_key_download(cmd):
+    """Whether cmd is the on-target curl + gpg --dearmor key fallback."""
+    return cmd[:2] == ["sh", "-c"] and "gpg --dearmor" in cmd[2]
+
+
 class TestRepositoryIntegration:
     """Integration-style tests with more realistic mocking."""
 
     def setup_method(self):
         """Reset executor before each test."""
         reset_executor()
+        _KEY_CACHE.clear()
 
     def test_apt_update_workflow(self):
         """Test complete APT update workflow."""
         repo = Repository("apt-update", action="update")
         transport = MockTransport()
         # Make the cache file exist and be stale
-        transport.files["/var/lib/apt/periodic/update-success-stamp"] = ""
+        transport.files["/var/lib/apt/periodic/update-success-stamp"] = b""
 
-        # Override run_shell to return stale cache age
-        original_run_shell = transport.run_shell
-        def stale_cache_shell(cmd):
-            if "date +%s" in cmd or "stat -c %Y" in cmd:
-                return ("7200", 0)  # 2 hours old
-            return original_run_shell(cmd)
-        transport.run_shell = stale_cache_shell
+        # Stale cache age (2 hours old)
+        transport.mtimes["/var/lib/apt/periodic/update-success-stamp"] = time.time() - 7200
 
         repo._transport = transport
 
-        platform = Platform(system="Linux", distro="ubuntu", version="22.04", arch="x86_64")
+        platform = UBUNTU_22
 
         # Check state - should detect stale cache
         state = repo.check(platform)
@@ -394,10 +591,11 @@ class TestRepositoryIntegration:
         repo.apply(plan, platform)
 
         # Verify apt-get update was executed
-        assert any("apt-get update" in str(cmd) for cmd in transport.shells)
+        assert APT_GET + ["update", "-y"] in transport.commands
 
-    def test_add_repository_workflow(self):
+    def test_add_repository_workflow(self, monkeypatch):
         """Test complete add repository workflow."""
+        monkeypatch.setattr(repository_module, "_fetch_url", offline_fetch)
         repo = Repository(
             "docker",
             action="add",
@@ -406,7 +604,7 @@ class TestRepositoryIntegration:
         )
         repo._transport = MockTransport()
 
-        platform = Platform(system="Linux", distro="ubuntu", version="22.04", arch="x86_64")
+        platform = UBUNTU_22
 
         # Check, plan, apply
         state = repo.check(platform)
@@ -419,8 +617,9 @@ class TestRepositoryIntegration:
         # Verify repository file was created
         assert "/etc/apt/sources.list.d/docker.list" in repo._transport.files
 
-        # Verify GPG key was added
-        assert any("gpg" in str(cmd) for cmd in repo._transport.shells)
+        # Verify GPG key was added (offline, so via the on-target fallback)
+        assert any(is_key_download(cmd) for cmd in repo._transport.commands)
+        assert repo._transport.shells == []
 
     def test_ppa_workflow(self):
         """Test PPA addition workflow."""
@@ -431,20 +630,175 @@ class TestRepositoryIntegration:
         )
         repo._transport = MockTransport()
 
-        platform = Platform(system="Linux", distro="ubuntu", version="22.04", arch="x86_64")
-
-        # Mock that the PPA does not exist
-        original_run_shell = repo._transport.run_shell
-        def custom_run_shell(cmd):
-            if "ls /etc/apt/sources.list.d/" in cmd:
-                return ("", 1)  # File not found
-            return original_run_shell(cmd)
-        repo._transport.run_shell = custom_run_shell
+        platform = UBUNTU_22
 
+        # No PPA source file exists yet
         plan = repo.plan(platform)
         assert plan.action == Action.CREATE
 
         repo.apply(plan, platform)
 
-        # Verify add-apt-repository was called
-        assert any("add-apt-repository" in str(cmd) for cmd in repo._transport.shells)
+        # Verify add-apt-repository was called directly
+        assert ["add-apt-repository", "-y", "ppa:ondrej/php"] in repo._transport.commands
+        assert repo._transport.shells == []
+
+    def test_missing_key_reinstalled(self, monkeypatch):
+        """Test that a source whose key was removed gets the key back and then converges."""
+        monkeypatch.setattr(repository_module, "_fetch_url", offline_fetch)
+        transport = MockTransport()
+        transport.files["/etc/apt/sources.list.d/example.list"] = b"deb https://example.com/apt stable main\n"
+
+        def fetch_key(cmd, env=None):
+            transport.commands.append(cmd)
+            if is_key_download(cmd):
+                transport.files[cmd[-1]] = b"KEYDATA"
+            return ("", 0)
+        transport.run_command = fetch_key
+
+        repo = Repository("example", repo="deb https://example.com/apt stable main",
+                          key_url="https://example.com/key.gpg")
+        repo._transport = transport
+        platform = UBUNTU_22
+
+        plan = repo.plan(platform)
+        assert plan.action == Action.UPDATE
+        assert [change.field for change in plan.changes] == ["has_key"]
+
+        repo.apply(plan, platform)
+
+        assert transport.files["/etc/apt/trusted.gpg.d/example.gpg"] == b"KEYDATA"
+        assert not repo.plan(platform).has_changes()
+
+    def test_key_not_tracked_outside_apt(self):
+        """Test that a pacman repository with a key does not plan a key change."""
+        repo = Repository("example", repo="Server = https://example.com/$arch", key_url="https://example.com/key.gpg")
+        repo._transport = MockTransport()
+        repo._transport.files["/etc/pacman.conf"] = b"[example]\nServer = https://example.com/$arch\n"
+
+        plan = repo.plan(Platform(system="Linux", distro="arch", version="rolling", arch="x86_64"))
+
+        assert not plan.has_changes()
+
+    def test_gpg_key_reused_across_repositories(self, monkeypatch):
+        """Test that a key fetched once is written from cache for later repositories."""
+        monkeypatch.setattr(repository_module, "_fetch_url", offline_fetch)
+        key_url = "https://example.com/shared-key.gpg"
+        transport = MockTransport()
+
+        # Simulate curl + gpg --dearmor writing the key file
+        def fetch_key(cmd, env=None):
+            transport.commands.append(cmd)
+            if is_key_download(cmd):
+                transport.files[cmd[-1]] = b"KEYDATA"
+            return ("", 0)
+        transport.run_command = fetch_key
+
+        platform = UBUNTU_22
+
+        for name in ["first", "second"]:
+            repo = Repository(name, repo="deb https://example.com/apt stable main", key_url=key_url)
+            repo._transport = transport
+            repo.apply(repo.plan(platform), platform)
+
+        assert sum(is_key_download(cmd) for cmd in transport.commands) == 1
+        assert transport.files["/etc/apt/trusted.gpg.d/second.gpg"] == b"KEYDATA"
+
+    def test_gpg_key_fetched_in_process(self, monkeypatch):
+        """Test that keys are fetched and dearmored without curl/gpg on the target."""
+        armored = (
+            b"-----BEGIN PGP PUBLIC KEY BLOCK-----\n"
+            b"Comment: test key\n"
+            b"\n"
+            b"mQINBGVzdA==\n"
+            b"=j99Q\n"
+            b"-----END PGP PUBLIC KEY BLOCK-----\n"
+        )
+        monkeypatch.setattr(repository_module, "_fetch_url", lambda url: armored)
+
+        repo = Repository("example", repo="deb https://example.com/apt stable main",
+                          key_url="https://example.com/key.asc")
+        repo._transport = MockTransport()
+        written = {}
+        repo._transport.write_file = lambda path, content: written.update({path: content})
+
+        platform = UBUNTU_22
+
+        repo._add_apt_key_from_url(repo.key_url, platform)
+
+        assert repo._transport.shells == []
+        assert written["/etc/apt/trusted.gpg.d/example.gpg"] == b"\x99\x02\r\x04est"
+        assert _KEY_CACHE["https://example.com/key.asc"] == b"\x99\x02\r\x04est"
+
+    def test_dearmor_binary_passthrough(self):
+        """Test that binary keys are returned unchanged."""
+        assert _dearmor(b"\x99\x01\x0d") == b"\x99\x01\x0d"
+
+    @pytest.mark.parametrize("data", [
+        b"<html><body>Not Found</body></html>",
+        b"-----BEGIN PGP PUBLIC KEY BLOCK-----\n\nmQINBGVzdA==\n=AbCd\n-----END PGP PUBLIC KEY BLOCK-----\n",
+        # Valid armor around a signature packet (tag 2), not a key
+        b"-----BEGIN PGP SIGNATURE-----\n\niQEz\n-----END PGP SIGNATURE-----\n",
+    ])
+    def test_dearmor_rejects_non_keys(self, data):
+        """Test that error pages, bad checksums and non-key packets are rejected."""
+        with pytest.raises(ValueError):
+            _dearmor(data)
+
+    def test_invalid_key_uses_gpg_on_target(self, monkeypatch):
+        """Test that a fetched page that is not a key falls back to curl + gpg on the target."""
+        monkeypatch.setattr(repository_module, "_fetch_url", lambda url: b"<html>captive portal</html>")
+        repo = Repository("example", repo="deb https://example.com/apt stable main",
+                          key_url="https://example.com/portal-key.asc")
+        repo._transport = MockTransport()
+
+        repo._add_apt_key_from_url(repo.key_url, UBUNTU_22)
+
+        assert any(is_key_download(cmd) for cmd in repo._transport.commands)
+
+    def test_pacman_check_greps_conf(self):
+        """Test that pacman.conf is searched in place rather than read."""
+        transport = MockTransport()
+        transport.files["/etc/pacman.conf"] = b"[options]\n\n[core]\nInclude = /etc/pacman.d/mirrorlist\n"
+
+        platform = ARCH
+
+        core = Repository("core", repo="Include = /etc/pacman.d/mirrorlist")
+        extra = Repository("extra", repo="Include = /etc/pacman.d/mirrorlist")
+        core._transport = transport
+        extra._transport = transport
+
+        assert core.check(platform)["exists"] is True
+        assert extra.check(platform)["exists"] is False
+        assert transport.greps == ["/etc/pacman.conf", "/etc/pacman.conf"]
+        assert "/etc/pacman.conf" not in transport.reads
+
+    def test_pacman_add_appends_block(self):
+        """Test that pacman repositories are appended without a shell."""
+        transport = MockTransport()
+        transport.files["/etc/pacman.conf"] = b"[options]\n"
+
+        platform = ARCH
+
+        repo = Repository("it's-custom", repo="Server = https://example.com/$repo/$arch")
+        repo._transport = transport
+
+        plan = repo.plan(platform)
+        assert plan.action == Action.CREATE
+        repo.apply(plan, platform)
+
+        assert transport.shells == []
+        assert transport.files["/etc/pacman.conf"] == (
+            b"[options]\n\n[it's-custom]\nServer = https://example.com/$repo/$arch\n"
+        )
+        assert repo.check(platform)["exists"] is True
+
+    def test_add_repository_defers_cache_update(self):
+        """Test that adding a repository marks the cache dirty instead of updating."""
+        platform = UBUNTU_22
+        executor = Executor(platform=platform, transport=MockTransport())
+        repo = executor.add(Repository("example", repo="deb https://example.com/apt stable main"))
+
+        repo.apply(repo.plan(platform), platform)
+
+        assert executor._cache_dirty == {"apt"}
+        assert not any("apt-get update" in cmd for cmd in executor.transport.shells)
@@ -4,306 +4,527 @@ Unit tests for Cook resources.
 Tests individual resource behavior in isolation.
 """
 
+import dataclasses
 import os
-import tempfile
+import sys
+import time
 import pytest
 
-from cook.core import Platform, Action
-from cook.resources.file import File
+from cook.core import Platform, Plan, Action
+from cook.core.executor import Executor, reset_executor
+from cook.record.generator import CodeGenerator
+from cook.record.parser import CommandParser, ParsedResource
+from cook.resources.exec import Exec
+from cook.resources.file import File, _template_env
 from cook.resources.service import Service
+from cook.transport import LocalTransport
+
+
+class RecordingTransport(LocalTransport):
+    """Local transport that records write_files() batches and commands."""
+
+    def __init__(self):
+        super().__init__()
+        self.batches = []
+        self.commands = []
+
+    def run_command(self, args, env=None):
+        self.commands.append(list(args))
+        return super().run_command(args, env)
+
+    def write_files(self, files):
+        self.batches.append([path for path, _, _ in files])
+        super().write_files(files)
 
 
 class TestFileResource:
     """Unit tests for File resource."""
 
-    def test_file_check_missing(self):
+    def test_file_check_missing(self, tmp_path):
         """Test checking a file that doesn't exist."""
         platform = Platform.detect()
-        test_file = "/tmp/test-file-does-not-exist.txt"
-
-        if os.path.exists(test_file):
-            os.unlink(test_file)
+        test_file = str(tmp_path / "test-file-does-not-exist.txt")
 
         file_res = File(test_file, content="test", mode=0o644)
         state = file_res.check(platform)
 
         assert state["exists"] is False
 
-    def test_file_check_existing(self):
+    def test_file_check_existing(self, tmp_path):
         """Test checking a file that exists."""
         platform = Platform.detect()
 
-        with tempfile.NamedTemporaryFile(mode='w', delete=False) as f:
-            f.write("existing content")
-            test_file = f.name
-
-        try:
-            file_res = File(test_file, content="existing content", mode=0o644)
-            state = file_res.check(platform)
+        test_file = tmp_path / "existing.txt"
+        test_file.write_text("existing content")
 
-            assert state["exists"] is True
-            assert state["type"] == "file"
+        file_res = File(str(test_file), content="existing content", mode=0o644)
+        state = file_res.check(platform)
 
-        finally:
-            os.unlink(test_file)
+        assert state["exists"] is True
+        assert state["type"] == "file"
 
-    def test_file_plan_create(self):
+    def test_file_plan_create(self, tmp_path):
         """Test planning file creation."""
         platform = Platform.detect()
-        test_file = "/tmp/test-plan-create.txt"
-
-        if os.path.exists(test_file):
-            os.unlink(test_file)
+        test_file = str(tmp_path / "test-plan-create.txt")
 
-        try:
-            file_res = File(test_file, content="new content", mode=0o644)
-            plan = file_res.plan(platform)
+        file_res = File(test_file, content="new content", mode=0o644)
+        plan = file_res.plan(platform)
 
-            assert plan.action == Action.CREATE
-            assert plan.has_changes()
-            assert any(c.field == "type" for c in plan.changes)
+        assert plan.action == Action.CREATE
+        assert plan.has_changes()
+        assert "type" in plan.changed_fields
 
-        finally:
-            if os.path.exists(test_file):
-                os.unlink(test_file)
-
-    def test_file_plan_update(self):
+    def test_file_plan_update(self, tmp_path):
         """Test planning file update."""
         platform = Platform.detect()
 
-        with tempfile.NamedTemporaryFile(mode='w', delete=False) as f:
-            f.write("old content")
-            test_file = f.name
-
-        try:
-            file_res = File(test_file, content="new content", mode=0o644)
-            plan = file_res.plan(platform)
+        test_file = tmp_path / "update.txt"
+        test_file.write_text("old content")
 
-            assert plan.action == Action.UPDATE
-            assert plan.has_changes()
-            assert any(c.field == "content" for c in plan.changes)
+        file_res = File(str(test_file), content="new content", mode=0o644)
+        plan = file_res.plan(platform)
 
-        finally:
-            os.unlink(test_file)
+        assert plan.action == Action.UPDATE
+        assert plan.has_changes()
+        assert "content" in plan.changed_fields
 
-    def test_directory_resource(self):
+    def test_directory_resource(self, tmp_path):
         """Test directory creation."""
         platform = Platform.detect()
-        test_dir = tempfile.mkdtemp()
-        os.rmdir(test_dir)  # Remove so we can test creation
-
-        try:
-            dir_res = File(test_dir, ensure="directory", mode=0o755)
-            plan = dir_res.plan(platform)
+        test_dir = str(tmp_path / "newdir")
 
-            assert plan.action == Action.CREATE
-            assert plan.has_changes()
+        dir_res = File(test_dir, ensure="directory", mode=0o755)
+        plan = dir_res.plan(platform)
 
-            # Apply
-            dir_res.apply(plan, platform)
-            assert os.path.isdir(test_dir)
+        assert plan.action == Action.CREATE
+        assert plan.has_changes()
 
-        finally:
-            if os.path.exists(test_dir):
-                os.rmdir(test_dir)
+        # Apply
+        dir_res.apply(plan, platform)
+        assert os.path.isdir(test_dir)
 
-    def test_file_idempotency(self):
+    def test_file_idempotency(self, tmp_path):
         """Test that file operations are idempotent."""
         platform = Platform.detect()
 
-        with tempfile.NamedTemporaryFile(mode='w', delete=False) as f:
-            f.write("content")
-            test_file = f.name
+        test_file = tmp_path / "idempotent.txt"
+        test_file.write_text("content")
+        test_file.chmod(0o644)
+
+        # First check - file matches
+        file_res = File(str(test_file), content="content", mode=0o644)
+        plan = file_res.plan(platform)
+
+        # Should have no changes (idempotent)
+        assert not plan.has_changes()
+
+
+    def test_unchanged_content_not_decoded(self, tmp_path):
+        """Test that a file matching the inline content is compared as bytes."""
+        reset_executor()
+        path = tmp_path / "nginx.conf"
+        path.write_text("server { listen 80; }\n")
+
+        file_res = File(str(path), content="server { listen 80; }\n")
+        state = file_res.check(Platform.detect())
+
+        assert state["content"] is file_res.content
+        assert file_res._pending_content(file_res.plan(Platform.detect())) is None
+
+    def test_large_unchanged_file_not_read(self, tmp_path, monkeypatch):
+        """Test that a large local file holding the content is compared without a read."""
+        reset_executor()
+        content = "x = 1\n" * 50000
+        path = tmp_path / "big.conf"
+        path.write_text(content)
+        monkeypatch.setattr(
+            LocalTransport, "read_file", lambda self, p: pytest.fail("file was read")
+        )
+
+        file_res = File(str(path), content=content)
+        assert file_res.check(Platform.detect())["content"] is file_res.content
+
+        file_res = File(str(path), content=content.replace("1", "2"))
+        monkeypatch.undo()
+        assert file_res.plan(Platform.detect()).has_changes()
+
+    def test_consecutive_writes_batched(self, tmp_path):
+        """Test that neighbouring content writes reach the transport as one write_files call."""
+        reset_executor()
+        transport = RecordingTransport()
+        executor = Executor(transport=transport, max_workers=1)
+
+        existing = tmp_path / "existing.conf"
+        existing.write_text("old")
+        os.chmod(existing, 0o600)
+        new = tmp_path / "sub" / "new.conf"
+
+        executor.add(File(str(existing), content="updated"))
+        executor.add(File(str(new), content="created", mode=0o640))
+
+        result = executor.apply(executor.plan())
+
+        assert not result.errors
+        assert transport.batches == [[str(existing), str(new)]]
+        assert existing.read_text() == "updated"
+        assert oct(existing.stat().st_mode & 0o777) == oct(0o600)
+        assert new.read_text() == "created"
+        assert oct(new.stat().st_mode & 0o777) == oct(0o640)
+
+    def test_source_copied_by_digest(self, tmp_path):
+        """Test that source files are compared by digest and copied, binary included."""
+        reset_executor()
+        transport = RecordingTransport()
+        executor = Executor(transport=transport, max_workers=1)
+
+        source = tmp_path / "app.bin"
+        source.write_bytes(bytes(range(256)) * 8192)
+        target = tmp_path / "deploy" / "app.bin"
+
+        resource = File(str(target), source=str(source), mode=0o755)
+        executor.add(resource)
+        plan = executor.plan()
+        assert plan.plans[resource.id].action == Action.CREATE
+
+        result = executor.apply(plan)
+
+        assert not result.errors
+        assert transport.batches == []
+        assert target.read_bytes() == source.read_bytes()
+        assert oct(target.stat().st_mode & 0o777) == oct(0o755)
+
+        reset_executor()
+        executor = Executor(transport=transport, max_workers=1)
+        executor.add(resource)
+        assert executor.plan().plans[resource.id].action == Action.NONE
+        assert not [c for c in transport.commands if c[0] in ("sha256sum", "shasum")]
+
+    def test_apply_paths_include_source_and_template(self, tmp_path):
+        """Test that a file's footprint covers the source or template it reads."""
+        platform = Platform.detect()
+        plan = Plan(action=Action.CREATE)
+
+        copied = File(str(tmp_path / "a"), source=str(tmp_path / "a.src"))
+        rendered = File(str(tmp_path / "b"), template=str(tmp_path / "b.j2"))
+        inline = File(str(tmp_path / "c"), content="c")
+
+        assert copied.apply_paths(plan, platform) == (str(tmp_path / "a"), str(tmp_path / "a.src"))
+        assert rendered.apply_paths(plan, platform) == (str(tmp_path / "b"), str(tmp_path / "b.j2"))
+        assert inline.apply_paths(plan, platform) == (str(tmp_path / "c"),)
+
+    def test_new_directories_batched(self, tmp_path):
+        """Test that neighbouring new directories share mkdir and per-mode chmod calls."""
+        reset_executor()
+        transport = RecordingTransport()
+        executor = Executor(transport=transport, max_workers=1)
+
+        app = tmp_path / "app"
+        for name, mode in (("", 0o755), ("logs", 0o755), ("data", 0o750)):
+            executor.add(File(str(app / name) if name else str(app), ensure="directory", mode=mode))
+
+        plan = executor.plan()
+        transport.commands.clear()
+        result = executor.apply(plan)
+
+        assert not result.errors
+        assert transport.commands == [
+            ["mkdir", "-p", str(app), str(app / "logs"), str(app / "data")],
+            ["chmod", "755", str(app), str(app / "logs")],
+            ["chmod", "750", str(app / "data")],
+        ]
+        assert oct((app / "data").stat().st_mode & 0o777) == oct(0o750)
 
-        # Set the correct mode on the temp file
-        os.chmod(test_file, 0o644)
+    def test_symlink_created_and_retargeted(self, tmp_path):
+        """Test that ensure="link" creates, keeps, and atomically retargets a link."""
+        platform = Platform.detect()
+        link = tmp_path / "sites-enabled" / "site"
+        link.parent.mkdir()
+        (tmp_path / "old").write_text("old")
 
-        try:
-            # First check - file matches
-            file_res = File(test_file, content="content", mode=0o644)
-            plan = file_res.plan(platform)
+        old = File(str(link), ensure="link", target=str(tmp_path / "old"))
+        plan = old.plan(platform)
+        assert plan.action == Action.CREATE
+        old.apply(plan, platform)
+        assert os.readlink(link) == str(tmp_path / "old")
+        assert old.plan(platform).action == Action.NONE
 
-            # Should have no changes (idempotent)
-            assert not plan.has_changes()
+        # The new target doesn't need to exist yet
+        new = File(str(link), ensure="link", target=str(tmp_path / "new"))
+        plan = new.plan(platform)
+        assert plan.action == Action.UPDATE
+        new.apply(plan, platform)
+        assert os.readlink(link) == str(tmp_path / "new")
+        assert os.listdir(link.parent) == ["site"]
+
+    def test_symlink_requires_target(self):
+        """Test that a link without a target is rejected."""
+        with pytest.raises(ValueError):
+            File("/tmp/link", ensure="link")
 
-        finally:
-            os.unlink(test_file)
 
+class TestFileTemplate:
+    """Unit tests for File template rendering."""
 
-class TestPlatformDetection:
-    """Unit tests for platform detection."""
+    def setup_method(self):
+        reset_executor()
 
-    def test_platform_detect(self):
-        """Test platform detection."""
-        platform = Platform.detect()
+    def test_template_compiled_once(self, tmp_path):
+        """Test that renders of one template share its compiled form but see edits."""
+        template = tmp_path / "site.conf.j2"
+        template.write_text("ssl={{ ssl }}\n")
 
-        assert platform.system.lower() in ["darwin", "linux", "windows"]
-        assert platform.arch in ["x86_64", "aarch64", "arm64", "i686"]
+        http = File(str(tmp_path / "http.conf"), template=str(template), vars={"ssl": False})
+        https = File(str(tmp_path / "https.conf"), template=str(template), vars={"ssl": True})
 
-    def test_platform_distro_detection(self):
-        """Test Linux distribution detection."""
-        platform = Platform.detect()
+        assert http._render_template() == "ssl=False\n"
+        compiled = _template_env(str(tmp_path.resolve())).get_template("site.conf.j2")
+        assert https._render_template() == "ssl=True\n"
+        assert _template_env(str(tmp_path.resolve())).get_template("site.conf.j2") is compiled
 
-        if platform.system == "linux":
-            assert platform.distro is not None
-            assert platform.distro in ["ubuntu", "debian", "fedora", "arch", "centos", "rhel", "alpine"]
+        template.write_text("tls={{ ssl }}\n")
+        os.utime(template, (time.time() + 10, time.time() + 10))
+        assert https._render_template() == "tls=True\n"
 
 
-class TestRecordingParser:
-    """Unit tests for recording mode parser."""
+class TestExecGuards:
+    """Unit tests for Exec predicate guards."""
 
-    def test_parse_apt_install(self):
-        """Test parsing apt install commands."""
-        from cook.record.parser import CommandParser
+    def setup_method(self):
+        reset_executor()
 
-        parser = CommandParser()
-        result = parser.parse("apt-get install -y nginx")
+    def test_predicates_get_transport(self):
+        """Test that unless_fn/only_if_fn are called with the transport and gate the run."""
+        platform = Platform(system="Linux", distro="ubuntu", version="22.04", arch="x86_64")
+        seen = []
 
-        assert result is not None
-        assert result.type == "package"
-        assert result.data["name"] == "nginx"
+        skip = Exec("skip", command="true", unless_fn=lambda t: seen.append(t) or True)
+        run = Exec("run", command="true", only_if_fn=lambda t: True)
+        blocked = Exec("blocked", command="true", only_if_fn=lambda t: False)
 
-    def test_parse_apt_multiple_packages(self):
-        """Test parsing apt install with multiple packages."""
-        from cook.record.parser import CommandParser
+        assert skip.check(platform)["should_run"] is False
+        assert seen == [skip._transport]
+        assert run.check(platform)["should_run"] is True
+        assert blocked.check(platform)["should_run"] is False
 
-        parser = CommandParser()
-        result = parser.parse("apt install nginx mysql-server postgresql")
+    def test_failing_predicate_warns(self):
+        """Test that a raising predicate leaves the command to run, with a warning."""
+        platform = Platform(system="Linux", distro="ubuntu", version="22.04", arch="x86_64")
+        exec_res = Exec("probe", command="true", unless_fn=lambda t: 1 / 0)
 
-        assert result is not None
-        assert result.type == "package"
-        assert result.data["packages"] == ["nginx", "mysql-server", "postgresql"]
+        state = exec_res.check(platform)
 
-    def test_parse_systemctl(self):
-        """Test parsing systemctl commands."""
-        from cook.record.parser import CommandParser
+        assert state["should_run"] is True
+        assert "unless_fn guard failed" in state["warnings"][0]
 
-        parser = CommandParser()
+    def test_creates_paths_prefetched_in_one_call(self, tmp_path):
+        """Test that plan() stats every creates path with one stat_many() call."""
 
-        # Test enable
-        result = parser.parse("systemctl enable nginx")
-        assert result.type == "service"
-        assert result.data["name"] == "nginx"
-        assert result.data["enabled"] is True
+        class StatCountingTransport(LocalTransport):
+            def __init__(self):
+                super().__init__()
+                self.stat_many_calls = []
+                self.exists_calls = []
 
-        # Test start
-        result = parser.parse("systemctl start nginx")
-        assert result.data["running"] is True
+            def stat_many(self, paths):
+                self.stat_many_calls.append(list(paths))
+                return super().stat_many(paths)
 
-    def test_parse_mkdir(self):
-        """Test parsing mkdir commands."""
-        from cook.record.parser import CommandParser
+            def file_exists(self, path):
+                self.exists_calls.append(path)
+                return super().file_exists(path)
 
-        parser = CommandParser()
-        result = parser.parse("mkdir -p /var/www/html")
+        (tmp_path / "done").write_text("")
+        transport = StatCountingTransport()
+        executor = Executor(transport=transport, max_workers=1)
+        done = executor.add(Exec("done", command="true", creates=str(tmp_path / "done")))
+        todo = executor.add(Exec("todo", command="true", creates=str(tmp_path / "todo")))
 
-        assert result.type == "file"
-        assert result.data["path"] == "/var/www/html"
-        assert result.data["ensure"] == "directory"
+        plan = executor.plan()
 
-    def test_parse_chmod(self):
-        """Test parsing chmod commands."""
-        from cook.record.parser import CommandParser
+        assert transport.stat_many_calls == [[str(tmp_path / "done"), str(tmp_path / "todo")]]
+        assert transport.exists_calls == []
+        assert not plan.plans[done.id].has_changes()
+        assert plan.plans[todo.id].has_changes()
 
-        parser = CommandParser()
-        result = parser.parse("chmod 755 /var/www")
+        # Later checks look again
+        (tmp_path / "todo").write_text("")
+        assert todo.check(executor.platform)["should_run"] is False
 
-        assert result.type == "file"
-        assert result.data["path"] == "/var/www"
-        assert result.data["mode"] == 0o755
+    def test_failed_prefetch_falls_back_to_check(self, tmp_path):
+        """Test that a failed stat_many() leaves each creates guard to its own check."""
 
-    def test_parse_chown(self):
-        """Test parsing chown commands."""
-        from cook.record.parser import CommandParser
+        class StatFailingTransport(LocalTransport):
+            def stat_many(self, paths):
+                raise IOError("stat: illegal option -- c")
 
-        parser = CommandParser()
-        result = parser.parse("chown www-data:www-data /var/www")
+        (tmp_path / "done").write_text("")
+        executor = Executor(transport=StatFailingTransport(), max_workers=1)
+        done = executor.add(Exec("done", command="true", creates=str(tmp_path / "done")))
+        todo = executor.add(Exec("todo", command="true", creates=str(tmp_path / "todo")))
 
-        assert result.type == "file"
-        assert result.data["path"] == "/var/www"
-        assert result.data["owner"] == "www-data"
-        assert result.data["group"] == "www-data"
+        plan = executor.plan()
 
-    def test_parse_git_clone(self):
-        """Test parsing git clone commands."""
-        from cook.record.parser import CommandParser
+        assert not plan.plans[done.id].has_changes()
+        assert plan.plans[todo.id].has_changes()
 
-        parser = CommandParser()
-        result = parser.parse("git clone https://github.com/user/repo.git /opt/repo")
 
-        assert result.type == "exec"
-        assert result.data["creates"] == "/opt/repo"
+class TestExecSecurity:
+    """Unit tests for Exec security validation."""
 
-    def test_ignore_comments(self):
-        """Test that comments are ignored."""
-        from cook.record.parser import CommandParser
+    def test_pipe_to_shell_detected(self):
+        """Test that curl/wget piped to a shell is flagged."""
+        exec_res = Exec("probe", command="true")
 
-        parser = CommandParser()
-        result = parser.parse("# This is a comment")
+        issues = exec_res._check_command_security("curl -fsSL https://x.sh | bash", "command")
+        assert any("curl" in i for i in issues)
 
-        assert result is None
+        issues = exec_res._check_command_security("wget -qO- https://x.sh |sh", "command")
+        assert any("wget" in i for i in issues)
 
+    def test_each_matching_pattern_reported(self):
+        """Test that the fused screen still reports every pattern that matched."""
+        exec_res = Exec("probe", command="true")
 
-class TestCodeGenerator:
-    """Unit tests for code generator."""
+        assert exec_res._check_command_security("tar czf /backup/a.tgz /var/data", "command") == []
 
-    def test_generate_package(self):
-        """Test generating package resource code."""
-        from cook.record.parser import ParsedResource
-        from cook.record.generator import CodeGenerator
-
-        resources = [
-            ParsedResource(
-                type="package",
-                data={"name": "nginx", "packages": None},
-                command="apt install nginx"
-            )
-        ]
+        issues = exec_res._check_command_security("ls; RM -rf /", "command")
+        assert any("';'" in i for i in issues)
+        assert any("rm" in i for i in issues)
 
-        generator = CodeGenerator()
-        code = generator.generate(resources)
+    def test_pipe_to_shell_detected_past_long_arguments(self):
+        """Test that no amount of text between the download and the shell hides the pipe."""
+        exec_res = Exec("probe", command="true")
 
-        assert "from cook import" in code
-        assert "Package" in code
-        assert 'Package("nginx")' in code
+        long_url = "https://x.example/" + "a" * 5000
+        for cmd in [
+            f"curl -fsSL {long_url} | bash",
+            "curl -fsSL https://x.sh | tee /tmp/x | sh",
+            f"WGET -qO- {long_url} | tee /tmp/x |bash -s",
+        ]:
+            issues = exec_res._check_command_security(cmd, "command")
+            assert any("to a shell" in i for i in issues), cmd
 
-    def test_generate_file(self):
-        """Test generating file resource code."""
-        from cook.record.parser import ParsedResource
-        from cook.record.generator import CodeGenerator
+        assert exec_res._check_command_security("curl -fsSL https://x.sh | shasum", "command") == []
 
-        resources = [
-            ParsedResource(
-                type="file",
-                data={"path": "/etc/nginx/nginx.conf", "mode": 0o644},
-                command="chmod 644 /etc/nginx/nginx.conf"
-            )
-        ]
+    def test_chown_root_detected_past_long_arguments(self):
+        """Test that chown to root is flagged however long the arguments are."""
+        exec_res = Exec("probe", command="true")
 
-        generator = CodeGenerator()
-        code = generator.generate(resources)
+        issues = exec_res._check_command_security("chown " + "-R " * 3000 + "root /srv", "command")
+        assert any("root" in i for i in issues)
+        assert exec_res._check_command_security("chown www-data /srv", "command") == []
 
-        assert "File" in code
-        assert "/etc/nginx/nginx.conf" in code
-        assert "0o644" in code
 
-    def test_generate_service(self):
-        """Test generating service resource code."""
-        from cook.record.parser import ParsedResource
-        from cook.record.generator import CodeGenerator
+class TestPlatformDetection:
+    """Unit tests for platform detection."""
 
-        resources = [
-            ParsedResource(
-                type="service",
-                data={"name": "nginx", "running": True, "enabled": True},
-                command="systemctl enable nginx"
-            )
-        ]
+    def test_platform_detect(self):
+        """Test platform detection."""
+        platform = Platform.detect()
+
+        assert platform.system.lower() in ["darwin", "linux", "windows"]
+        assert platform.arch in ["x86_64", "aarch64", "arm64", "i686"]
+
+    @pytest.mark.skipif(sys.platform != "linux", reason="distro detection only on Linux")
+    def test_platform_distro_detection(self):
+        """Test Linux distribution detection."""
+        platform = Platform.detect()
+
+        assert platform.distro is not None
+        assert platform.distro in ["ubuntu", "debian", "fedora", "arch", "centos", "rhel", "alpine"]
+
+    def test_local_transport_reuses_cached_platform(self, monkeypatch):
+        """Test that detecting through a LocalTransport runs no commands."""
+        Platform.detect()
+        monkeypatch.setattr(
+            LocalTransport, "run_command",
+            lambda self, *a, **kw: pytest.fail("platform detection ran a command"),
+        )
+
+        platform = Platform.detect(LocalTransport())
+
+        assert platform is Platform.detect()
+        with pytest.raises(dataclasses.FrozenInstanceError):
+            platform.distro = "changed"
 
-        generator = CodeGenerator()
-        code = generator.generate(resources)
 
-        assert "Service" in code
-        assert 'Service("nginx"' in code
-        assert "running=True" in code
-        assert "enabled=True" in code
+class TestRecordingParser:
+    """Unit tests for recording mode parser."""
+
+    def setup_method(self):
+        self.parser = CommandParser()
+
+    @pytest.mark.parametrize("command,expected_type,expected_data", [
+        ("apt-get install -y nginx", "package", {"name": "nginx"}),
+        ("apt install nginx mysql-server postgresql", "package",
+         {"packages": ["nginx", "mysql-server", "postgresql"]}),
+        ("systemctl enable nginx", "service", {"name": "nginx", "enabled": True}),
+        ("systemctl start nginx", "service", {"running": True}),
+        ("mkdir -p /var/www/html", "file", {"path": "/var/www/html", "ensure": "directory"}),
+        ("chmod 755 /var/www", "file", {"path": "/var/www", "mode": 0o755}),
+        ("chown www-data:www-data /var/www", "file",
+         {"path": "/var/www", "owner": "www-data", "group": "www-data"}),
+        ("git clone https://github.com/user/repo.git /opt/repo", "exec", {"creates": "/opt/repo"}),
+    ])
+    def test_parse(self, command, expected_type, expected_data):
+        """Test that a recorded command becomes the expected resource."""
+        result = self.parser.parse(command)
+
+        assert result is not None
+        assert result.type == expected_type
+        for key, value in expected_data.items():
+            # Same type too, so enabled=1 does not pass for enabled=True
+            assert (result.data[key], type(result.data[key])) == (value, type(value))
+
+    def test_ignore_comments(self):
+        """Test that comments are ignored."""
+        result = self.parser.parse("# This is a comment")
+
+        assert result is None
+
+    def test_parse_history_skips_unrecognized(self):
+        """Test that history lines without a known command are skipped."""
+        results = self.parser.parse_history([
+            "cd /etc", "ls -la", "sudo apt-get install -y nginx", "vim nginx.conf",
+            "sudo systemctl reload nginx",
+        ])
+
+        assert [r.type for r in results] == ["package", "service"]
+
+
+class TestCodeGenerator:
+    """Unit tests for code generator."""
+
+    def setup_method(self):
+        self.generator = CodeGenerator()
+
+    @pytest.mark.parametrize("resource,expected", [
+        (ParsedResource(type="package", data={"name": "nginx", "packages": None},
+                        command="apt install nginx"),
+         ["from cook import", "Package", 'Package("nginx")']),
+        (ParsedResource(type="file", data={"path": "/etc/nginx/nginx.conf", "mode": 0o644},
+                        command="chmod 644 /etc/nginx/nginx.conf"),
+         ["File", "/etc/nginx/nginx.conf", "0o644"]),
+        (ParsedResource(type="service", data={"name": "nginx", "running": True, "enabled": True},
+                        command="systemctl enable nginx"),
+         ["Service", 'Service("nginx"', "running=True", "enabled=True"]),
+    ], ids=["package", "file", "service"])
+    def test_generate(self, resource, expected):
+        """Test generating resource code for each resource type."""
+        code = self.generator.generate([resource])
+
+        for fragment in expected:
+            assert fragment in code
+
+    def test_repeated_commands_generated_once(self):
+        """Test that a command repeated in history yields one statement."""
+        resources = CommandParser().parse_history([
+            "apt install nginx", "mkdir -p /srv/app", "apt install nginx", "apt install curl",
+        ])
+
+        code = self.generator.generate(resources)
+
+        assert code.count('Package("nginx")') == 1
+        assert code.index('Package("nginx")') < code.index('Package("curl")')
+        assert code.count("from cook import") == 1
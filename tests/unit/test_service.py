@@ -0,0 +1,261 @@
+"""
+Unit tests for Service resource.
+
+Tests service management operations in isolation using mocks.
+"""
+
+import pytest
+
+from cook.core import Action, Plan, Platform
+from cook.core.executor import ApplyResult, Executor, reset_executor
+from cook.resources.file import File
+from cook.resources.service import Service
+from cook.transport import LocalTransport
+
+
+class MockTransport:
+    """Mock transport for testing."""
+
+    def __init__(self, units=None, shell_codes=None):
+        # unit name -> {"ActiveState": ..., "UnitFileState": ...}
+        self.units = units or {}
+        # Exit codes returned by successive run_shell() calls (then 0)
+        self.shell_codes = list(shell_codes or [])
+        self.commands = []
+
+    def run_shell(self, command):
+        self.commands.append(command)
+        return ("", self.shell_codes.pop(0) if self.shell_codes else 0)
+
+    def write_file(self, path, content):
+        self.commands.append(["write", path])
+
+    def run_command(self, cmd, env=None):
+        self.commands.append(cmd)
+        if cmd[:2] == ["systemctl", "show"]:
+            props = self.units.get(cmd[-1], {"LoadState": "not-found"})
+            return ("".join(f"{k}={v}\n" for k, v in props.items()), 0)
+        return ("", 0)
+
+
+class SystemctlRecorder(LocalTransport):
+    """Local transport that records systemctl calls instead of running them."""
+
+    def __init__(self):
+        super().__init__()
+        self.systemctl = []
+
+    def run_command(self, cmd, env=None):
+        if cmd[0] == "systemctl":
+            self.systemctl.append(cmd)
+            return ("ActiveState=active\nUnitFileState=enabled\n", 0)
+        return super().run_command(cmd, env)
+
+
+class TestServiceResource:
+    """Unit tests for Service resource."""
+
+    def setup_method(self):
+        """Reset executor before each test."""
+        reset_executor()
+
+    def test_check_single_systemctl_call(self):
+        """Test that running and enabled come from one systemctl show."""
+        svc = Service("nginx", running=True, enabled=True)
+        svc._transport = MockTransport({
+            "nginx": {"ActiveState": "active", "UnitFileState": "enabled", "LoadState": "loaded"},
+        })
+
+        platform = Platform(system="Linux", distro="ubuntu", version="22.04", arch="x86_64")
+
+        state = svc.check(platform)
+
+        assert state["running"] is True
+        assert state["enabled"] is True
+        assert len(svc._transport.commands) == 1
+
+    def test_check_inactive_and_missing(self):
+        """Test stopped/disabled and unknown units."""
+        platform = Platform(system="Linux", distro="ubuntu", version="22.04", arch="x86_64")
+
+        svc = Service("nginx", running=True)
+        svc._transport = MockTransport({
+            "nginx": {"ActiveState": "inactive", "UnitFileState": "disabled"},
+        })
+        assert svc.check(platform) == {"exists": True, "running": False, "enabled": False}
+
+        missing = Service("ghost", running=True)
+        missing._transport = MockTransport()
+        assert missing.check(platform) == {"exists": True, "running": False, "enabled": False}
+
+    def test_state_refetched_after_change(self):
+        """Test that starting the unit invalidates the cached state."""
+        svc = Service("nginx", running=True)
+        svc._transport = MockTransport({"nginx": {"ActiveState": "inactive"}})
+
+        platform = Platform(system="Linux", distro="ubuntu", version="22.04", arch="x86_64")
+
+        svc.check(platform)
+        svc._start(platform)
+        svc._transport.units["nginx"]["ActiveState"] = "active"
+
+        assert svc._is_running(platform) is True
+
+    def test_enable_and_start_fused(self):
+        """Test that enabling and starting together is one systemctl call."""
+        svc = Service("nginx", running=True, enabled=True)
+        svc._transport = MockTransport({
+            "nginx": {"ActiveState": "inactive", "UnitFileState": "disabled"},
+        })
+
+        platform = Platform(system="Linux", distro="ubuntu", version="22.04", arch="x86_64")
+
+        plan = svc.plan(platform)
+        svc._transport.commands.clear()
+        svc.apply(plan, platform)
+
+        assert svc._transport.commands == [["systemctl", "enable", "--now", "nginx"]]
+
+    def test_single_change_not_fused(self):
+        """Test that only starting a service does not enable it."""
+        svc = Service("nginx", running=True, enabled=False)
+        svc._transport = MockTransport({
+            "nginx": {"ActiveState": "inactive", "UnitFileState": "disabled"},
+        })
+
+        platform = Platform(system="Linux", distro="ubuntu", version="22.04", arch="x86_64")
+
+        plan = svc.plan(platform)
+        svc._transport.commands.clear()
+        svc.apply(plan, platform)
+
+        assert svc._transport.commands == [["systemctl", "start", "nginx"]]
+
+    def test_daemon_reload_deferred_and_batched(self):
+        """Test that several unit file writes cause one reload, before the service starts."""
+        platform = Platform(system="Linux", distro="ubuntu", version="22.04", arch="x86_64")
+        executor = Executor(platform=platform, transport=MockTransport({
+            "app": {"ActiveState": "inactive", "UnitFileState": "disabled"},
+        }))
+        unit = executor.add(File("/etc/systemd/system/app.service", content="[Service]\n"))
+        dropin = executor.add(File("/etc/systemd/system/app.service.d/env.conf", content="[Service]\n"))
+        svc = executor.add(Service("app", running=True, enabled=True))
+
+        for file_res in (unit, dropin):
+            file_res._desired_state = file_res.desired_state()
+            file_res.apply(Plan(action=Action.CREATE), platform)
+        svc.apply(svc.plan(platform), platform)
+
+        commands = executor.transport.commands
+        reloads = [i for i, cmd in enumerate(commands) if cmd == ["systemctl", "daemon-reload"]]
+        assert len(reloads) == 1
+        assert reloads[0] < commands.index(["systemctl", "enable", "--now", "app"])
+        assert reloads[0] > commands.index(["write", "/etc/systemd/system/app.service.d/env.conf"])
+
+    def test_services_batched_across_resources(self):
+        """Test that services needing the same transition share one systemctl call."""
+        platform = Platform(system="Linux", distro="ubuntu", version="22.04", arch="x86_64")
+        executor = Executor(platform=platform, transport=MockTransport({
+            name: {"ActiveState": "inactive", "UnitFileState": "disabled"}
+            for name in ("nginx", "redis", "postgresql")
+        }))
+        executor.add(Service("nginx", running=True, enabled=True))
+        executor.add(Service("redis", running=True, enabled=True))
+        executor.add(Service("postgresql", running=True))
+
+        result = executor.apply(executor.plan())
+
+        mutations = [cmd for cmd in executor.transport.commands if cmd[1] != "show"]
+        assert mutations == [
+            ["systemctl", "enable", "--now", "nginx", "redis"],
+            ["systemctl", "start", "postgresql"],
+        ]
+        assert len(result.changed_resources) == 3
+
+    def test_triggered_restarts_batched(self):
+        """Test that services restarted by the same change share one systemctl call."""
+        platform = Platform(system="Linux", distro="ubuntu", version="22.04", arch="x86_64")
+        executor = Executor(platform=platform, transport=MockTransport())
+        executor.add(Service("web", restart_on=["file:/etc/app.conf"]))
+        executor.add(Service("worker", restart_on=["file:/etc/app.conf"]))
+
+        executor._trigger_service_reloads(["file:/etc/app.conf"], ApplyResult())
+
+        assert executor.transport.commands == [["systemctl", "restart", "web", "worker"]]
+
+    def test_failed_trigger_recorded_and_others_run(self):
+        """Test that an unhealthy restarted service is an apply error, not an abort."""
+        platform = Platform(system="Linux", distro="ubuntu", version="22.04", arch="x86_64")
+        executor = Executor(platform=platform, transport=MockTransport(shell_codes=[1]))
+        executor.add(Service("web", restart_on=["file:/etc/app.conf"], healthcheck=("false", 0, 1)))
+        executor.add(Service("worker", restart_on=["file:/etc/app.conf"], healthcheck=("true", 0, 1)))
+        executor.add(Service("nginx", reload_on=["file:/etc/app.conf"]))
+        result = ApplyResult()
+
+        executor._trigger_service_reloads(["file:/etc/app.conf"], result)
+
+        assert len(result.errors) == 1
+        assert "web" in str(result.errors[0])
+        assert ["systemctl", "reload", "nginx"] in executor.transport.commands
+        # Both restarted services were health-checked
+        assert executor.transport.commands.count("true") + executor.transport.commands.count("false") == 2
+
+    def test_reload_only_when_content_changes(self, tmp_path):
+        """Test that re-applying an identical config does not reload the service."""
+        platform = Platform(system="Linux", distro="ubuntu", version="22.04", arch="x86_64")
+        conf_path = tmp_path / "nginx.conf"
+
+        def run(content):
+            reset_executor()
+            executor = Executor(platform=platform, transport=SystemctlRecorder())
+            conf = executor.add(File(str(conf_path), content=content))
+            executor.add(Service("nginx", running=True, reload_on=[conf]))
+            executor.apply(executor.plan())
+            return [cmd for cmd in executor.transport.systemctl if cmd[1] != "show"]
+
+        assert run("worker_processes 2;\n") == [["systemctl", "reload", "nginx"]]
+        assert run("worker_processes 2;\n") == []
+        assert run("worker_processes 4;\n") == [["systemctl", "reload", "nginx"]]
+
+    def test_start_waits_for_healthcheck(self):
+        """Test that starting a service polls its healthcheck until it passes."""
+        svc = Service("app", running=True, healthcheck=("curl -fs localhost:3000", 0, 5))
+        svc._transport = MockTransport(
+            {"app": {"ActiveState": "inactive", "UnitFileState": "disabled"}},
+            shell_codes=[7, 7, 0],
+        )
+        platform = Platform(system="Linux", distro="ubuntu", version="22.04", arch="x86_64")
+
+        plan = svc.plan(platform)
+        svc._transport.commands.clear()
+        svc.apply(plan, platform)
+
+        assert svc._transport.commands == [["systemctl", "start", "app"]] + ["curl -fs localhost:3000"] * 3
+
+    def test_unhealthy_service_fails(self):
+        """Test that a healthcheck failing every retry is an error."""
+        svc = Service("app", running=True, healthcheck=("false", 0, 2))
+        svc._transport = MockTransport(shell_codes=[1, 1])
+        platform = Platform(system="Linux", distro="ubuntu", version="22.04", arch="x86_64")
+
+        with pytest.raises(RuntimeError, match="not healthy after 2 checks"):
+            svc.restart(platform)
+
+    def test_waits_for_socket_path(self, tmp_path):
+        """Test that a restart returns once the wait_for path appears, and fails if it never does."""
+        import threading
+
+        sock = tmp_path / "php-fpm.sock"
+        platform = Platform(system="Linux", distro="ubuntu", version="22.04", arch="x86_64")
+        svc = Service("php-fpm", running=True, wait_for=[str(sock)], wait_timeout=5)
+        svc._transport = SystemctlRecorder()
+
+        threading.Timer(0.2, sock.touch).start()
+        svc.restart(platform)
+        assert sock.exists()
+        assert svc._transport.systemctl == [["systemctl", "restart", "php-fpm"]]
+
+        late = Service("late", running=True, wait_for=[str(tmp_path / "never")], wait_timeout=0.3)
+        late._transport = SystemctlRecorder()
+        with pytest.raises(RuntimeError, match="not ready"):
+            late.restart(platform)
@@ -0,0 +1,172 @@
+"""
+Unit tests for the SQLite state store.
+"""
+
+import sqlite3
+from datetime import datetime
+
+import pytest
+
+from cook.state import ResourceState, Store
+
+
+def make_state(resource_id: str) -> ResourceState:
+    """Build a minimal ResourceState."""
+    return ResourceState(
+        id=resource_id,
+        type="file",
+        desired_state={"exists": True},
+        actual_state={"exists": True},
+        applied_at=datetime(2024, 1, 1, 12, 0, 0),
+        applied_by="tester",
+        hostname="host",
+        config_file="server.py",
+        status="success",
+    )
+
+
+class TestStore:
+    """Unit tests for Store."""
+
+    def test_wal_mode(self, tmp_path):
+        """Test that the database uses WAL journaling."""
+        with Store(str(tmp_path / "state.db")) as store:
+            mode = store.conn.execute("PRAGMA journal_mode").fetchone()[0]
+
+        assert mode == "wal"
+
+    def test_memory_store(self, tmp_path, monkeypatch):
+        """Test that an in-memory store works without touching the filesystem."""
+        monkeypatch.chdir(tmp_path)
+
+        with Store(Store.MEMORY) as store:
+            store.save_resource(make_state("file:/a"))
+            assert [r.id for r in store.list_resources()] == ["file:/a"]
+
+        assert list(tmp_path.iterdir()) == []
+
+    def test_transaction_commits_once(self, tmp_path):
+        """Test that writes inside a transaction become visible together on exit."""
+        db_path = str(tmp_path / "state.db")
+
+        with Store(db_path) as store, Store(db_path) as reader:
+            with store.transaction():
+                store.save_resource(make_state("file:/a"))
+                store.save_resource(make_state("file:/b"))
+                assert reader.list_resources() == []
+
+            assert {r.id for r in reader.list_resources()} == {"file:/a", "file:/b"}
+
+    def test_transaction_rolls_back_on_error(self):
+        """Test that a failing block leaves no partial writes."""
+        with Store(Store.MEMORY) as store:
+            with pytest.raises(RuntimeError):
+                with store.transaction():
+                    store.save_resource(make_state("file:/a"))
+                    raise RuntimeError("boom")
+
+            assert store.list_resources() == []
+
+    def test_bulk_save(self):
+        """Test saving resources and history in bulk."""
+        from cook.state import HistoryEntry
+
+        with Store(Store.MEMORY) as store:
+            store.save_resources(make_state(f"file:/etc/{i}") for i in range(50))
+            store.add_history_batch(
+                HistoryEntry(
+                    timestamp=datetime(2024, 1, 1, 12, 0, i),
+                    resource_id="file:/etc/1",
+                    action="update",
+                    user="tester",
+                    hostname="host",
+                    success=True,
+                    changes={"mode": {"from": 0o600, "to": 0o644}},
+                )
+                for i in range(3)
+            )
+
+            assert len(store.list_resources()) == 50
+            history = store.get_history("file:/etc/1")
+            assert len(history) == 3
+            assert history[0].timestamp == datetime(2024, 1, 1, 12, 0, 2)
+
+    def test_resource_round_trip_and_drift_filter(self, tmp_path):
+        """Test that stored resources read back intact and drift is filtered."""
+        drifted = make_state("file:/b")
+        drifted.status = "drift"
+
+        with Store(str(tmp_path / "state.db")) as store:
+            store.save_resources([make_state("file:/a"), drifted])
+
+            assert store.get_resource("file:/a") == make_state("file:/a")
+            assert store.get_resource("file:/missing") is None
+            assert [r.id for r in store.list_drifted()] == ["file:/b"]
+
+    def test_history_uses_resource_timestamp_index(self, tmp_path):
+        """Test that history lookups use the composite index without a sort step."""
+        from cook.state.store import SELECT_HISTORY
+
+        with Store(str(tmp_path / "state.db")) as store:
+            plan = store.conn.execute(
+                f"EXPLAIN QUERY PLAN {SELECT_HISTORY}", ("file:/a", 10)
+            ).fetchall()
+
+        details = " ".join(row[3] for row in plan)
+        assert "idx_history_resource_ts" in details
+        assert "TEMP B-TREE" not in details
+
+    def test_timestamps_and_json_stored_natively(self, tmp_path):
+        """Test that timestamps are integers, JSON is a BLOB and values round-trip exactly."""
+        applied = datetime(2024, 1, 1, 12, 0, 0, 123456)
+        state = make_state("file:/a")
+        state.applied_at = applied
+
+        with Store(str(tmp_path / "state.db")) as store:
+            store.save_resource(state)
+            raw_time, raw_json = store.conn.execute(
+                "SELECT applied_at, desired_state FROM resources"
+            ).fetchone()
+            loaded = store.get_resource("file:/a")
+
+        assert isinstance(raw_time, int)
+        assert isinstance(raw_json, bytes)
+        assert loaded.applied_at == applied
+        assert loaded.desired_state == {"exists": True}
+
+    def test_migrates_legacy_schema(self, tmp_path):
+        """Test that a database with ISO text timestamps is converted on open."""
+        db_path = str(tmp_path / "state.db")
+        conn = sqlite3.connect(db_path)
+        conn.executescript(
+            """
+            CREATE TABLE resources (
+                id TEXT PRIMARY KEY, type TEXT NOT NULL, desired_state TEXT NOT NULL,
+                actual_state TEXT NOT NULL, applied_at TEXT NOT NULL, applied_by TEXT NOT NULL,
+                hostname TEXT NOT NULL, config_file TEXT NOT NULL, status TEXT NOT NULL
+            );
+            CREATE TABLE history (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, timestamp TEXT NOT NULL,
+                resource_id TEXT NOT NULL, action TEXT NOT NULL, user TEXT NOT NULL,
+                hostname TEXT NOT NULL, success INTEGER NOT NULL, changes TEXT NOT NULL,
+                error TEXT
+            );
+            INSERT INTO resources VALUES ('file:/a', 'file', '{"exists": true}',
+                '{"exists": false}', '2024-01-01T12:00:00', 'tester', 'host', 'server.py',
+                'success');
+            INSERT INTO history (timestamp, resource_id, action, user, hostname, success,
+                changes, error)
+            VALUES ('2024-01-01T12:00:00', 'file:/a', 'create', 'tester', 'host', 1, '[]', NULL);
+            """
+        )
+        conn.commit()
+        conn.close()
+
+        with Store(db_path) as store:
+            state = store.get_resource("file:/a")
+            history = store.get_history("file:/a")
+
+        assert state.applied_at == datetime(2024, 1, 1, 12, 0, 0)
+        assert state.actual_state == {"exists": False}
+        assert len(history) == 1
+        assert history[0].timestamp == datetime(2024, 1, 1, 12, 0, 0)
@@ -0,0 +1,1001 @@
+"""
+Unit tests for Cook transports.
+
+Tests transport behavior against the local machine.
+"""
+
+import io
+import os
+import shutil
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import paramiko
+import pytest
+
+from cook.transport import LocalTransport, lima
+from cook.transport import local as local_module
+
+
+class FakeSFTPFile:
+    """Local file standing in for a paramiko SFTPFile."""
+
+    def __init__(self, path, mode):
+        self.file = open(path, mode)
+        self.pipelined = False
+        self.prefetched = False
+
+    def prefetch(self, file_size=None):
+        self.prefetched = True
+
+    def set_pipelined(self, pipelined=True):
+        self.pipelined = pipelined
+
+    def write(self, data):
+        self.file.write(data)
+
+    def seek(self, offset):
+        self.file.seek(offset)
+
+    def read(self, size=None):
+        return self.file.read() if size is None else self.file.read(size)
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class FakeSFTP:
+    """SFTP client that works on the local filesystem and records opened files."""
+
+    def __init__(self):
+        self.files = []
+        self.stats = []
+        self.closed = False
+
+    def get_channel(self):
+        return self
+
+    def open(self, path, mode="r", bufsize=-1):
+        handle = FakeSFTPFile(path, mode)
+        handle.bufsize = bufsize
+        self.files.append(handle)
+        return handle
+
+    def stat(self, path):
+        self.stats.append(path)
+        return os.stat(path)
+
+    def close(self):
+        self.closed = True
+
+
+class FakeChannel:
+    """Session channel whose exec_command runs a local process."""
+
+    def __init__(self):
+        self.process = None
+        self.closed = False
+
+    def set_combine_stderr(self, combine):
+        pass
+
+    def exec_command(self, command):
+        self.process = subprocess.Popen(
+            ["/bin/sh", "-c", command],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+        )
+
+    def sendall(self, data):
+        self.process.stdin.write(data)
+        self.process.stdin.flush()
+
+    def recv(self, size):
+        return os.read(self.process.stdout.fileno(), size)
+
+    def makefile(self, mode):
+        return self.process.stdout
+
+    def makefile_stderr(self, mode):
+        return io.BytesIO()
+
+    def shutdown_write(self):
+        self.process.stdin.close()
+
+    def recv_exit_status(self):
+        return self.process.wait()
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        if not self.process.stdin.closed:
+            self.process.stdin.close()
+        self.process.wait()
+        self.process.stdout.close()
+
+
+class FakeSSHClient:
+    """paramiko.SSHClient stand-in that hands out one FakeSFTP per open_sftp()."""
+
+    def __init__(self):
+        self.sftp_sessions = []
+        self.channels = []
+        self.closed = False
+        # Refuse channels past this many open ones, like sshd's MaxSessions
+        self.max_sessions = None
+
+    def is_active(self):
+        return not self.closed
+
+    def close(self):
+        self.closed = True
+
+    def _check_session_limit(self):
+        open_channels = [c for c in self.channels + self.sftp_sessions if not c.closed]
+        if self.max_sessions is not None and len(open_channels) >= self.max_sessions:
+            raise paramiko.ChannelException(1, "Administratively prohibited")
+
+    def open_sftp(self):
+        self._check_session_limit()
+        sftp = FakeSFTP()
+        self.sftp_sessions.append(sftp)
+        return sftp
+
+    def get_transport(self):
+        return self
+
+    def open_session(self):
+        self._check_session_limit()
+        channel = FakeChannel()
+        self.channels.append(channel)
+        return channel
+
+
+def make_ssh_transport(sudo=False, max_sessions=8):
+    """Build an SSHTransport over FakeSSHClient with commands run locally."""
+    from cook.transport.ssh import SSHTransport, _ChannelPool, _ShellSessions
+
+    ssh = SSHTransport.__new__(SSHTransport)
+    ssh.sudo = sudo
+    ssh.persistent_shell = True
+    ssh._channels = _ChannelPool(max_sessions)
+    ssh._shells = _ShellSessions(ssh._channels)
+    ssh._known_dirs = set()
+    ssh._tar_writes = True
+    # OpenSSH unavailable: uploads stay on (fake) SFTP
+    ssh._control_path = ""
+    ssh._control_lock = threading.Lock()
+    ssh.client = FakeSSHClient()
+    ssh.run_command = LocalTransport().run_command
+    return ssh
+
+
+class TestRunPipeline:
+    """Unit tests for Transport.run_pipeline."""
+
+    def test_pipeline_results_per_command(self):
+        """Test that each command gets its own output and exit code."""
+        transport = LocalTransport()
+
+        results = transport.run_pipeline([
+            "echo one; echo two",
+            "exit 3",
+            "printf 'no newline'",
+        ])
+
+        assert results == [("one\ntwo\n", 0), ("", 3), ("no newline", 0)]
+
+    def test_pipeline_single_round_trip(self):
+        """Test that the whole pipeline is sent as one command."""
+        transport = LocalTransport()
+        calls = []
+        run_command = transport.run_command
+        transport.run_command = lambda args: calls.append(args) or run_command(args)
+
+        results = transport.run_pipeline(["true", "false", "echo done"])
+
+        assert len(calls) == 1
+        assert [code for _, code in results] == [0, 1, 0]
+
+    def test_pipeline_empty(self):
+        """Test that an empty pipeline runs nothing."""
+        assert LocalTransport().run_pipeline([]) == []
+
+
+class TestGrep:
+    """Unit tests for LocalTransport.grep."""
+
+    def test_grep_fixed_string(self, tmp_path):
+        """Test that grep matches fixed strings, not regexes."""
+        conf = tmp_path / "pacman.conf"
+        conf.write_text("[options]\n[core]\nInclude = /etc/pacman.d/mirrorlist\n")
+        transport = LocalTransport()
+
+        assert transport.grep(str(conf), "[core]") is True
+        assert transport.grep(str(conf), "[c.re]") is False
+        assert transport.grep(str(tmp_path / "missing"), "[core]") is False
+
+
+class TestReadFileCached:
+    """Unit tests for Transport.read_file_cached."""
+
+    def test_snapshot_reused_until_file_changes(self, tmp_path):
+        """Test that unchanged files are read once and changes invalidate."""
+        conf = tmp_path / "sources.list"
+        conf.write_text("deb http://archive.ubuntu.com/ubuntu jammy main\n")
+        transport = LocalTransport()
+        reads = []
+        read_file = transport.read_file
+        transport.read_file = lambda path: reads.append(path) or read_file(path)
+
+        first = transport.read_file_cached(str(conf))
+        assert transport.read_file_cached(str(conf)) == first
+        assert len(reads) == 1
+
+        with open(conf, "a") as f:
+            f.write("deb http://archive.ubuntu.com/ubuntu jammy universe\n")
+        assert b"universe" in transport.read_file_cached(str(conf))
+        assert len(reads) == 2
+
+    def test_ttl_skips_stat(self, tmp_path):
+        """Test that a fresh snapshot is returned without a stat within ttl."""
+        conf = tmp_path / "pacman.conf"
+        conf.write_text("[options]\n")
+        transport = LocalTransport()
+        transport.read_file_cached(str(conf))
+
+        transport.stat = lambda path: pytest.fail("stat called within ttl")
+        assert transport.read_file_cached(str(conf), ttl=60) == b"[options]\n"
+
+    def test_missing_file(self, tmp_path):
+        """Test that missing files raise FileNotFoundError."""
+        with pytest.raises(FileNotFoundError):
+            LocalTransport().read_file_cached(str(tmp_path / "missing"))
+
+
+class TestRunCommandEnv:
+    """Unit tests for run_command environment handling."""
+
+    def test_env_added_to_command(self):
+        """Test that extra variables reach the command alongside the inherited environment."""
+        output, code = LocalTransport().run_command(
+            ["sh", "-c", 'echo "$DEBIAN_FRONTEND:${PATH:+path}"'],
+            env={"DEBIAN_FRONTEND": "noninteractive"},
+        )
+
+        assert code == 0
+        assert output.strip() == "noninteractive:path"
+
+
+class TestStatMany:
+    """Unit tests for Transport.stat_many."""
+
+    def test_local_stat_many(self, tmp_path):
+        """Test that missing paths map to None, in order."""
+        present = tmp_path / "present"
+        present.write_text("data")
+
+        results = LocalTransport().stat_many([str(present), str(tmp_path / "missing")])
+
+        assert results[0].st_size == 4
+        assert results[1] is None
+
+    def test_ssh_stat_many_single_round_trip(self, tmp_path):
+        """Test that SSH stats every path with one remote command."""
+        from cook.transport.ssh import SSHTransport
+
+        present = tmp_path / "it's present"
+        present.write_text("data")
+
+        # Run the remote side locally to exercise command building and parsing
+        ssh = SSHTransport.__new__(SSHTransport)
+        calls = []
+        local = LocalTransport()
+        ssh.run_command = lambda args: calls.append(args) or local.run_command(args)
+
+        results = ssh.stat_many([str(present), str(tmp_path / "missing")])
+
+        assert len(calls) == 1
+        assert results[0].st_size == 4
+        assert results[1] is None
+
+    def test_ssh_stat_many_bsd_stat(self, tmp_path, monkeypatch):
+        """Test that a stat(1) without GNU -c falls back to BSD -f."""
+        from cook.transport.ssh import SSHTransport
+
+        present = tmp_path / "present"
+        present.write_text("data")
+        # BSD-like stat: rejects -c, answers -f with GNU stat underneath
+        bin_dir = tmp_path / "bin"
+        bin_dir.mkdir()
+        (bin_dir / "stat").write_text(
+            "#!/bin/sh\n"
+            '[ "$1" = -f ] || { echo "stat: illegal option -- c" >&2; exit 1; }\n'
+            f"exec {shutil.which('stat')} -c '%f %u %g %s %X %Y %Z' \"$3\" \"$4\"\n"
+        )
+        (bin_dir / "stat").chmod(0o755)
+        monkeypatch.setenv("PATH", f"{bin_dir}:{os.environ['PATH']}")
+
+        ssh = SSHTransport.__new__(SSHTransport)
+        ssh.run_command = LocalTransport(persistent_shell=False).run_command
+
+        results = ssh.stat_many([str(present), str(tmp_path / "missing")])
+
+        assert results[0].st_size == 4
+        assert results[1] is None
+
+    def test_ssh_stat_many_failure_not_missing(self, tmp_path):
+        """Test that a path that exists but cannot be stat'ed raises instead of reading as missing."""
+        from cook.transport.ssh import SSHTransport
+
+        ssh = SSHTransport.__new__(SSHTransport)
+        ssh.run_pipeline = lambda commands: [("stat: cannot stat\n", 1) for _ in commands]
+
+        with pytest.raises(IOError):
+            ssh.stat_many([str(tmp_path)])
+
+
+class TestLimaSSHConfig:
+    """Unit tests for parsing limactl show-ssh output."""
+
+    def test_parse_config(self, monkeypatch):
+        """Test that Port/User/IdentityFile are extracted from the config text."""
+        config = (
+            "Host lima-demo\n"
+            '  IdentityFile "/home/me/.lima/_config/user"\n'
+            "  User me\n"
+            "  Hostname 127.0.0.1\n"
+            "  Port 60022\n"
+        )
+        monkeypatch.setattr(
+            lima.subprocess,
+            "run",
+            lambda *args, **kwargs: subprocess.CompletedProcess(args, 0, stdout=config, stderr=""),
+        )
+
+        assert lima.get_lima_ssh_config("demo") == (
+            "127.0.0.1",
+            60022,
+            "me",
+            "/home/me/.lima/_config/user",
+        )
+
+
+class TestRunCommandSpawn:
+    """Unit tests for executable resolution in LocalTransport."""
+
+    def test_bare_name_resolved_to_absolute_path(self, monkeypatch):
+        """Test that commands are spawned by absolute path."""
+        calls = []
+        real_run = subprocess.run
+
+        def recording_run(args, **kwargs):
+            calls.append((args, kwargs))
+            return real_run(args, **kwargs)
+
+        monkeypatch.setattr(subprocess, "run", recording_run)
+
+        output, code = LocalTransport().run_command(["echo", "hi"])
+
+        assert code == 0
+        assert output.strip() == "hi"
+        assert os.path.isabs(calls[0][0][0])
+        assert calls[0][1]["close_fds"] is False
+
+    def test_missing_command_still_raises(self):
+        """Test that an unknown command raises FileNotFoundError as before."""
+        with pytest.raises(FileNotFoundError):
+            LocalTransport().run_command(["cook-no-such-command"])
+
+
+class TestPersistentShell:
+    """Unit tests for the long-lived LocalTransport shell session."""
+
+    def test_commands_share_one_shell(self):
+        """Test that consecutive commands run under the same /bin/sh."""
+        with LocalTransport() as transport:
+            first, _ = transport.run_shell("echo $$")
+            second, _ = transport.run_shell("echo $$")
+
+        assert first == second
+
+    def test_exit_codes_and_partial_lines(self):
+        """Test that exit codes and output without a final newline come back intact."""
+        with LocalTransport() as transport:
+            assert transport.run_shell("printf 'a\\nb'; exit 3") == ("a\nb", 3)
+            assert transport.run_shell("true") == ("", 0)
+
+    def test_commands_are_isolated(self):
+        """Test that cd/export and syntax errors do not affect later commands."""
+        with LocalTransport() as transport:
+            transport.run_shell("cd / && export COOK_TEST=1")
+            _, code = transport.run_shell('echo "unterminated')
+            output, _ = transport.run_shell("pwd; echo x$COOK_TEST")
+
+        assert code != 0
+        assert output == f"{os.getcwd()}\nx\n"
+
+    def test_sessions_follow_cwd_and_environment(self, tmp_path, monkeypatch):
+        """Test that os.chdir and os.environ changes reach later commands."""
+        with LocalTransport() as transport:
+            transport.run_shell("true")
+
+            monkeypatch.chdir(tmp_path)
+            monkeypatch.setenv("COOK_TEST", "1")
+            output, _ = transport.run_shell("pwd; echo x$COOK_TEST")
+            assert output == f"{tmp_path}\nx1\n"
+
+            monkeypatch.delenv("COOK_TEST")
+            output, _ = transport.run_shell("echo x$COOK_TEST")
+            assert output == "x\n"
+            assert len(transport._shells) == 1
+
+    def test_command_that_kills_its_session_runs_once(self, tmp_path):
+        """Test that a command delivered to a session that then dies is not re-run."""
+        log = tmp_path / "runs"
+        with LocalTransport() as transport:
+            with pytest.raises(RuntimeError):
+                transport.run_shell(f"echo run >> {log}; kill -9 $$")
+
+            assert log.read_text() == "run\n"
+            assert transport.run_shell("echo again") == ("again\n", 0)
+
+    def test_dead_session_before_delivery_falls_back(self):
+        """Test that a session that died before the command was sent is replaced."""
+        with LocalTransport() as transport:
+            transport.run_shell("true")
+            shell = transport._idle[0]
+            shell.kill()
+            shell.wait()
+
+            assert transport.run_shell("echo ok") == ("ok\n", 0)
+
+    def test_one_shot_mode(self):
+        """Test that persistent_shell=False starts a new shell per command."""
+        transport = LocalTransport(persistent_shell=False)
+        first, _ = transport.run_shell("echo $$")
+        second, _ = transport.run_shell("echo $$")
+
+        assert first != second
+
+    def test_threads_get_separate_sessions(self):
+        """Test that concurrent threads do not share (and queue on) one shell."""
+        with LocalTransport() as transport:
+            with ThreadPoolExecutor(max_workers=4) as pool:
+                outputs = list(pool.map(lambda _: transport.run_shell("sleep 0.2; echo $$")[0], range(4)))
+
+        assert len(set(outputs)) == 4
+
+    def test_sessions_reused_across_thread_pools(self):
+        """Test that each new worker pool reuses idle sessions instead of adding shells."""
+        with LocalTransport(max_idle_shells=2) as transport:
+            for _ in range(3):
+                with ThreadPoolExecutor(max_workers=4) as pool:
+                    list(pool.map(lambda _: transport.run_shell("sleep 0.1"), range(4)))
+
+                assert len(transport._shells) == 2
+
+
+class TestSSHConnect:
+    """Unit tests for SSHTransport's background connection."""
+
+    def test_connections_overlap(self, monkeypatch):
+        """Test that constructing transports does not wait for each handshake."""
+        import time
+        from cook.transport.ssh import SSHTransport
+
+        def slow_connect(self):
+            time.sleep(0.3)
+            return FakeSSHClient()
+
+        monkeypatch.setattr(SSHTransport, "_connect", slow_connect)
+        start = time.monotonic()
+        transports = [SSHTransport(host=f"host{i}") for i in range(4)]
+        clients = [transport.client for transport in transports]
+
+        assert time.monotonic() - start < 1.0
+        assert all(isinstance(client, FakeSSHClient) for client in clients)
+        for transport in transports:
+            transport.close()
+
+    def test_same_login_shares_connection(self, monkeypatch):
+        """Test that transports to one host/user share a client until the last closes."""
+        from cook.transport.ssh import SSHTransport
+
+        monkeypatch.setattr(SSHTransport, "_connect", lambda self: FakeSSHClient())
+        first = SSHTransport(host="shared", user="deploy")
+        second = SSHTransport(host="shared", user="deploy")
+        other = SSHTransport(host="shared", user="root")
+
+        assert first.client is second.client
+        assert other.client is not first.client
+
+        client = first.client
+        first.close()
+        assert not client.closed
+        second.close()
+        assert client.closed
+
+        third = SSHTransport(host="shared", user="deploy")
+        assert third.client is not client
+        third.close()
+        other.close()
+
+    def test_connection_error_raised_on_use(self, monkeypatch):
+        """Test that a failed handshake surfaces on first use, not in the constructor."""
+        from cook.transport.ssh import SSHTransport
+
+        def failing_connect(self):
+            raise ConnectionRefusedError("refused")
+
+        monkeypatch.setattr(SSHTransport, "_connect", failing_connect)
+        transport = SSHTransport(host="unreachable")
+
+        with pytest.raises(ConnectionRefusedError):
+            transport.wait_connected()
+        with pytest.raises(ConnectionRefusedError):
+            transport.run_shell("true")
+        transport.close()
+
+
+class TestSCPUpload:
+    """Unit tests for the OpenSSH scp path of SSHTransport uploads."""
+
+    def test_large_files_use_scp(self, tmp_path):
+        """Test that files past SCP_THRESHOLD go to scp and small ones to SFTP."""
+        from cook.transport.ssh import SCP_THRESHOLD
+
+        ssh = make_ssh_transport()
+        copied = []
+        ssh._scp = lambda local, remote: copied.append(remote) or True
+        large = tmp_path / "large"
+        large.write_bytes(b"x" * SCP_THRESHOLD)
+        small = tmp_path / "small"
+        small.write_bytes(b"x")
+
+        ssh.copy_file(str(large), str(tmp_path / "large.out"))
+        ssh.copy_file(str(small), str(tmp_path / "small.out"))
+
+        assert copied == [str(tmp_path / "large.out")]
+        assert (tmp_path / "small.out").read_bytes() == b"x"
+
+    def test_scp_failure_falls_back_to_sftp(self, tmp_path):
+        """Test that a failed scp still uploads the file over SFTP."""
+        from cook.transport.ssh import SCP_THRESHOLD
+
+        ssh = make_ssh_transport()
+        ssh._scp = lambda local, remote: False
+        src = tmp_path / "src"
+        src.write_bytes(b"y" * SCP_THRESHOLD)
+
+        ssh.copy_file(str(src), str(tmp_path / "dst"))
+
+        assert (tmp_path / "dst").read_bytes() == src.read_bytes()
+
+    def test_master_options(self, monkeypatch):
+        """Test that the master expires when idle, keeps host-key checks and omits an unknown user."""
+        from cook.transport import ssh as ssh_module
+
+        ssh = make_ssh_transport()
+        ssh._control_path = None
+        ssh.password = None
+        ssh.user = None
+        ssh.host = "example.com"
+        ssh.port = 22
+        ssh.timeout = 5
+        ssh._key_filename = None
+        commands = []
+        monkeypatch.setattr(ssh_module.shutil, "which", lambda name: f"/usr/bin/{name}")
+        monkeypatch.setattr(
+            ssh_module.subprocess, "run",
+            lambda command, **kwargs: commands.append(command) or subprocess.CompletedProcess(command, 0),
+        )
+
+        assert ssh._openssh_master()
+        master = " ".join(commands[0])
+        assert f"ControlPersist={ssh_module.SSH_CONTROL_PERSIST}" in master
+        assert "StrictHostKeyChecking" not in master
+        assert commands[0][-1] == "example.com"
+
+        ssh._close_openssh_master()
+
+    def test_no_master_with_password_auth(self):
+        """Test that password logins never start an OpenSSH master."""
+        ssh = make_ssh_transport()
+        ssh._control_path = None
+        ssh.password = "secret"
+
+        assert ssh._openssh_master() == ""
+
+
+class TestSSHShellSession:
+    """Unit tests for the pooled remote shells used by SSHTransport."""
+
+    def test_commands_share_one_channel(self):
+        """Test that consecutive commands reuse a single session channel."""
+        ssh = make_ssh_transport()
+        first, _ = ssh.run_shell("echo $PPID")
+        second, _ = ssh.run_shell("echo $PPID")
+        ssh._channels.close()
+
+        assert first == second
+        assert len(ssh.client.channels) == 1
+
+    def test_exit_codes_and_isolation(self):
+        """Test exit codes, merged stderr and that cd does not leak."""
+        ssh = make_ssh_transport()
+        assert ssh.run_shell("echo out; echo err >&2; exit 4") == ("out\nerr\n", 4)
+        ssh.run_shell("cd /")
+        assert ssh.run_shell("pwd") == (f"{os.getcwd()}\n", 0)
+        ssh._channels.close()
+
+    def test_commands_run_in_login_shell(self, monkeypatch):
+        """Test that commands are run by $SHELL, not by the session's /bin/sh."""
+        monkeypatch.setenv("SHELL", "/bin/bash")
+        if not os.path.exists("/bin/bash"):
+            pytest.skip("needs bash")
+        ssh = make_ssh_transport()
+
+        assert ssh.run_shell("[[ -n $BASH_VERSION ]] && echo bash") == ("bash\n", 0)
+        ssh._channels.close()
+
+    def test_dead_session_is_replaced(self):
+        """Test that a session that exits is dropped and a new one opened."""
+        ssh = make_ssh_transport()
+        ssh._exec = lambda command: pytest.fail("fallback not expected")
+        ssh.run_shell("true")
+        ssh.client.channels[0].close()
+
+        assert ssh.run_shell("echo again") == ("again\n", 0)
+        assert len(ssh.client.channels) == 2
+        ssh._channels.close()
+
+    def test_command_that_kills_its_session_runs_once(self, tmp_path):
+        """Test that a command delivered to a session that then dies is not sent again."""
+        ssh = make_ssh_transport()
+        log = tmp_path / "log"
+
+        with pytest.raises(RuntimeError):
+            ssh.run_shell(f"echo run >> {log}; kill -9 $PPID")
+
+        assert log.read_text() == "run\n"
+        assert len(ssh.client.channels) == 1
+        ssh._channels.close()
+
+    def test_sessions_capped(self):
+        """Test that many threads share at most max_sessions channels."""
+        ssh = make_ssh_transport(max_sessions=3)
+        ssh.client.max_sessions = 3
+
+        with ThreadPoolExecutor(max_workers=16) as pool:
+            results = list(pool.map(lambda i: ssh.run_shell(f"echo {i}"), range(64)))
+
+        assert results == [(f"{i}\n", 0) for i in range(64)]
+        assert 1 <= len(ssh.client.channels) <= 3
+        ssh._channels.close()
+
+    def test_refused_session_uses_own_channel(self):
+        """Test that a refused session falls back to a one-off channel within the server's limit."""
+        ssh = make_ssh_transport(max_sessions=8)
+        ssh.client.max_sessions = 2
+        held = [ssh._channels.acquire("sftp", ssh.client.open_sftp) for _ in range(2)]
+
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            future = pool.submit(ssh.run_shell, "echo hi")
+            # The server refuses a third channel; the pool lowers its cap
+            # and the command waits for a free slot
+            while ssh._channels.max_sessions != 2:
+                time.sleep(0.01)
+            ssh._channels.release("sftp", held.pop())
+
+            assert future.result(timeout=10) == ("hi\n", 0)
+
+        assert len(ssh.client.channels) == 1
+        assert ssh.client.channels[0].closed
+        ssh._channels.close()
+
+
+class TestCopyFile:
+    """Unit tests for LocalTransport.copy_file."""
+
+    def test_copy_file(self, tmp_path):
+        """Test that a copy has the same bytes and replaces existing content."""
+        src = tmp_path / "src.bin"
+        dst = tmp_path / "dst.bin"
+        src.write_bytes(bytes(range(256)) * 4096)
+        dst.write_bytes(b"x" * (2 * 1024 * 1024))
+
+        LocalTransport().copy_file(str(src), str(dst))
+
+        assert dst.read_bytes() == src.read_bytes()
+
+    def test_copy_empty_file(self, tmp_path):
+        """Test that an empty source yields an empty destination."""
+        src = tmp_path / "empty"
+        dst = tmp_path / "copy"
+        src.write_bytes(b"")
+
+        LocalTransport().copy_file(str(src), str(dst))
+
+        assert dst.read_bytes() == b""
+
+    @pytest.mark.skipif(not hasattr(os, "copy_file_range"), reason="needs copy_file_range")
+    def test_short_copy_falls_back(self, tmp_path, monkeypatch):
+        """Test that a copy ending before the source size is not reported as done."""
+        src = tmp_path / "src.bin"
+        dst = tmp_path / "dst.bin"
+        src.write_bytes(b"a" * 8192)
+        copy_file_range = os.copy_file_range
+        calls = []
+
+        def shrinking_copy(src_fd, dst_fd, count):
+            # Source appears truncated after the first chunk
+            calls.append(count)
+            return copy_file_range(src_fd, dst_fd, 1024) if len(calls) == 1 else 0
+
+        monkeypatch.setattr(os, "copy_file_range", shrinking_copy)
+
+        assert local_module._copy_file_range(str(src), str(dst)) is False
+        LocalTransport().copy_file(str(src), str(dst))
+        assert dst.read_bytes() == src.read_bytes()
+
+
+class TestWriteFiles:
+    """Unit tests for LocalTransport.write_files."""
+
+    def test_write_files_sets_mode_and_parents(self, tmp_path):
+        """Test that files get their mode, existing ones keep their inode, parents are created."""
+        existing = tmp_path / "existing.conf"
+        existing.write_bytes(b"x" * 4096)
+        existing.chmod(0o644)
+        inode = existing.stat().st_ino
+        new = tmp_path / "sub" / "new.conf"
+
+        LocalTransport().write_files([
+            (str(existing), b"updated", 0o600),
+            (str(new), b"created", 0o640),
+        ])
+
+        assert existing.read_bytes() == b"updated"
+        assert existing.stat().st_ino == inode
+        assert oct(existing.stat().st_mode & 0o777) == oct(0o600)
+        assert new.read_bytes() == b"created"
+        assert oct(new.stat().st_mode & 0o777) == oct(0o640)
+
+    def test_write_files_without_mode_uses_umask(self, tmp_path):
+        """Test that a file written without a mode is created under the umask."""
+        path = tmp_path / "plain.conf"
+        old = os.umask(0o027)
+        try:
+            LocalTransport().write_files([(str(path), b"data", None)])
+        finally:
+            os.umask(old)
+
+        assert oct(path.stat().st_mode & 0o777) == oct(0o640)
+
+
+class TestSSHFileTransfer:
+    """Unit tests for SSHTransport SFTP file operations."""
+
+    def test_write_file_pipelined(self, tmp_path):
+        """Test that writes go through a pipelined SFTP handle."""
+        ssh = make_ssh_transport()
+        path = tmp_path / "out.txt"
+
+        ssh.write_file(str(path), b"data")
+
+        handle = ssh.client.sftp_sessions[0].files[0]
+        assert handle.pipelined
+        assert handle.bufsize == 0
+        assert path.read_bytes() == b"data"
+
+    def test_append_file_pipelined(self, tmp_path):
+        """Test that appends also use a pipelined handle."""
+        ssh = make_ssh_transport()
+        path = tmp_path / "out.txt"
+        path.write_bytes(b"a")
+
+        ssh.append_file(str(path), b"b")
+
+        assert ssh.client.sftp_sessions[0].files[0].pipelined
+        assert path.read_bytes() == b"ab"
+
+    def test_read_file_prefetched(self, tmp_path):
+        """Test that reads prefetch the file before reading it."""
+        ssh = make_ssh_transport()
+        path = tmp_path / "in.txt"
+        path.write_bytes(b"data")
+
+        assert ssh.read_file(str(path)) == b"data"
+        assert ssh.client.sftp_sessions[0].files[0].prefetched
+
+    def test_read_file_stream(self, tmp_path):
+        """Test that streamed reads are prefetched and come back in bounded chunks."""
+        ssh = make_ssh_transport()
+        path = tmp_path / "in.bin"
+        path.write_bytes(b"x" * 10)
+
+        chunks = list(ssh.read_file_stream(str(path), chunk_size=4))
+
+        assert chunks == [b"xxxx", b"xxxx", b"xx"]
+        assert ssh.client.sftp_sessions[0].files[0].prefetched
+        assert list(LocalTransport().read_file_stream(str(path), chunk_size=4)) == chunks
+
+    def test_symlink_replaces_directory_link(self, tmp_path):
+        """Test that retargeting a link to a directory replaces the link, not the directory."""
+        ssh = make_ssh_transport()
+        (tmp_path / "v1").mkdir()
+        link = tmp_path / "current"
+
+        ssh.symlink(str(tmp_path / "v1"), str(link))
+        ssh.symlink(str(tmp_path / "v2"), str(link))
+
+        assert os.readlink(link) == str(tmp_path / "v2")
+        assert os.listdir(tmp_path / "v1") == []
+        assert sorted(os.listdir(tmp_path)) == ["current", "v1"]
+
+    def test_copy_file_large_blocks(self, tmp_path):
+        """Test that uploads use large pipelined write requests."""
+        from cook.transport.ssh import SFTP_WRITE_BLOCK_SIZE
+
+        ssh = make_ssh_transport()
+        src = tmp_path / "src.bin"
+        dst = tmp_path / "dst.bin"
+        src.write_bytes(os.urandom(SFTP_WRITE_BLOCK_SIZE * 2 + 10))
+
+        ssh.copy_file(str(src), str(dst))
+
+        handle = ssh.client.sftp_sessions[0].files[0]
+        assert handle.pipelined
+        assert handle.MAX_REQUEST_SIZE == SFTP_WRITE_BLOCK_SIZE
+        assert dst.read_bytes() == src.read_bytes()
+
+    def test_sftp_session_reused(self, tmp_path):
+        """Test that consecutive file operations share one SFTP session until close()."""
+        ssh = make_ssh_transport()
+        path = tmp_path / "out.txt"
+
+        ssh.write_file(str(path), b"data")
+        assert ssh.file_exists(str(path))
+        assert ssh.read_file(str(path)) == b"data"
+
+        assert len(ssh.client.sftp_sessions) == 1
+
+        ssh.client.close = lambda: None
+        ssh.close()
+        assert ssh.client.sftp_sessions[0].closed
+
+    def test_write_files_single_tar_stream(self, tmp_path):
+        """Test that several files go out as one tar extraction that keeps modes."""
+        ssh = make_ssh_transport()
+        commands = []
+
+        def run_with_input(command, data):
+            commands.append(command)
+            result = subprocess.run(command, shell=True, input=data, capture_output=True)
+            return (result.stdout + result.stderr).decode(), result.returncode
+
+        ssh._exec = run_with_input
+        existing = tmp_path / "existing"
+        existing.write_bytes(b"old")
+        os.chmod(existing, 0o600)
+        new = tmp_path / "dir" / "new"
+
+        ssh.write_files([(str(existing), b"one", 0o600), (str(new), b"two", 0o644)])
+
+        assert len(commands) == 1
+        assert existing.read_bytes() == b"one"
+        assert existing.stat().st_mode & 0o777 == 0o600
+        assert new.read_bytes() == b"two"
+
+    def test_write_files_without_mode_uses_umask(self, tmp_path):
+        """Test that files without a mode go in a tar stream that applies the umask."""
+        ssh = make_ssh_transport()
+        commands = []
+
+        def run_with_input(command, data):
+            commands.append(command)
+            result = subprocess.run(f"umask 027; {command}", shell=True, input=data, capture_output=True)
+            return (result.stdout + result.stderr).decode(), result.returncode
+
+        ssh._exec = run_with_input
+        first = tmp_path / "first"
+        second = tmp_path / "second"
+        third = tmp_path / "third"
+
+        ssh.write_files([(str(first), b"one", None), (str(second), b"two", None), (str(third), b"three", 0o600)])
+
+        assert len(commands) == 2
+        assert oct(first.stat().st_mode & 0o777) == oct(0o640)
+        assert oct(second.stat().st_mode & 0o777) == oct(0o640)
+        assert oct(third.stat().st_mode & 0o777) == oct(0o600)
+
+    def test_write_files_without_gnu_tar(self, tmp_path):
+        """Test that a tar rejecting the GNU options falls back to one write per file."""
+        ssh = make_ssh_transport()
+        commands = []
+        ssh._exec = lambda command, data: commands.append(command) or ("tar: unrecognized option '--overwrite'", 1)
+        first = tmp_path / "first"
+        second = tmp_path / "dir" / "second"
+
+        ssh.write_files([(str(first), b"one", 0o644), (str(second), b"two", 0o644)])
+        ssh.write_files([(str(first), b"three", 0o644), (str(second), b"four", 0o644)])
+
+        assert len(commands) == 1
+        assert first.read_bytes() == b"three"
+        assert second.read_bytes() == b"four"
+
+    def test_copy_file_parallel_ranges(self, tmp_path, monkeypatch):
+        """Test that large uploads are written as ranges on separate SFTP sessions."""
+        from cook.transport import ssh as ssh_module
+
+        monkeypatch.setattr(ssh_module, "SFTP_PARALLEL_THRESHOLD", 1)
+        ssh = make_ssh_transport()
+        src = tmp_path / "src.bin"
+        dst = tmp_path / "dst.bin"
+        src.write_bytes(os.urandom(ssh_module.SFTP_WRITE_BLOCK_SIZE * 8))
+
+        ssh.copy_file(str(src), str(dst))
+
+        # Pooled sessions: the stat/truncate one is reused by a range
+        assert 1 <= len(ssh.client.sftp_sessions) <= ssh_module.SFTP_PARALLEL_STREAMS
+        assert dst.read_bytes() == src.read_bytes()
+
+    def test_copy_file_parallel_ranges_capped(self, tmp_path, monkeypatch):
+        """Test that parallel ranges wait for pooled sessions instead of exceeding the cap."""
+        from cook.transport import ssh as ssh_module
+
+        monkeypatch.setattr(ssh_module, "SFTP_PARALLEL_THRESHOLD", 1)
+        ssh = make_ssh_transport(max_sessions=2)
+        ssh.client.max_sessions = 2
+        src = tmp_path / "src.bin"
+        dst = tmp_path / "dst.bin"
+        src.write_bytes(os.urandom(ssh_module.SFTP_WRITE_BLOCK_SIZE * 8))
+
+        ssh.copy_file(str(src), str(dst))
+
+        assert len(ssh.client.sftp_sessions) <= 2
+        assert dst.read_bytes() == src.read_bytes()
+
+    def test_sudo_write_single_install_command(self, tmp_path, monkeypatch):
+        """Test that a sudo write stages in /tmp and installs with one command."""
+        from cook.transport import ssh as ssh_module
+
+        ssh = make_ssh_transport(sudo=True)
+        commands = []
+        local = LocalTransport()
+        ssh.run_command = lambda args: commands.append(args) or local.run_command(args)
+        monkeypatch.setattr(ssh_module, "_staging_path", lambda suffix: str(tmp_path / f"stage{suffix}"))
+        target = tmp_path / "new" / "file.txt"
+
+        ssh.write_file(str(target), b"data")
+
+        assert len(commands) == 1
+        assert target.read_bytes() == b"data"
+        assert not (tmp_path / "stage.tmp").exists()
+
+    def test_parent_directories_cached(self, tmp_path):
+        """Test that the parent directory is stat'ed once and recreated if removed."""
+        ssh = make_ssh_transport()
+        directory = tmp_path / "conf"
+        directory.mkdir()
+
+        ssh.write_file(str(directory / "a"), b"a")
+        ssh.write_file(str(directory / "b"), b"b")
+        assert ssh.client.sftp_sessions[0].stats == [str(directory)]
+
+        (directory / "a").unlink()
+        (directory / "b").unlink()
+        directory.rmdir()
+        ssh.write_file(str(directory / "c"), b"c")
+        assert (directory / "c").read_bytes() == b"c"